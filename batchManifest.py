@@ -0,0 +1,227 @@
+#
+# batchManifest.py
+#
+# Resumable batches of perspectiveRemover jobs listed in a manifest.
+#
+
+"""
+Runs a batch of images listed in a manifest file, keeping a journal of the
+outcome of each one so that a batch that dies part way through, or is
+stopped, picks up where it left off when run again.
+
+The manifest has a line per image: either just its filename, or a JSON
+object such as
+
+    {"input": "scans/page1.png", "output": "out/page1.png",
+        "corners": [[12, 40], [980, 31], [1002, 1410], [3, 1398]]}
+
+where output and corners are optional.  Blank lines and lines starting
+with # are skipped, and relative filenames are relative to the manifest's
+directory.
+
+The journal is a JSON lines file with one record appended, and flushed to
+disk, for each attempt at an image: its input, output, corners, the
+options the output depends on, and "done" or "failed" with the error.
+Images done without corners of their own also have the corners their
+output was made with, such as detected ones, as resolvedCorners.
+Outputs are written to a temporary file and renamed into place, so an
+output that exists is complete.  A job is skipped when the journal says it
+was done with the same input, output, corners and options and its output
+is still there, and a job that has failed as many times as allowed is
+skipped too, until its failures are cleared from the journal.
+"""
+
+import glob
+import json
+import os
+
+
+# The journal for manifest.txt is manifest.txt.journal unless named otherwise
+JOURNAL_SUFFIX = ".journal"
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def readManifest(manifestFilename):
+    """
+    The jobs in manifestFilename as a list of (filename, corners,
+    newFilename) tuples, with None for corners or newFilename that aren't
+    given.
+    """
+    directory = os.path.dirname(manifestFilename)
+    jobs = []
+    with open(manifestFilename) as f:
+        for (lineNumber, line) in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if not line.startswith("{"):
+                jobs.append((os.path.join(directory, line), None, None))
+                continue
+
+            try:
+                entry = json.loads(line)
+                filename = os.path.join(directory, entry["input"])
+            except (ValueError, KeyError) as e:
+                raise ValueError("%s line %d: expected a filename or a JSON object with an input: %s"
+                    % (manifestFilename, lineNumber, e))
+            newFilename = entry.get("output")
+            if newFilename is not None:
+                newFilename = os.path.join(directory, newFilename)
+            corners = entry.get("corners")
+            if corners is not None:
+                corners = tuple(tuple(corner) for corner in corners)
+            jobs.append((filename, corners, newFilename))
+    return jobs
+
+def removeStaleTemporaries(newFilename):
+    """
+    Remove the temporary files left beside newFilename by writers of it
+    that were killed before renaming them into place
+    """
+    for temporaryFilename in glob.glob(glob.escape(newFilename) + ".*.tmp"):
+        try:
+            os.remove(temporaryFilename)
+        except FileNotFoundError:
+            pass
+
+def syncFile(filename):
+    """Make sure filename's contents and its directory entry are on disk"""
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    except OSError:
+        # Not every platform lets a directory be opened
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """
+    The journal in journalFilename of a batch run with options, a dict of
+    the options affecting the outputs as from perspectiveRemover's
+    outputOptions.  Records from earlier runs are read when it's opened.
+    """
+
+    def __init__(self, journalFilename, options):
+        self.journalFilename = journalFilename
+        # Round-trip through JSON so the options compare equal to recorded ones
+        self.options = json.loads(json.dumps(options))
+        # Latest done record, and number of failures since, for each
+        # (filename, corners, newFilename) job key
+        self.done = {}
+        self.failures = {}
+
+        if os.path.exists(journalFilename):
+            line = ""
+            with open(journalFilename) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # The last line of a journal whose writer was killed
+                        continue
+                    self.remember(record)
+            if line and not line.endswith("\n"):
+                # End the killed writer's last line, so that the next record
+                # isn't appended onto it and lost along with it
+                self.append("\n")
+
+    @staticmethod
+    def key(record):
+        return json.dumps([record["input"], record["corners"], record["output"]])
+
+    def recordFor(self, job, status, error=None, resolvedCorners=None):
+        (filename, corners, newFilename) = job
+        record = {"input": filename, "output": newFilename,
+            "corners": None if corners is None else [list(corner) for corner in corners],
+            "options": self.options, "status": status}
+        if corners is None and resolvedCorners is not None:
+            record["resolvedCorners"] = [list(corner) for corner in resolvedCorners]
+        if error is not None:
+            record["error"] = error
+        return record
+
+    def remember(self, record):
+        key = self.key(record)
+        if record["status"] == "done":
+            self.done[key] = record
+            self.failures.pop(key, None)
+        else:
+            self.failures[key] = self.failures.get(key, 0) + 1
+
+    def isDone(self, job):
+        """True if job was done with the current options and its output is still there"""
+        record = self.done.get(self.key(self.recordFor(job, "done")))
+        return (record is not None and record["options"] == self.options and
+            os.path.exists(record["output"]))
+
+    def failureCount(self, job):
+        return self.failures.get(self.key(self.recordFor(job, "failed")), 0)
+
+    def record(self, job, status, error=None, resolvedCorners=None):
+        """
+        Append a record of job's outcome, "done" or "failed", and flush it
+        to disk.  resolvedCorners are the corners the output was made with,
+        for a job without corners of its own.
+        """
+        record = self.recordFor(job, status, error, resolvedCorners)
+        self.append(json.dumps(record) + "\n")
+        self.remember(record)
+
+    def append(self, text):
+        with open(self.journalFilename, 'a') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def pendingJobs(jobs, journal, maxAttempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Returns (pending, skipped): the jobs, each a (filename, corners,
+    newFilename) tuple, still to do, and those that have already failed
+    maxAttempts times.  Jobs journaled as done are in neither.
+    """
+    pending = []
+    skipped = []
+    for job in jobs:
+        if journal.isDone(job):
+            continue
+        (skipped if journal.failureCount(job) >= maxAttempts else pending).append(job)
+    return (pending, skipped)
+
+def runJobs(pending, journal, rectify, maxAttempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Generator calling rectify(job) for each of the pending jobs from
+    pendingJobs, which writes the job's output and returns the corners it
+    used, and journaling whether it worked.  Failed jobs are tried again after the rest, until they've
+    failed maxAttempts times in all.  Yields (filename, newFilename, error)
+    once for each job, when it's done or out of attempts, where error is
+    None if it was done.
+    """
+    while pending:
+        retries = []
+        for job in pending:
+            (filename, corners, newFilename) = job
+            removeStaleTemporaries(newFilename)
+            try:
+                resolvedCorners = rectify(job)
+                syncFile(newFilename)
+            except Exception as e:
+                error = "%s: %s" % (type(e).__name__, e)
+                journal.record(job, "failed", error)
+                if journal.failureCount(job) < maxAttempts:
+                    retries.append(job)
+                else:
+                    yield (filename, newFilename, error)
+                continue
+            journal.record(job, "done", resolvedCorners=resolvedCorners)
+            yield (filename, newFilename, None)
+        pending = retries
@@ -0,0 +1,305 @@
+#!/usr/bin/python3
+#
+# benchmark.py
+#
+# Offline benchmark for the perspectiveRemover pipeline.
+#
+
+"""
+Times each stage of perspectiveRemover's pipeline, and the pipeline end to
+end, on synthetic PNGs with fixed corners, and compares the results against
+a stored baseline.
+
+Synthetic images are generated on first use (1, 4, 16 and 50 megapixels;
+RGB and RGBA; 8 and 16 bits per channel) and kept in a data directory so
+later runs don't pay for generating them again.  Nothing is downloaded and
+no user interaction is needed, so the whole suite runs from one command:
+
+    python benchmark.py
+
+The import time of png.py and perspectiveRemover.py, as reported by
+python -X importtime in a fresh interpreter, is measured on every run as
+well; pass --sizes with no sizes to measure only that.
+
+Use --save-baseline to record the current timings as the new baseline.  When
+a baseline exists, any stage that got slower by more than the regression
+threshold is reported and the script exits with a non-zero status, as it
+does when the baseline lacks a stage this run timed.  Every engine has to
+record the stages listed for it in ENGINE_STAGES, or the run fails.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import jitKernels
+import png
+import perspectiveRemover
+
+
+DEFAULT_SIZES_MEGAPIXELS = (1, 4, 16, 50)
+# The reference engine is pure Python and would take hours over the default
+# sizes, so benchmark the tiled engine unless told otherwise
+DEFAULT_ENGINE = "tiled"
+DEFAULT_ITERATIONS = 3
+DEFAULT_DATA_DIR = ".benchmark-data"
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+# A stage regresses when it's this fraction slower than its baseline...
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+# ...and also slower by at least this many seconds, so that timer noise on
+# very short stages isn't reported as a regression.
+MIN_REGRESSION_SECONDS = 0.005
+
+# Corners of the synthetic rectangle as fractions of the image's width and
+# height, in the top-left, top-right, bottom-right, bottom-left order that
+# solveHomography expects.
+SYNTHETIC_CORNERS = ((0.10, 0.15), (0.85, 0.05), (0.95, 0.90), (0.05, 0.80))
+
+END_TO_END = "end-to-end"
+
+# Stages each engine's profiler records between decode and encode.  The
+# fill stage only comes when interpolating.  A run missing any of them is
+# an error rather than a stage left out of the comparison.
+ENGINE_STAGES = {
+    "reference": ("solve", "transform", "project", "rasterize", "fill"),
+    "vectorized": ("solve", "transform", "rasterize", "fill"),
+    "pushpull": ("solve", "transform", "rasterize", "fill"),
+    "compact": ("solve", "rasterize", "fill"),
+    "tiled": ("solve", "warp"),
+    "bilinear": ("solve", "warp"),
+    "mipmap": ("solve", "pyramid", "warp"),
+}
+
+# Modules whose import time is tracked, under this case name
+IMPORT_TIME_MODULES = ("png", "perspectiveRemover")
+IMPORT_TIME_CASE = "import-time"
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def getArgs():
+    argParser = argparse.ArgumentParser(description="Benchmark the perspective removal pipeline.")
+    argParser.add_argument("--sizes", type=float, nargs="*", default=DEFAULT_SIZES_MEGAPIXELS,
+        help="Synthetic image sizes to run, in megapixels")
+    argParser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS,
+        help="Number of timed runs of each case; the median is reported")
+    argParser.add_argument("--data-dir", type=str, default=DEFAULT_DATA_DIR,
+        help="Directory to keep generated synthetic images in")
+    argParser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE,
+        help="Baseline timings JSON file to compare against")
+    argParser.add_argument("--save-baseline", action="store_true",
+        help="Write this run's timings to the baseline file instead of comparing")
+    argParser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+        help="Fractional slowdown relative to the baseline that counts as a regression")
+    argParser.add_argument("--engine", type=str, choices=sorted(perspectiveRemover.ENGINES),
+        default=DEFAULT_ENGINE, help="perspectiveRemover engine to benchmark")
+    argParser.add_argument("--threads", type=int, default=1,
+        help="Number of threads for the engines that take them")
+    argParser.add_argument("--backend", type=str, choices=jitKernels.BACKENDS, default=jitKernels.DEFAULT_BACKEND,
+        help="jitKernels backend to run the engines with")
+    argParser.add_argument("-n", "--no-interpolate", dest='shouldInterpolate', action='store_false',
+        help="Benchmark without interpolating missing pixels")
+    argParser.set_defaults(shouldInterpolate=True)
+
+    args = argParser.parse_args()
+    if args.iterations < 1:
+        argParser.error("--iterations must be at least 1")
+    return args
+
+
+def syntheticDimensions(megapixels):
+    """(width, height) of a 4:3 image with roughly the given number of megapixels"""
+    height = max(int((megapixels * 1e6 * 3 / 4) ** 0.5), 2)
+    width = max(int(megapixels * 1e6 / height), 2)
+    return (width, height)
+
+def syntheticCorners(width, height):
+    return tuple((int(fx * width), int(fy * height)) for (fx, fy) in SYNTHETIC_CORNERS)
+
+def caseName(megapixels, alpha, bitdepth):
+    return "%gMP-%s-%d" % (megapixels, "RGBA" if alpha else "RGB", bitdepth)
+
+def makeSyntheticImage(filename, width, height, alpha, bitdepth):
+    """
+    Write a PNG of the given shape whose content is a pair of color gradients
+    under a checkerboard, so that it neither compresses to nothing nor looks
+    like noise.  Rows are generated one at a time to keep memory flat.
+    """
+    maxval = 2**bitdepth - 1
+    planes = 4 if alpha else 3
+    x = np.arange(width)
+
+    def rows():
+        for y in range(height):
+            row = np.empty((width, planes), dtype=np.int64)
+            row[:, 0] = x * maxval // (width - 1)
+            row[:, 1] = y * maxval // (height - 1)
+            row[:, 2] = ((x // 32 + y // 32) % 2) * maxval
+            if alpha:
+                row[:, 3] = maxval
+            yield row.ravel().tolist()
+
+    with open(filename, 'wb') as f:
+        png.Writer(width=width, height=height, alpha=alpha, bitdepth=bitdepth).write(f, rows())
+
+def syntheticCases(sizes, dataDir):
+    """
+    Yield (name, filename, corners) for each synthetic case, generating any
+    image that isn't already in dataDir.
+    """
+    os.makedirs(dataDir, exist_ok=True)
+    for megapixels in sizes:
+        (width, height) = syntheticDimensions(megapixels)
+        for alpha in (False, True):
+            for bitdepth in (8, 16):
+                name = caseName(megapixels, alpha, bitdepth)
+                filename = os.path.join(dataDir, name + ".png")
+                if not os.path.exists(filename):
+                    print("Generating", filename)
+                    makeSyntheticImage(filename, width, height, alpha, bitdepth)
+                yield (name, filename, syntheticCorners(width, height))
+
+
+def expectedStages(engineName, shouldInterpolate):
+    """The stages, including END_TO_END, that benchmarkCase reports for engineName"""
+    stages = ENGINE_STAGES[engineName]
+    if not shouldInterpolate:
+        stages = tuple(stage for stage in stages if stage != "fill")
+    return ("decode",) + stages + ("encode", END_TO_END)
+
+def runPipeline(engineName, filename, corners, outputFilename, shouldInterpolate, profiler, threads=1):
+    """One full decode, rectify and encode of filename, timed stage by stage"""
+    with profiler.stage("decode"):
+        image = perspectiveRemover.fileToImage(filename)
+
+    pixels = perspectiveRemover.engineFor(engineName, threads)(image, corners, shouldInterpolate,
+        perspectiveRemover.DEFAULT_IMAGE_BACKGROUND_RGB, profiler)
+
+    with profiler.stage("encode"):
+        perspectiveRemover.writeToFile(outputFilename, len(pixels[0]) // 3, len(pixels), pixels)
+
+def benchmarkCase(engineName, name, filename, corners, iterations, shouldInterpolate, outputDir, threads=1):
+    """
+    Run the pipeline with the given engine on filename iterations times.
+    Returns a dict mapping each stage name, and END_TO_END, to its median
+    wall time in seconds.
+    """
+    outputFilename = os.path.join(outputDir, name + ".out.png")
+    stageTimes = {}
+    for i in range(iterations):
+        # Memory tracing would distort the timings, so only time here and
+        # leave peak memory to --profile on perspectiveRemover itself.
+        profiler = perspectiveRemover.StageProfiler(enabled=True, traceMemory=False)
+        profiler.currentFile = name
+
+        start = time.perf_counter()
+        runPipeline(engineName, filename, corners, outputFilename, shouldInterpolate, profiler, threads)
+        stageTimes.setdefault(END_TO_END, []).append(time.perf_counter() - start)
+
+        for record in profiler.records:
+            stageTimes.setdefault(record["stage"], []).append(record["wallSeconds"])
+
+    missing = [stage for stage in expectedStages(engineName, shouldInterpolate) if stage not in stageTimes]
+    if missing:
+        raise RuntimeError("%s with the %s engine recorded no %s stage" % (name, engineName, ", ".join(missing)))
+    return {stage: statistics.median(times) for (stage, times) in stageTimes.items()}
+
+
+def importSeconds(module):
+    """
+    Cumulative time in seconds to import module in a fresh interpreter,
+    according to python -X importtime.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=SCRIPT_DIR, capture_output=True, text=True, check=True)
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1e6
+    raise RuntimeError("python -X importtime didn't report on " + module)
+
+def benchmarkImportTimes(iterations):
+    """Dict mapping each of IMPORT_TIME_MODULES to its median import time in seconds"""
+    return {module: statistics.median(importSeconds(module) for i in range(iterations))
+        for module in IMPORT_TIME_MODULES}
+
+
+def findRegressions(results, baseline, threshold):
+    """
+    Compare results against baseline, both of the form
+    {caseName: {stageName: seconds}}.  Returns a list of
+    (caseName, stageName, baselineSeconds, seconds) for every stage that
+    slowed down by more than threshold.  Cases or stages missing from the
+    baseline are not compared.
+    """
+    regressions = []
+    for (name, stages) in results.items():
+        for (stage, seconds) in stages.items():
+            baselineSeconds = baseline.get(name, {}).get(stage)
+            if baselineSeconds is None:
+                continue
+            if (seconds > baselineSeconds * (1 + threshold) and
+                    seconds - baselineSeconds > MIN_REGRESSION_SECONDS):
+                regressions.append((name, stage, baselineSeconds, seconds))
+    return regressions
+
+def printResults(results, baseline):
+    for (name, stages) in results.items():
+        print(name)
+        for (stage, seconds) in stages.items():
+            baselineSeconds = baseline.get(name, {}).get(stage)
+            if baselineSeconds:
+                print("  %-20s %10.4fs  (baseline %.4fs, %+.1f%%)" % (stage, seconds,
+                    baselineSeconds, 100 * (seconds - baselineSeconds) / baselineSeconds))
+            else:
+                print("  %-20s %10.4fs" % (stage, seconds))
+
+
+if __name__ == "__main__":
+
+    args = getArgs()
+    jitKernels.useBackend(args.backend)
+
+    results = {IMPORT_TIME_CASE: benchmarkImportTimes(args.iterations)}
+    with tempfile.TemporaryDirectory() as outputDir:
+        for (name, filename, corners) in syntheticCases(args.sizes, args.data_dir):
+            print("Benchmarking", name)
+            results[name] = benchmarkCase(args.engine, name, filename, corners, args.iterations,
+                args.shouldInterpolate, outputDir, args.threads)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        printResults(results, {})
+        print("Saved baseline to", args.baseline)
+        sys.exit(0)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        print("No baseline at %s; run with --save-baseline to create one" % args.baseline)
+
+    printResults(results, baseline)
+
+    # A baseline saved when a stage went unrecorded can't catch that
+    # stage's regressions
+    outdated = [(name, stage) for (name, stages) in results.items() if name in baseline
+        for stage in stages if stage not in baseline[name]]
+    for (name, stage) in outdated:
+        print("MISSING FROM BASELINE %s %s; run with --save-baseline to record it" % (name, stage))
+
+    regressions = findRegressions(results, baseline, args.threshold)
+    for (name, stage, baselineSeconds, seconds) in regressions:
+        print("REGRESSION %s %s: %.4fs -> %.4fs" % (name, stage, baselineSeconds, seconds))
+    sys.exit(1 if regressions or outdated else 0)
@@ -0,0 +1,391 @@
+#!/usr/bin/python3
+#
+# cornerDetector.py
+#
+# Automatic detection of the rectangle's corners for perspectiveRemover.
+#
+
+"""
+Finds the four corners of a high-contrast flat surface, such as a document,
+whiteboard or book page, in a decoded image, so that nobody has to click
+them.
+
+    python cornerDetector.py --sidecar scan1.png scan2.png
+
+The image is shrunk to about DETECTION_SIZE pixels on its longest side and
+its edges found with a Sobel filter.  Each edge pixel votes in a Hough
+transform for the lines through it near its gradient direction, and the
+strongest lines are refitted to their edge pixels by least squares.  Every
+way of taking two pairs of those lines as opposite sides of a quadrilateral
+is then scored by how much of the quadrilateral's outline lies on edges.
+The best one's corners are returned with that fraction as the confidence.
+"""
+
+import argparse
+import itertools
+import json
+import sys
+
+import numpy as np
+
+
+# Longest side of the shrunken image edges are detected in
+DETECTION_SIZE = 640
+
+# The shrunken image is blurred this many times by a box filter of this
+# radius before finding edges
+BLUR_RADIUS = 2
+BLUR_PASSES = 2
+
+# Fraction of the shrunken image's pixels, the strongest edges, that vote
+EDGE_FRACTION = 0.06
+
+# Angle bins of the Hough transform over 180 degrees, and how many bins
+# either side of its gradient direction each edge pixel votes in
+HOUGH_THETA_BINS = 180
+HOUGH_THETA_WINDOW = 3
+
+# Strongest lines considered as sides, and the neighbourhood, in angle bins
+# and pixels, cleared around each one so the next is a different line
+CANDIDATE_LINES = 8
+PEAK_THETA_RADIUS = 6
+PEAK_RHO_RADIUS = 12
+
+# Edge pixels within this distance of a line are used to refit it
+REFIT_DISTANCE = 2.0
+
+# Opposite sides differ in angle by at most this much, adjacent sides by at
+# least this much, in degrees
+MAX_OPPOSITE_ANGLE = 40
+MIN_ADJACENT_ANGLE = 35
+
+# Smallest quadrilateral, as a fraction of the image, worth returning, and
+# how far its corners may lie outside the image, as a fraction of its size
+MIN_AREA_FRACTION = 0.05
+CORNER_MARGIN = 0.02
+
+# Points sampled along each side when measuring its edge support
+SIDE_SAMPLES = 64
+
+# Each side is refined in the original image from this many profiles
+# across it, each reaching this many shrunken pixels either side of it
+REFINE_PROFILES = 48
+REFINE_REACH = 2
+
+# Confidence below which perspectiveRemover asks for clicks instead
+DEFAULT_MIN_CONFIDENCE = 0.8
+
+
+def getArgs():
+    argParser = argparse.ArgumentParser(description="Detect the corners of a document in images.")
+    argParser.add_argument("filenames", type=str, nargs="+", help="Images to detect corners in")
+    argParser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE,
+        help="Confidence below which no sidecar file is written")
+    argParser.add_argument("--sidecar", action="store_true",
+        help="Write each confident detection to the image's corner sidecar file")
+    return argParser.parse_args()
+
+
+def shrink(pixels):
+    """
+    Input: A (height, width, channels) uint8 pixels array.
+
+    Output: A tuple (gray, step) where gray is a float32 luma image about
+    DETECTION_SIZE pixels on its longest side, each pixel the mean of a few
+    samples spread over the step x step block of the original it covers.
+    Pixel (x, y) of gray is centered on (x * step + offset, y * step + offset)
+    in the original, with offset from shrinkOffset.
+    """
+    (height, width) = pixels.shape[:2]
+    step = max(1, -(-max(height, width) // DETECTION_SIZE))
+    (rows, columns) = (height // step, width // step)
+    phases = (0, step // 2) if step > 1 else (0,)
+
+    gray = np.zeros((rows, columns), dtype=np.float32)
+    for rowPhase in phases:
+        for columnPhase in phases:
+            samples = pixels[rowPhase:rowPhase + rows * step:step, columnPhase:columnPhase + columns * step:step]
+            gray += 0.299 * samples[:, :, 0] + 0.587 * samples[:, :, 1] + 0.114 * samples[:, :, 2]
+    gray /= len(phases) ** 2
+    return (gray, step)
+
+def shrinkOffset(step):
+    return (step // 2) / 2 if step > 1 else 0.0
+
+def boxBlur(gray, radius):
+    """gray averaged over (2 * radius + 1)-pixel squares, edges extended, via cumulative sums"""
+    width = 2 * radius + 1
+    for axis in (0, 1):
+        padded = np.pad(gray, [(radius + 1, radius) if a == axis else (0, 0) for a in (0, 1)], mode="edge")
+        padded[(slice(None),) * axis + (0,)] = 0
+        sums = np.cumsum(padded, axis=axis, dtype=np.float64)
+        gray = ((np.take(sums, np.arange(width, sums.shape[axis]), axis=axis) -
+            np.take(sums, np.arange(0, sums.shape[axis] - width), axis=axis)) / width).astype(np.float32)
+    return gray
+
+def sobel(gray):
+    """
+    Horizontal and vertical Sobel gradients of gray, as arrays two pixels
+    smaller in each direction, so that their (x, y) is gray's (x + 1, y + 1).
+    """
+    rows = gray[:-2] + 2 * gray[1:-1] + gray[2:]
+    columns = gray[:, :-2] + 2 * gray[:, 1:-1] + gray[:, 2:]
+    return (rows[:, 2:] - rows[:, :-2], columns[2:] - columns[:-2])
+
+
+def houghLines(edgeX, edgeY, angles, weights, diagonal):
+    """
+    The CANDIDATE_LINES strongest lines through the edge pixels at
+    (edgeX, edgeY), whose gradient directions are angles in [0, pi), as a
+    list of (theta, rho) with x cos(theta) + y sin(theta) = rho.
+    """
+    rhoBins = 2 * diagonal + 1
+    thetas = np.arange(HOUGH_THETA_BINS) * np.pi / HOUGH_THETA_BINS
+    (cosines, sines) = (np.cos(thetas), np.sin(thetas))
+
+    baseBins = np.round(angles * HOUGH_THETA_BINS / np.pi).astype(np.int64)
+    votes = np.zeros(HOUGH_THETA_BINS * rhoBins)
+    for offset in range(-HOUGH_THETA_WINDOW, HOUGH_THETA_WINDOW + 1):
+        thetaBins = (baseBins + offset) % HOUGH_THETA_BINS
+        rhoIndices = np.round(edgeX * cosines[thetaBins] + edgeY * sines[thetaBins]).astype(np.int64) + diagonal
+        votes += np.bincount(thetaBins * rhoBins + rhoIndices, weights, minlength=votes.size)
+    votes = votes.reshape((HOUGH_THETA_BINS, rhoBins))
+
+    lines = []
+    for i in range(CANDIDATE_LINES):
+        (thetaBin, rhoIndex) = np.unravel_index(np.argmax(votes), votes.shape)
+        if votes[thetaBin, rhoIndex] <= 0:
+            break
+        lines.append((thetas[thetaBin], rhoIndex - diagonal))
+
+        # Clear around the peak.  Past either end of the angle range the
+        # same lines have their rho negated.
+        for offset in range(-PEAK_THETA_RADIUS, PEAK_THETA_RADIUS + 1):
+            wrappedBin = thetaBin + offset
+            peakRho = rhoIndex
+            if not 0 <= wrappedBin < HOUGH_THETA_BINS:
+                wrappedBin %= HOUGH_THETA_BINS
+                peakRho = rhoBins - 1 - rhoIndex
+            votes[wrappedBin, max(peakRho - PEAK_RHO_RADIUS, 0):peakRho + PEAK_RHO_RADIUS + 1] = 0
+    return lines
+
+def refitLine(theta, rho, edgeX, edgeY, weights):
+    """
+    The line (normalX, normalY, rho) fitted by weighted total least squares
+    to the edge pixels within REFIT_DISTANCE of the Hough line (theta, rho),
+    or the Hough line itself if too few are.
+    """
+    (normalX, normalY) = (np.cos(theta), np.sin(theta))
+    near = np.abs(edgeX * normalX + edgeY * normalY - rho) <= REFIT_DISTANCE
+    if near.sum() < 3:
+        return (normalX, normalY, float(rho))
+
+    points = np.stack([edgeX[near], edgeY[near]])
+    pointWeights = weights[near] / weights[near].sum()
+    centroid = points @ pointWeights
+    centered = points - centroid[:, np.newaxis]
+    covariance = (centered * pointWeights) @ centered.T
+    # The normal is the direction the points vary least in
+    (normalX, normalY) = np.linalg.eigh(covariance)[1][:, 0]
+    return (normalX, normalY, float(normalX * centroid[0] + normalY * centroid[1]))
+
+def intersect(first, second):
+    """Where two (normalX, normalY, rho) lines cross, or None if they're parallel"""
+    matrix = np.array([first[:2], second[:2]])
+    if abs(np.linalg.det(matrix)) < 1e-9:
+        return None
+    return np.linalg.solve(matrix, [first[2], second[2]])
+
+def lineAngle(first, second):
+    """Angle between two lines in degrees, from 0 to 90"""
+    cosine = abs(first[0] * second[0] + first[1] * second[1])
+    return np.degrees(np.arccos(min(cosine, 1.0)))
+
+def orderCorners(points):
+    """
+    The four (x, y) points in the order solveHomography expects: top-left,
+    top-right, bottom-right, bottom-left.  With y pointing down, sorting by
+    angle around the center goes clockwise, and the top-left corner is the
+    one with the smallest x + y.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    center = points.mean(axis=0)
+    clockwise = points[np.argsort(np.arctan2(points[:, 1] - center[1], points[:, 0] - center[0]))]
+    return np.roll(clockwise, -int(np.argmin(clockwise.sum(axis=1))), axis=0)
+
+def quadArea(corners):
+    """Area of the quadrilateral with the given corners in order (shoelace formula)"""
+    (x, y) = (corners[:, 0], corners[:, 1])
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+def isConvex(corners):
+    edges = np.roll(corners, -1, axis=0) - corners
+    turns = edges[:, 0] * np.roll(edges[:, 1], -1) - edges[:, 1] * np.roll(edges[:, 0], -1)
+    return bool(np.all(turns > 0) or np.all(turns < 0))
+
+def sideSupports(corners, edgeMask):
+    """Fraction of SIDE_SAMPLES points along each side of the quadrilateral that fall on edgeMask"""
+    (height, width) = edgeMask.shape
+    fractions = np.linspace(0, 1, SIDE_SAMPLES)[:, np.newaxis]
+    supports = []
+    for (start, end) in zip(corners, np.roll(corners, -1, axis=0)):
+        points = np.round(start + (end - start) * fractions).astype(np.int64)
+        inside = (points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)
+        onEdge = np.zeros(SIDE_SAMPLES, dtype=bool)
+        onEdge[inside] = edgeMask[points[inside, 1], points[inside, 0]]
+        supports.append(onEdge.mean())
+    return supports
+
+def refineCorners(pixels, corners, step):
+    """
+    corners, found in the shrunken image and scaled up to the original,
+    moved to where the sides' edges are in the original.  Each side is
+    sampled across at REFINE_PROFILES points, the steepest step in
+    brightness along each profile taken as an edge point, and a line fitted
+    to those points; the corners are where the fitted lines meet.  A corner
+    that would move further than the shrinking could account for stays put.
+    """
+    (height, width) = pixels.shape[:2]
+    reach = REFINE_REACH * step
+    offsets = np.arange(-reach, reach + 1, dtype=np.float64)
+    fractions = np.linspace(0.1, 0.9, REFINE_PROFILES)[:, np.newaxis]
+
+    lines = []
+    for (start, end) in zip(corners, np.roll(corners, -1, axis=0)):
+        direction = (end - start) / np.hypot(*(end - start))
+        normal = np.array([-direction[1], direction[0]])
+        centers = start + (end - start) * fractions
+        points = centers[:, np.newaxis, :] + offsets[np.newaxis, :, np.newaxis] * normal
+        x = np.clip(np.round(points[..., 0]).astype(np.intp), 0, width - 1)
+        y = np.clip(np.round(points[..., 1]).astype(np.intp), 0, height - 1)
+        samples = pixels[y, x, :3].astype(np.float32)
+        profiles = 0.299 * samples[..., 0] + 0.587 * samples[..., 1] + 0.114 * samples[..., 2]
+        # Smooth each profile over a few pixels so that noise doesn't win
+        profiles = (profiles[:, :-2] + profiles[:, 1:-1] + profiles[:, 2:]) / 3
+        steps = np.abs(np.diff(profiles, axis=1))
+        # Between the two samples of the steepest step, allowing for the
+        # smoothing having moved the profile along by a pixel, and moved to
+        # the peak of the parabola through it and the steps either side
+        steepest = np.clip(np.argmax(steps, axis=1), 1, steps.shape[1] - 2)
+        (before, at, after) = (steps[np.arange(len(steps)), steepest + shift] for shift in (-1, 0, 1))
+        curvature = before - 2 * at + after
+        peak = np.where(curvature < 0, 0.5 * (before - after) / np.where(curvature < 0, curvature, -1), 0)
+        positions = offsets[steepest] + 1.5 + np.clip(peak, -0.5, 0.5)
+        edgePoints = centers + positions[:, np.newaxis] * normal
+
+        line = fitLine(edgePoints)
+        # Drop profiles that caught something else, then fit again
+        residuals = np.abs(edgePoints @ np.array(line[:2]) - line[2])
+        keep = residuals <= max(2 * np.median(residuals), 1.0)
+        lines.append(fitLine(edgePoints[keep]) if keep.sum() >= 3 else line)
+
+    refined = np.array([intersect(lines[i - 1], lines[i]) for i in range(4)])
+    moved = np.hypot(*(refined - corners).T) > 2 * step
+    refined[moved] = corners[moved]
+    return refined
+
+def fitLine(points):
+    """The (normalX, normalY, rho) line fitted to the (n, 2) points by total least squares"""
+    centroid = points.mean(axis=0)
+    centered = points - centroid
+    (normalX, normalY) = np.linalg.eigh(centered.T @ centered)[1][:, 0]
+    return (normalX, normalY, float(normalX * centroid[0] + normalY * centroid[1]))
+
+
+def detectCorners(pixels):
+    """
+    Input: A (height, width, channels) uint8 pixels array, as from
+    perspectiveRemover.loadPixels.
+
+    Output: A tuple (corners, confidence).  corners is a 4-tuple of (x, y)
+    original image coordinates in the order solveHomography expects, or
+    None if no plausible quadrilateral was found.  confidence, from 0 to 1,
+    is the fraction of the least supported side's length that lies on
+    detected edges.
+    """
+    (gray, step) = shrink(pixels)
+    if min(gray.shape) < 8:
+        return (None, 0.0)
+    # Blurring washes out fine texture such as lines of text, which would
+    # otherwise outvote the surface's own outline
+    for i in range(BLUR_PASSES):
+        gray = boxBlur(gray, BLUR_RADIUS)
+    (gradientX, gradientY) = sobel(gray)
+    magnitude = np.hypot(gradientX, gradientY)
+
+    # The strongest edges; np.partition finds the cutoff without a full sort
+    cutoffIndex = int(magnitude.size * (1 - EDGE_FRACTION))
+    cutoff = max(float(np.partition(magnitude.ravel(), cutoffIndex)[cutoffIndex]), 1e-3)
+    edgeMask = magnitude >= cutoff
+    (edgeY, edgeX) = np.nonzero(edgeMask)
+    weights = magnitude[edgeY, edgeX]
+    angles = np.arctan2(gradientY[edgeY, edgeX], gradientX[edgeY, edgeX]) % np.pi
+    # Back to gray's coordinates
+    edgeX = edgeX + 1.0
+    edgeY = edgeY + 1.0
+
+    # Sides are counted as on an edge up to a pixel away from one
+    paddedMask = np.zeros((gray.shape[0] + 2, gray.shape[1] + 2), dtype=bool)
+    paddedMask[1:-1, 1:-1] = np.pad(edgeMask, 1)
+    nearEdge = np.zeros(gray.shape, dtype=bool)
+    for (dy, dx) in itertools.product(range(3), range(3)):
+        nearEdge |= paddedMask[dy:dy + gray.shape[0], dx:dx + gray.shape[1]]
+
+    diagonal = int(np.ceil(np.hypot(*gray.shape)))
+    lines = [refitLine(theta, rho, edgeX, edgeY, weights)
+        for (theta, rho) in houghLines(edgeX, edgeY, angles, weights, diagonal)]
+
+    (height, width) = gray.shape
+    margin = CORNER_MARGIN * max(height, width)
+    best = (None, 0.0, -1.0)
+    for chosen in itertools.combinations(lines, 4):
+        (a, b, c, d) = chosen
+        for ((first, second), (third, fourth)) in (((a, b), (c, d)), ((a, c), (b, d)), ((a, d), (b, c))):
+            if lineAngle(first, second) > MAX_OPPOSITE_ANGLE or lineAngle(third, fourth) > MAX_OPPOSITE_ANGLE:
+                continue
+            if min(lineAngle(first, third), lineAngle(first, fourth)) < MIN_ADJACENT_ANGLE:
+                continue
+            points = [intersect(side, other) for side in (first, second) for other in (third, fourth)]
+            if any(point is None for point in points):
+                continue
+            corners = orderCorners(points)
+            if (corners[:, 0].min() < -margin or corners[:, 0].max() > width + margin or
+                    corners[:, 1].min() < -margin or corners[:, 1].max() > height + margin):
+                continue
+            areaFraction = quadArea(corners) / (height * width)
+            if areaFraction < MIN_AREA_FRACTION or not isConvex(corners):
+                continue
+
+            confidence = min(sideSupports(corners, nearEdge))
+            # Of outlines equally well supported, prefer the larger, which
+            # is the surface rather than something drawn on it
+            score = confidence + 0.25 * areaFraction
+            if score > best[2]:
+                best = (corners, confidence, score)
+
+    (corners, confidence, score) = best
+    if corners is None:
+        return (None, 0.0)
+    # Back to the original's coordinates, where gray's pixel centers sit
+    corners = refineCorners(pixels, corners * step + shrinkOffset(step), step)
+    return (tuple((round(float(x), 2), round(float(y), 2)) for (x, y) in corners), float(confidence))
+
+
+if __name__ == "__main__":
+
+    # Only needed here; perspectiveRemover imports this module, not the
+    # other way round, when it detects corners itself
+    import perspectiveRemover
+
+    args = getArgs()
+    failures = 0
+    for filename in args.filenames:
+        (corners, confidence) = detectCorners(perspectiveRemover.loadPixels(filename))
+        confident = corners is not None and confidence >= args.min_confidence
+        failures += not confident
+        print(json.dumps({"filename": filename, "corners": corners, "confidence": round(confidence, 3),
+            "confident": confident}))
+        if confident and args.sidecar:
+            with open(perspectiveRemover.cornerSidecarFilename(filename), 'w') as f:
+                json.dump([list(corner) for corner in corners], f)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,132 @@
+#
+# cornerTracker.py
+#
+# Following the rectangle's corners through consecutive frames.
+#
+
+"""
+Tracks the four corners of the rectangle through a sequence of frames from
+a camera that drifts a little between them, so that the corners only have
+to be given, or detected, for the first frame.
+
+Each corner is found again in every frame by normalized cross-correlation:
+a patch around it in the key frame, the frame the corners were last solved
+for, is compared with every placement in a small window around where the
+corner was in the previous frame, all at once with numpy.  The corners
+handed back only change, and the homography only needs solving again, once
+some corner has moved more than a threshold from where it was last solved;
+smaller movements are taken as jitter and leave the output geometry as it
+was.  Solving again also makes the frame the new key frame.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Half the size of the patch matched around each corner, and the farthest a
+# corner is looked for from where it was in the previous frame, in pixels
+PATCH_RADIUS = 8
+SEARCH_RADIUS = 16
+
+# Pixels a corner must move from where it was last solved before the
+# corners are updated
+DEFAULT_MOVE_THRESHOLD = 1.5
+
+# Correlation below which a corner counts as lost for the frame and stays
+# where it was
+MIN_CORRELATION = 0.5
+
+
+def lumaPatch(pixels, x, y, radius):
+    """
+    The (2 * radius + 1)-pixel square of pixels' luma centered on the pixel
+    nearest (x, y), as float32, with pixels off the image repeating the
+    nearest edge pixel.
+    """
+    (height, width) = pixels.shape[:2]
+    offsets = np.arange(-radius, radius + 1)
+    rows = np.clip(int(round(y)) + offsets, 0, height - 1)
+    columns = np.clip(int(round(x)) + offsets, 0, width - 1)
+    samples = pixels[rows[:, np.newaxis], columns[np.newaxis, :], :3].astype(np.float32)
+    return 0.299 * samples[..., 0] + 0.587 * samples[..., 1] + 0.114 * samples[..., 2]
+
+def correlationMap(search, template):
+    """
+    Normalized cross-correlation of template with every placement of it
+    inside search, as an array with one entry per placement.  Flat
+    placements, which correlate with nothing, get 0.
+    """
+    windows = sliding_window_view(search, template.shape)
+    count = template.size
+    centered = template - template.mean()
+    templateNorm = np.sqrt((centered * centered).sum())
+
+    # centered sums to zero, so the windows' means drop out of the numerator
+    numerator = np.tensordot(windows, centered, axes=((2, 3), (0, 1)))
+    windowSums = windows.sum(axis=(2, 3))
+    windowSquares = np.tensordot(windows * windows, np.ones(template.shape, dtype=np.float32),
+        axes=((2, 3), (0, 1)))
+    windowNorms = np.sqrt(np.maximum(windowSquares - windowSums * windowSums / count, 0))
+    denominator = windowNorms * templateNorm
+    return np.where(denominator > 1e-6, numerator / np.maximum(denominator, 1e-6), 0)
+
+def subpixelPeak(scores, index):
+    """Offset from index, from -0.5 to 0.5, of the parabola through scores[index - 1:index + 2]"""
+    if index <= 0 or index >= len(scores) - 1:
+        return 0.0
+    (before, at, after) = scores[index - 1:index + 2]
+    curvature = before - 2 * at + after
+    if curvature >= 0:
+        return 0.0
+    return float(np.clip(0.5 * (before - after) / curvature, -0.5, 0.5))
+
+
+class CornerTracker:
+    """
+    Follows corners, a 4-tuple of (x, y) pairs in the pixels array of the
+    first frame, through later frames given to track.  corners holds the
+    corners to rectify the latest frame with, and resolved whether they
+    changed for it.
+    """
+
+    def __init__(self, pixels, corners, moveThreshold=DEFAULT_MOVE_THRESHOLD, patchRadius=PATCH_RADIUS,
+            searchRadius=SEARCH_RADIUS):
+        self.moveThreshold = moveThreshold
+        self.patchRadius = patchRadius
+        self.searchRadius = searchRadius
+        self.corners = tuple((float(x), float(y)) for (x, y) in corners)
+        self.resolved = True
+        # Where each corner was seen last, and how well it matched there
+        self.positions = np.array(self.corners)
+        self.correlations = np.ones(4)
+        self.setKeyFrame(pixels)
+
+    def setKeyFrame(self, pixels):
+        self.templates = [lumaPatch(pixels, x, y, self.patchRadius) for (x, y) in self.positions]
+        # Templates are centered on whole pixels; how far off each corner is
+        self.templateOffsets = self.positions - np.round(self.positions)
+
+    def track(self, pixels):
+        """
+        Find the corners in the next frame's pixels array.  Returns the
+        corners to rectify it with: the same as for the previous frame
+        unless some corner has moved more than moveThreshold from them.
+        """
+        reach = self.patchRadius + self.searchRadius
+        for (i, (x, y)) in enumerate(self.positions):
+            search = lumaPatch(pixels, x, y, reach)
+            scores = correlationMap(search, self.templates[i])
+            (row, column) = np.unravel_index(np.argmax(scores), scores.shape)
+            self.correlations[i] = scores[row, column]
+            if self.correlations[i] < MIN_CORRELATION:
+                continue
+            dx = column - self.searchRadius + subpixelPeak(scores[row], column)
+            dy = row - self.searchRadius + subpixelPeak(scores[:, column], row)
+            self.positions[i] = np.array((round(x) + dx, round(y) + dy)) + self.templateOffsets[i]
+
+        movement = np.hypot(*(self.positions - np.array(self.corners)).T)
+        self.resolved = bool(movement.max() > self.moveThreshold)
+        if self.resolved:
+            self.corners = tuple((round(float(x), 2), round(float(y), 2)) for (x, y) in self.positions)
+            self.setKeyFrame(pixels)
+        return self.corners
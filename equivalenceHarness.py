@@ -0,0 +1,294 @@
+#!/usr/bin/python3
+#
+# equivalenceHarness.py
+#
+# Golden-output comparison of perspectiveRemover engines.
+#
+
+"""
+Checks that each of perspectiveRemover's engines reproduces the output of
+the original per-pixel "reference" engine.
+
+Every engine is run on the demo images and on synthetic images (see
+benchmark.py), with fixed corners, both with and without interpolation of
+missing pixels.  Each output is diffed pixel by pixel against the reference
+output and reported next to the engine's speedup over the reference.
+
+Engines that resample rather than reproduce the reference exactly can be
+checked with --tolerance (largest per-channel difference that still counts
+as a match) and --max-mismatch-fraction (fraction of pixels allowed to
+differ by more than that); engines in ENGINE_LIMITS have their own
+defaults for both.  Engines in COVERED_ONLY_ENGINES sample the original
+at every pixel rather than splatting it forward, so they're only compared
+on the pixels both they and the reference cover without interpolating.
+Engines in FILL_ENGINES fill in missing pixels their own way, so when
+interpolating they're checked against an engine that samples every pixel
+instead, over the whole outline of the original image.  Engines in
+ENVELOPE_ENGINES blend several original pixels into each output
+pixel, so they're checked against the range of the reference's colors
+around each pixel rather than against the pixel itself.  An engine whose
+output isn't the size of the image it's checked against fails outright.
+The script exits with a non-zero status if any engine fails.
+
+With --backend numba the engines run on the compiled kernels in
+jitKernels, and each png decoded by jitKernels.Reader is also checked
+against png.Reader's decoding of it.
+
+    python equivalenceHarness.py --engines vectorized
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+import benchmark
+import jitKernels
+import perspectiveRemover
+import png
+
+
+REFERENCE_ENGINE = "reference"
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "demo")
+
+# Demo images with the corners of the rectangle to straighten out, in the
+# order solveHomography expects
+DEMO_INPUTS = (
+    (os.path.join(DEMO_DIR, "birds.png"), ((70, 190), (305, 30), (290, 650), (25, 620))),
+    (os.path.join(DEMO_DIR, "book.png"), ((48, 8), (178, 4), (170, 292), (50, 268))),
+)
+
+DEFAULT_SYNTHETIC_SIZES_MEGAPIXELS = (0.05,)
+
+# Default (tolerance, maxMismatchFraction) for engines that aren't expected
+# to match the reference exactly.  Each fraction is the largest measured on
+# the demo and synthetic inputs with either backend, rounded up a little, so
+# that an engine getting any worse fails.
+ENGINE_LIMITS = {
+    # Nearest-pixel sampling like the reference's, but where the reference
+    # has several pixels landing close together it can pick another one
+    # (1.59% of book.png)
+    "tiled": (32, 0.017),
+    # float32 rounding moves the odd point into the neighbouring pixel
+    # (0.0054% of birds.png)
+    "compact": (0, 0.0001),
+    # Checked against the reference's neighbourhood (see ENVELOPE_ENGINES):
+    # averages and blends of original pixels can only leave its range by
+    # rounding, a level or two, except where foreshortening squeezes more
+    # than ENVELOPE_RADIUS pixels' worth of the original into one pixel
+    # (0.086% and 0.31% of book.png)
+    "mipmap": (2, 0.001),
+    "bilinear": (2, 0.0035),
+}
+
+# Engines that sample the original image at every altered pixel rather
+# than splatting the original pixels forward
+COVERED_ONLY_ENGINES = {"tiled", "mipmap", "bilinear"}
+
+# Engines that splat like the reference but fill in missing pixels with
+# another method than its own, with the engine their filled-in images are
+# checked against and the (tolerance, maxMismatchFraction) for that.  The
+# fill blends the splatted pixels around each hole, so the check is against
+# the range of the other engine's colors around each pixel, as for
+# ENVELOPE_ENGINES.  Without interpolation they match the reference exactly.
+FILL_ENGINES = {
+    # Blocks of the push-pull pyramid reach past the radius here and there
+    # (0.71% of book.png)
+    "pushpull": ("tiled", 2, 0.008),
+}
+
+# Engines that blend the original pixels around each sampling point, so
+# that each output pixel only has to lie within the range of the reference's
+# pixels up to ENVELOPE_RADIUS pixels away
+ENVELOPE_ENGINES = {"mipmap", "bilinear"}
+ENVELOPE_RADIUS = 2
+
+# Distinct background colors for finding the pixels an engine covers
+COVERAGE_BACKGROUNDS = ((0, 0, 0), (255, 255, 255))
+
+
+def getArgs():
+    otherEngines = sorted(name for name in perspectiveRemover.ENGINES if name != REFERENCE_ENGINE)
+
+    argParser = argparse.ArgumentParser(description="Compare perspective removal engines against the reference.")
+    argParser.add_argument("--engines", type=str, nargs="+", choices=otherEngines, default=otherEngines,
+        help="Engines to check against the reference engine")
+    argParser.add_argument("--tolerance", type=int, default=None,
+        help="Largest per-channel difference from the reference that still counts as matching "
+            "(default 0, or the engine's entry in ENGINE_LIMITS)")
+    argParser.add_argument("--max-mismatch-fraction", type=float, default=None,
+        help="Fraction of pixels allowed to differ by more than the tolerance "
+            "(default 0, or the engine's entry in ENGINE_LIMITS)")
+    argParser.add_argument("--threads", type=int, default=1,
+        help="Number of threads for the engines that take them")
+    argParser.add_argument("--backend", type=str, choices=jitKernels.BACKENDS, default=jitKernels.DEFAULT_BACKEND,
+        help="jitKernels backend to run the engines with")
+    argParser.add_argument("--synthetic-sizes", type=float, nargs="*", default=DEFAULT_SYNTHETIC_SIZES_MEGAPIXELS,
+        help="Sizes in megapixels of the synthetic images to compare on")
+    argParser.add_argument("--data-dir", type=str, default=benchmark.DEFAULT_DATA_DIR,
+        help="Directory to keep generated synthetic images in")
+    argParser.add_argument("-b", "--backgroundRGB", type=int, nargs=3,
+        default=perspectiveRemover.DEFAULT_IMAGE_BACKGROUND_RGB,
+        help="0-255 R,G,B channel values for the altered image background")
+    return argParser.parse_args()
+
+
+def runEngine(engineName, image, corners, shouldInterpolate, backgroundRGB, threads=1):
+    """Returns (pixels, seconds), with pixels as a 2-D uint8 array"""
+    start = time.perf_counter()
+    pixels = perspectiveRemover.engineFor(engineName, threads)(image, corners, shouldInterpolate, backgroundRGB)
+    seconds = time.perf_counter() - start
+    return (np.asarray(pixels, dtype=np.uint8), seconds)
+
+def engineCoverage(engineName, image, corners, threads=1, shouldInterpolate=False):
+    """
+    (height, width) bool array of the pixels an engine gives a color from
+    the original image, without interpolating unless shouldInterpolate,
+    found as those that don't change with the background color.
+    """
+    (first, second) = (runEngine(engineName, image, corners, shouldInterpolate, backgroundRGB, threads)[0]
+        for backgroundRGB in COVERAGE_BACKGROUNDS)
+    return (first == second).reshape((first.shape[0], -1, 3)).all(axis=2)
+
+def neighbourhoodRange(pixels, radius, mask=None):
+    """
+    (low, high) per-channel int16 arrays of the smallest and largest value
+    of each channel over the pixels up to radius pixels away, in the
+    (height, width, channels) shape, counting only the pixels set in mask if
+    one is given.
+    """
+    (height, width) = pixels.shape[:2]
+    pixels = pixels.astype(np.int16)
+    low = np.full(pixels.shape, np.iinfo(np.int16).max, dtype=np.int16)
+    high = np.full(pixels.shape, np.iinfo(np.int16).min, dtype=np.int16)
+    if mask is None:
+        (lowSource, highSource) = (pixels, pixels)
+    else:
+        lowSource = np.where(mask[..., None], pixels, low)
+        highSource = np.where(mask[..., None], pixels, high)
+    for dy in range(-radius, radius + 1):
+        (fromRows, toRows) = (slice(max(dy, 0), height + min(dy, 0)), slice(max(-dy, 0), height + min(-dy, 0)))
+        for dx in range(-radius, radius + 1):
+            (fromColumns, toColumns) = (slice(max(dx, 0), width + min(dx, 0)),
+                slice(max(-dx, 0), width + min(-dx, 0)))
+            np.minimum(low[toRows, toColumns], lowSource[fromRows, fromColumns], out=low[toRows, toColumns])
+            np.maximum(high[toRows, toColumns], highSource[fromRows, fromColumns], out=high[toRows, toColumns])
+    return (low, high)
+
+def compareOutputs(reference, candidate, tolerance, mask=None, radius=0):
+    """
+    Pixel by pixel comparison of two images in the 2-D form runEngine
+    returns, limited to the pixels set in the (height, width) bool array
+    mask if one is given.  With a radius, each candidate pixel is compared
+    against the range of the reference's (masked) pixels up to radius pixels
+    away, and only counts as different by as much as it lies outside it.
+    Returns a dict of difference statistics; when the shapes don't match
+    only "shapeMatches" is meaningful and every pixel counts as mismatched.
+    """
+    if reference.shape != candidate.shape:
+        return {"shapeMatches": False, "maxDifference": None, "meanDifference": None,
+            "mismatchedPixels": reference.size // 3, "mismatchFraction": 1.0}
+
+    shape = (reference.shape[0], -1, 3)
+    (low, high) = neighbourhoodRange(reference.reshape(shape), radius, mask)
+    candidate = candidate.reshape(shape).astype(np.int16)
+    difference = np.maximum(np.maximum(low - candidate, candidate - high), 0)
+    # Largest difference over each pixel's channels
+    pixelDifference = difference.max(axis=2)
+    if mask is not None:
+        difference = difference[mask]
+        pixelDifference = pixelDifference[mask]
+    mismatchedPixels = int((pixelDifference > tolerance).sum())
+    return {"shapeMatches": True,
+        "maxDifference": int(difference.max()),
+        "meanDifference": float(difference.mean()),
+        "mismatchedPixels": mismatchedPixels,
+        "mismatchFraction": mismatchedPixels / pixelDifference.size}
+
+def allInputs(syntheticSizes, dataDir):
+    """Yield (name, filename, corners) for the demo images and synthetic images"""
+    for (filename, corners) in DEMO_INPUTS:
+        yield (os.path.basename(filename), filename, corners)
+    for case in benchmark.syntheticCases(syntheticSizes, dataDir):
+        yield case
+
+
+if __name__ == "__main__":
+
+    args = getArgs()
+    jitKernels.useBackend(args.backend)
+
+    failures = 0
+    for (name, filename, corners) in allInputs(args.synthetic_sizes, args.data_dir):
+        image = perspectiveRemover.fileToImage(filename)
+        if jitKernels.enabled():
+            # The image was decoded with jitKernels.Reader
+            passed = np.array_equal(image, perspectiveRemover.decodePngPixels(png.Reader(filename=filename)))
+            failures += not passed
+            print("%s %s decode [%s]" % ("PASS" if passed else "FAIL", name, jitKernels.activeBackend))
+        coverage = None
+        coverages = {}
+        if any(engineName in COVERED_ONLY_ENGINES for engineName in args.engines):
+            coverage = engineCoverage(REFERENCE_ENGINE, image, corners)
+
+        for shouldInterpolate in (True, False):
+            mode = "interpolate" if shouldInterpolate else "no-interpolate"
+            (reference, referenceSeconds) = runEngine(REFERENCE_ENGINE, image, corners,
+                shouldInterpolate, args.backgroundRGB)
+            goldens = {REFERENCE_ENGINE: reference}
+
+            for engineName in args.engines:
+                filling = shouldInterpolate and engineName in FILL_ENGINES
+                if filling:
+                    (goldenName, tolerance, maxMismatchFraction) = FILL_ENGINES[engineName]
+                else:
+                    goldenName = REFERENCE_ENGINE
+                    (tolerance, maxMismatchFraction) = ENGINE_LIMITS.get(engineName, (0, 0.0))
+                if goldenName not in goldens:
+                    goldens[goldenName] = runEngine(goldenName, image, corners, shouldInterpolate,
+                        args.backgroundRGB, args.threads)[0]
+                golden = goldens[goldenName]
+
+                if args.tolerance is not None:
+                    tolerance = args.tolerance
+                if args.max_mismatch_fraction is not None:
+                    maxMismatchFraction = args.max_mismatch_fraction
+
+                (output, seconds) = runEngine(engineName, image, corners, shouldInterpolate, args.backgroundRGB,
+                    args.threads)
+                # Images of different sizes are never cropped to each other
+                # to compare them, and fail whatever the limits
+                sameShape = output.shape == golden.shape
+                mask = None
+                if sameShape and engineName in COVERED_ONLY_ENGINES:
+                    # Along the edges of the rectangle the reference splats
+                    # original pixels onto some that the engine samples as
+                    # lying just outside the corners
+                    if engineName not in coverages:
+                        coverages[engineName] = coverage & engineCoverage(engineName, image, corners, args.threads)
+                    mask = coverages[engineName]
+                elif sameShape and filling:
+                    # Every pixel inside the original image's outline has to
+                    # be filled in; past its edges the other engine samples
+                    # some pixels that splatting never reaches
+                    outline = perspectiveRemover.imageOutline(corners, image.shape[1], image.shape[0])
+                    mask = (engineCoverage(goldenName, image, corners, args.threads, True) &
+                        perspectiveRemover.outlineMask(outline, output.shape[1] // 3, output.shape[0]))
+                radius = ENVELOPE_RADIUS if engineName in ENVELOPE_ENGINES or filling else 0
+                stats = compareOutputs(golden, output, tolerance, mask, radius)
+                passed = stats["shapeMatches"] and stats["mismatchFraction"] <= maxMismatchFraction
+                failures += not passed
+
+                if stats["shapeMatches"]:
+                    difference = "max diff %d, mean diff %.4f, %d pixels (%.4f%%) over tolerance" % (
+                        stats["maxDifference"], stats["meanDifference"], stats["mismatchedPixels"],
+                        100 * stats["mismatchFraction"])
+                else:
+                    difference = "shape %s != %s %s" % (output.shape, goldenName, golden.shape)
+                print("%s %s %s [%s vs %s]: %.1fx speedup, %s" % ("PASS" if passed else "FAIL", name, mode,
+                    engineName, goldenName, referenceSeconds / max(seconds, 1e-9), difference))
+
+    sys.exit(1 if failures else 0)
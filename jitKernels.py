@@ -0,0 +1,197 @@
+#
+# jitKernels.py
+#
+# Optional Numba-compiled kernels for perspectiveRemover's sequential loops.
+#
+
+"""
+Kernels for the loops in perspectiveRemover that don't map well onto whole
+array operations, compiled with Numba when it's installed:
+
+    fillMissingPixels   the raster order diagonal neighbour fill of
+                        interpolateMissingPixels
+    warpTileNearest     warpTile, stepping the homography along each row
+                        instead of evaluating it at every pixel
+    undoFilter          png.Reader.undo_filter, used by Reader for
+                        decoding pngs
+
+Which backend is used is chosen once per process with useBackend: "numba"
+for these kernels, "numpy" for perspectiveRemover's vectorized code, or
+"auto" (DEFAULT_BACKEND, what every script's --backend defaults to) for
+numba when it's installed and numpy otherwise.  Until useBackend is called
+the numpy code runs.  Without Numba the kernels are still plain Python functions
+giving the same results, just too slowly to be worth calling.
+"""
+
+from array import array
+import importlib.util
+import math
+
+import numpy as np
+
+import png
+
+
+BACKENDS = ("auto", "numpy", "numba")
+DEFAULT_BACKEND = "auto"
+
+activeBackend = "numpy"
+
+# Names of the functions below that compileKernels compiles
+KERNELS = []
+
+
+def useBackend(backendName):
+    """
+    Make backendName, one of BACKENDS, the backend for this process.  Raises
+    ImportError when asked for numba without Numba installed.
+    """
+    global activeBackend
+    if backendName not in BACKENDS:
+        raise ValueError("unknown backend %s" % backendName)
+    if backendName == "auto":
+        backendName = "numba" if backendAvailable("numba") else "numpy"
+    if backendName == "numba":
+        compileKernels()
+    activeBackend = backendName
+
+def backendAvailable(backendName):
+    """True if useBackend can switch to backendName: numba needs Numba installed"""
+    return backendName != "numba" or importlib.util.find_spec("numba") is not None
+
+def enabled():
+    """True if the compiled kernels should be used in place of the numpy code"""
+    return activeBackend == "numba"
+
+def compileKernels():
+    """
+    Replace each kernel with its Numba-compiled form.  Compilation itself
+    happens on a kernel's first call, or is loaded from Numba's cache.
+    Numba is only imported here, so that importing this module stays cheap.
+    """
+    import numba
+
+    for name in KERNELS:
+        function = globals()[name]
+        if not isinstance(function, numba.core.dispatcher.Dispatcher):
+            # nogil so that the threaded engines run kernels side by side, and
+            # numpy's error model so that dividing by zero gives inf, not an
+            # exception
+            globals()[name] = numba.njit(cache=True, nogil=True, error_model="numpy")(function)
+
+def kernel(function):
+    """Mark function as a kernel for compileKernels"""
+    KERNELS.append(function.__name__)
+    return function
+
+
+@kernel
+def fillMissingPixels(pixels, covered, backgroundR, backgroundG, backgroundB):
+    """
+    interpolateMissingPixelsVectorized on the (height, width, 3) pixels
+    array and (height, width) covered mask from splatPoints, updating both
+    in place.  Each missing pixel gets the floor of the average of its
+    covered diagonal neighbours, or the background if it has none; rows
+    are done in order, so the row above is always complete.
+    """
+    (height, width) = covered.shape
+    for y in range(height):
+        for x in range(width):
+            if covered[y, x]:
+                continue
+            red = green = blue = count = 0
+            for adjacentY in (y - 1, y + 1):
+                if adjacentY < 0 or adjacentY >= height:
+                    continue
+                for adjacentX in (x - 1, x + 1):
+                    if adjacentX < 0 or adjacentX >= width or not covered[adjacentY, adjacentX]:
+                        continue
+                    red += int(pixels[adjacentY, adjacentX, 0])
+                    green += int(pixels[adjacentY, adjacentX, 1])
+                    blue += int(pixels[adjacentY, adjacentX, 2])
+                    count += 1
+            if count:
+                pixels[y, x, 0] = red // count
+                pixels[y, x, 1] = green // count
+                pixels[y, x, 2] = blue // count
+            else:
+                pixels[y, x, 0] = backgroundR
+                pixels[y, x, 1] = backgroundG
+                pixels[y, x, 2] = backgroundB
+            covered[y, x] = True
+
+@kernel
+def warpTileNearest(pixels, outputToSource, x0, y0, x1, y1, tile):
+    """
+    warpTile into the (y1 - y0, x1 - x0, 3) uint8 tile, which starts out
+    filled with the background.  The homogeneous original point is
+    evaluated once per row and then stepped by the matrix's first column
+    from one pixel to the next.
+    """
+    (height, width) = pixels.shape[:2]
+    for y in range(y0, y1):
+        u = outputToSource[0, 0] * x0 + outputToSource[0, 1] * y + outputToSource[0, 2]
+        v = outputToSource[1, 0] * x0 + outputToSource[1, 1] * y + outputToSource[1, 2]
+        w = outputToSource[2, 0] * x0 + outputToSource[2, 1] * y + outputToSource[2, 2]
+        for x in range(x0, x1):
+            sourceX = math.floor(u / w + 0.5)
+            sourceY = math.floor(v / w + 0.5)
+            if 0 <= sourceX < width and 0 <= sourceY < height:
+                for channel in range(3):
+                    tile[y - y0, x - x0, channel] = pixels[int(sourceY), int(sourceX), channel]
+            u += outputToSource[0, 0]
+            v += outputToSource[1, 0]
+            w += outputToSource[2, 0]
+
+@kernel
+def undoFilter(filterType, scanline, previous, result, filterUnit):
+    """
+    png.Reader.undo_filter for filter types 1 to 4 on uint8 arrays, writing
+    the reconstructed scanline to result.  previous is all zeros for the
+    first scanline.
+    """
+    for i in range(len(scanline)):
+        x = np.int32(scanline[i])
+        a = np.int32(result[i - filterUnit]) if i >= filterUnit else np.int32(0)
+        b = np.int32(previous[i])
+        if filterType == 1:
+            predictor = a
+        elif filterType == 2:
+            predictor = b
+        elif filterType == 3:
+            predictor = (a + b) >> 1
+        else:
+            c = np.int32(previous[i - filterUnit]) if i >= filterUnit else np.int32(0)
+            p = a + b - c
+            pa = abs(p - a)
+            pb = abs(p - b)
+            pc = abs(p - c)
+            if pa <= pb and pa <= pc:
+                predictor = a
+            elif pb <= pc:
+                predictor = b
+            else:
+                predictor = c
+        result[i] = (x + predictor) & 0xff
+
+
+class Reader(png.Reader):
+    """png.Reader undoing scanline filters with the undoFilter kernel"""
+
+    def undo_filter(self, filter_type, scanline, previous):
+        if filter_type == 0:
+            return array('B', scanline)
+        if filter_type not in (1, 2, 3, 4):
+            return super().undo_filter(filter_type, scanline, previous)
+
+        scanline = np.frombuffer(scanline, dtype=np.uint8)
+        if previous:
+            previous = np.frombuffer(previous, dtype=np.uint8)
+        else:
+            previous = np.zeros(len(scanline), dtype=np.uint8)
+        result = np.empty(len(scanline), dtype=np.uint8)
+        undoFilter(filter_type, scanline, previous, result, int(max(1, self.psize)))
+
+        reconstructed = array('B')
+        reconstructed.frombytes(result.tobytes())
+        return reconstructed
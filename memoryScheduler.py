@@ -0,0 +1,232 @@
+#
+# memoryScheduler.py
+#
+# Admitting perspectiveRemover jobs under a memory budget.
+#
+
+"""
+Estimates the peak memory a perspectiveRemover job will need from its
+input's header alone, and admits jobs to run only while the estimates of
+the running jobs add up to less than a budget for the node, so that a few
+large images arriving together wait their turn instead of getting the
+workers killed for running out of memory.
+
+Each engine's peak is modelled as BASE_BYTES plus so many bytes per source
+pixel and per altered pixel (ENGINE_MEMORY), measured as the growth in peak
+resident memory of a process running rectifyFile on synthetic images of 1
+to 12 megapixels, with ESTIMATE_MARGIN on top.  The forward-splatting
+engines hold several float64 coordinates for every source pixel, so they
+need over twenty times the memory of the tiled engines, which keep little
+more than the decoded source.
+
+A job whose estimate is bigger than the whole budget runs in strip mode
+instead: the tiled engine's streaming form on one thread, with the source
+memory-mapped from a file and rows of the altered image written as they're
+warped (see rectifyFileInStrips).  Its peak stays within BASE_BYTES and a
+byte per altered pixel however big the source is, so the job can run
+alongside others that the same job with its own engine would have had to
+wait for.  The source's mapped pages are counted in resident memory as
+they're read, but they're backed by the file, so they can be evicted
+instead of getting the worker killed.  A job too big even for strip mode is
+only admitted when nothing else is running.
+
+Jobs that don't fit wait, while smaller jobs that do fit may go ahead of
+them, until the longest waiting job has waited STARVATION_SECONDS; from
+then on nothing else is admitted until it is.
+"""
+
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import png
+
+import perspectiveRemover
+
+
+BASE_BYTES = 16 * 1024 * 1024
+
+# engine -> (bytes per source pixel, bytes per altered image pixel)
+ENGINE_MEMORY = {
+    "reference": (175, 0),
+    "vectorized": (90, 0),
+    "pushpull": (90, 0),
+    "compact": (5, 8),
+    "tiled": (4, 8),
+    "bilinear": (4, 8),
+    "mipmap": (20, 8),
+}
+
+# Engine used in strip mode, and its footprint there.  Sources of 1 to 16
+# megapixels all peaked at about 18 MB of traced memory in strip mode.
+STRIP_ENGINE = "tiled"
+STRIP_MEMORY = (0, 1)
+
+ESTIMATE_MARGIN = 1.2
+
+STARVATION_SECONDS = 30.0
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def imageSize(filename):
+    """
+    (width, height) of the png or raw Netpbm image in filename, from its
+    header alone: a png's IHDR chunk, which has to come first, or the
+    Netpbm header.
+    """
+    with open(filename, 'rb') as f:
+        start = f.read(len(PNG_SIGNATURE) + 16)
+        if start.startswith(PNG_SIGNATURE):
+            (length, chunkType, width, height) = struct.unpack(">I4sII", start[len(PNG_SIGNATURE):])
+            if chunkType != b"IHDR":
+                raise png.FormatError("%s doesn't start with an IHDR chunk" % filename)
+            return (width, height)
+        if start[:2] not in perspectiveRemover.PNM_MAGIC_NUMBERS:
+            raise png.FormatError("%s is neither a png nor a raw Netpbm image" % filename)
+        f.seek(0)
+        (pnmFormat, width, height, depth, maxval) = png.read_pnm_header(f, ('P5', 'P6', 'P7'))
+        return (width, height)
+
+def alteredSize(width, height, corners):
+    """
+    (newWidth, newHeight) of the altered image, or if corners is None the
+    largest it can be
+    """
+    if corners is None:
+        return (perspectiveRemover.MAX_IMAGE_SIZE, perspectiveRemover.MAX_IMAGE_SIZE)
+    (sourceToOutput, newWidth, newHeight) = perspectiveRemover.sourceFrame(
+        perspectiveRemover.solveHomography(corners), width, height)
+    return (newWidth, newHeight)
+
+def estimatePeakBytes(width, height, corners, engineName, strip=False):
+    """Estimated peak memory of altering a width x height image with engineName, or in strip mode"""
+    (perSourcePixel, perAlteredPixel) = STRIP_MEMORY if strip else ENGINE_MEMORY[engineName]
+    (newWidth, newHeight) = alteredSize(width, height, corners)
+    return int(ESTIMATE_MARGIN * (BASE_BYTES + perSourcePixel * width * height +
+        perAlteredPixel * newWidth * newHeight))
+
+def jobCorners(filename, corners=None):
+    """corners, or if None those in filename's sidecar file if it has one, else None"""
+    if corners is None:
+        sidecarFilename = perspectiveRemover.cornerSidecarFilename(filename)
+        try:
+            corners = perspectiveRemover.readCornerSidecar(sidecarFilename)
+        except (OSError, ValueError):
+            pass
+    return corners
+
+def rectifyFileInStrips(filename, newFilename, corners, shouldInterpolate=True,
+        backgroundRGB=perspectiveRemover.DEFAULT_IMAGE_BACKGROUND_RGB, outputFormat="png", engineName=None):
+    """
+    perspectiveRemover.rectifyFile in strip mode: STRIP_ENGINE's streaming
+    form on one thread, so that only one band of the altered image is in
+    memory at a time.  A png is decoded row by row into a memory-mapped
+    temporary file, and a raw Netpbm file is mapped as it is, so the source
+    is paged in from disk as the bands need it rather than held in memory.
+    engineName is the engine the job asked for, which the log line notes
+    when STRIP_ENGINE is used instead.
+    """
+    engineName = engineName or perspectiveRemover.DEFAULT_ENGINE
+    if engineName == STRIP_ENGINE:
+        perspectiveRemover.log("Altering", filename, "in strip mode to fit in memory")
+    else:
+        perspectiveRemover.log("Altering", filename, "in strip mode with the", STRIP_ENGINE, "engine instead of",
+            engineName, "to fit in memory")
+
+    with tempfile.TemporaryFile() as decoded:
+        def allocate(shape, dtype):
+            return np.memmap(decoded, dtype=dtype, mode='w+', shape=shape)
+        image = perspectiveRemover.fileToImage(filename, allocate=allocate)
+        (newWidth, newHeight, rows) = perspectiveRemover.rectifyImageRows(STRIP_ENGINE, image, corners,
+            shouldInterpolate, backgroundRGB)
+        perspectiveRemover.writeToFile(newFilename, newWidth, newHeight, rows, outputFormat)
+
+
+class AdmissionScheduler:
+    """
+    Keeps the estimated peak memory of the admitted jobs within budgetBytes.
+    Jobs are identified by a key, such as their input's filename, and are
+    either admitted with admit, which waits until there's room, or offered
+    repeatedly with tryAdmit.  Each admitted job must be released once it's
+    finished.  Safe to use from several threads.
+    """
+
+    def __init__(self, budgetBytes, starvationSeconds=STARVATION_SECONDS):
+        self.budgetBytes = budgetBytes
+        self.starvationSeconds = starvationSeconds
+        self.condition = threading.Condition()
+        # key -> estimate of the admitted jobs
+        self.running = {}
+        # key -> when it was first offered, for jobs waiting, oldest first
+        self.waiting = {}
+
+    def plan(self, filename, corners, engineName=None):
+        """
+        (peakBytes, strip) for altering filename with engineName, by default
+        perspectiveRemover's default engine: the estimated peak memory, and
+        whether the job should run in strip mode to fit in the budget at all
+        """
+        engineName = engineName or perspectiveRemover.DEFAULT_ENGINE
+        if engineName not in ENGINE_MEMORY:
+            raise ValueError("unknown engine %s" % engineName)
+        (width, height) = imageSize(filename)
+        corners = jobCorners(filename, corners)
+        peakBytes = estimatePeakBytes(width, height, corners, engineName)
+        if peakBytes <= self.budgetBytes:
+            return (peakBytes, False)
+        return (estimatePeakBytes(width, height, corners, engineName, strip=True), True)
+
+    def usedBytes(self):
+        return sum(self.running.values())
+
+    def tryAdmit(self, key, peakBytes):
+        """Admit the job key if there's room for peakBytes now, returning whether it was"""
+        with self.condition:
+            now = time.monotonic()
+            self.waiting.setdefault(key, now)
+            oldest = next(iter(self.waiting))
+            starving = oldest != key and now - self.waiting[oldest] > self.starvationSeconds
+            fits = not self.running or self.usedBytes() + peakBytes <= self.budgetBytes
+            if starving or not fits:
+                return False
+            del self.waiting[key]
+            self.running[key] = peakBytes
+            # Others held back while this job starved may go now
+            self.condition.notify_all()
+            return True
+
+    def admit(self, key, peakBytes):
+        """Wait until the job key can be admitted, then admit it"""
+        with self.condition:
+            try:
+                while not self.tryAdmit(key, peakBytes):
+                    # Starvation depends on time as well as on releases
+                    self.condition.wait(timeout=self.starvationSeconds)
+            except BaseException:
+                self.withdraw(key)
+                raise
+
+    def withdraw(self, key):
+        """Stop counting the job key as waiting, when it won't be offered again"""
+        with self.condition:
+            self.waiting.pop(key, None)
+            self.condition.notify_all()
+
+    def release(self, key):
+        with self.condition:
+            self.running.pop(key, None)
+            self.condition.notify_all()
+
+    @contextmanager
+    def admitted(self, key, peakBytes):
+        """admit for the duration of a with block, then release"""
+        self.admit(key, peakBytes)
+        try:
+            yield
+        finally:
+            self.release(key)
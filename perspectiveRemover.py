@@ -39,15 +39,30 @@ excellent Linear Algebra course at https://www.coursera.org/course/matrix
 
 Uses Johann C Rocholl's png.py PNG encoder/decoder.
 
-Requires numpy to better facilitate some vector/matrix operations.
+Requires numpy to better facilitate some vector/matrix operations.  Uses
+Numba, if it's installed, to compile the loops in jitKernels.
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import functools
+import io
+import json
+import os
+import sys
 from sys import argv
-import tkinter
+import time
+import tracemalloc
 import numpy as np
 
+import batchManifest
+import cornerDetector
+import cornerTracker
+import jitKernels
+import pixelCache
 import png
+import resultCache
 
 
 DEFAULT_NEW_FILE_SUFFIX = "FIXED"
@@ -59,6 +74,34 @@ DEFAULT_IMAGE_BACKGROUND_RGB = (0, 0, 0)
 # Cap the size of each axis of the adjusted image at this number of pixels
 MAX_IMAGE_SIZE = 2000
 
+# Rows of the altered image in each band that rectifyImageTiled warps as one job
+TILE_ROWS = 64
+
+# Rows of the original image that warpCompact transforms at a time
+SOURCE_CHUNK_ROWS = 64
+
+# Formats altered images can be written in, with the file extension used for
+# each.  The Netpbm formats are uncompressed, for fast handoff to other tools.
+OUTPUT_FORMAT_EXTENSIONS = {"png": "png", "ppm": "ppm", "pam": "pam"}
+
+# Leading bytes of the raw Netpbm formats we read: greyscale, RGB and PAM
+PNM_MAGIC_NUMBERS = (b"P5", b"P6", b"P7")
+
+# Filename standing for stdin as an input, or stdout as an output
+STDIO_FILENAME = "-"
+
+# Corners for image.png may be given in image.corners.json, as a JSON list
+# of four [x, y] pairs in the order top-left, top-right, bottom-right,
+# bottom-left.
+CORNER_SIDECAR_SUFFIX = ".corners.json"
+
+# Least seconds between two progress events for the rows of the same stage
+PROGRESS_INTERVAL = 1.0
+
+# Most bytes of decoded images KeptPixels holds on to between getting the
+# images' corners and altering them
+KEPT_PIXELS_MAX_BYTES = 512 * 1024 * 1024
+
 
 def getArgs():
     """
@@ -70,29 +113,355 @@ def getArgs():
         help="Suffix for altered image")
     argParser.add_argument("-b", "--backgroundRGB", type=int, nargs=3,
         default=DEFAULT_IMAGE_BACKGROUND_RGB, help="0-255 R,G,B channel values for altered image background")
-    argParser.add_argument("filenames", type=str, nargs="+", help="Filename(s) of image(s) to alter")
+    argParser.add_argument("filenames", type=str, nargs="*",
+        help="Filename(s) of image(s) to alter, or - to read one image from stdin and write it to stdout")
+    argParser.add_argument("-o", "--output", type=str, default=None,
+        help="Filename for the altered image, or - for stdout, when altering a single image")
+    argParser.add_argument("-c", "--corners", type=float, nargs=8, default=None,
+        metavar=("X0", "Y0", "X1", "Y1", "X2", "Y2", "X3", "Y3"),
+        help="Corners of the rectangle (top-left, top-right, bottom-right, bottom-left) "
+            "to use instead of asking for clicks")
+    argParser.add_argument("--auto-corners", action="store_true",
+        help="Detect the corners of images without --corners or a corner sidecar file, asking for clicks "
+            "only when detection isn't confident")
+    argParser.add_argument("--min-confidence", type=float, default=cornerDetector.DEFAULT_MIN_CONFIDENCE,
+        help="Confidence from 0 to 1 that --auto-corners needs to use the corners it detects")
+    argParser.add_argument("--track", action="store_true",
+        help="Treat the images as consecutive frames, getting corners as usual for the first and "
+            "following them through the rest")
+    argParser.add_argument("--move-threshold", type=float, default=cornerTracker.DEFAULT_MOVE_THRESHOLD,
+        help="Pixels a tracked corner must move before --track changes the corners")
     argParser.add_argument("--interpolate", dest='shouldInterpolate', action='store_true',
         help="Interpolate values of missing pixels in altered image based on surrounding pixels (default)")
     argParser.add_argument("-n", "--no-interpolate", dest='shouldInterpolate', action='store_false',
         help="Use background RGB for all missing pixels in altered image, instead of interpolating based on surrounding pixels")
+    argParser.add_argument("--engine", type=str, choices=sorted(ENGINES), default=DEFAULT_ENGINE,
+        help="Implementation to use for removing the perspective")
+    argParser.add_argument("--threads", type=int, default=1,
+        help="Number of threads to warp each image with, for engines that support it (%s)"
+            % ", ".join(sorted(THREADED_ENGINES)))
+    argParser.add_argument("--scale", type=int, default=1, metavar="N",
+        help="Draft mode: shrink each image by a factor of N with a box filter before removing the perspective, "
+            "for a preview at 1/N of the size in about 1/N^2 of the time")
+    argParser.add_argument("--backend", type=str, choices=jitKernels.BACKENDS, default=jitKernels.DEFAULT_BACKEND,
+        help="numba to run the kernels in jitKernels compiled, numpy for the pure numpy code, "
+            "or auto (default) for numba when it's installed")
+    argParser.add_argument("--pipeline", action="store_true",
+        help="Decode, warp and encode in three separate processes, working on successive images at once")
+    argParser.add_argument("--output-format", type=str, choices=sorted(OUTPUT_FORMAT_EXTENSIONS), default="png",
+        help="Write altered images as compressed PNG (default), or as raw PPM or PAM")
+    argParser.add_argument("--cache-dir", type=str, default=None,
+        help="Reuse altered images from, and save them to, this cache directory")
+    argParser.add_argument("--cache-size", type=int, default=resultCache.DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Size limit of the cache directory in megabytes")
+    argParser.add_argument("--pixel-cache-dir", type=str, default=None,
+        help="Reuse decoded images from, and save them to, this cache directory")
+    argParser.add_argument("--pixel-cache-size", type=int, default=pixelCache.DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Size limit of the decoded image cache directory in megabytes")
+    argParser.add_argument("--profile", type=str, default=None, metavar="FILE",
+        help="Append per-stage wall time, CPU time and peak memory for each image to FILE as JSON lines")
+    argParser.add_argument("--progress", type=str, choices=("line", "json"), default=None,
+        help="Report rows done in each stage and files done in the batch, with rates and ETAs, on stderr "
+            "as lines of text or as JSON events, one per line")
+    argParser.add_argument("--manifest", type=str, default=None, metavar="FILE",
+        help="Alter the images listed in FILE (see batchManifest.py), journaling each one finished so that "
+            "running again resumes where the batch stopped")
+    argParser.add_argument("--journal", type=str, default=None, metavar="FILE",
+        help="Journal for --manifest (default: the manifest's name with %s added)" % batchManifest.JOURNAL_SUFFIX)
+    argParser.add_argument("--max-attempts", type=int, default=batchManifest.DEFAULT_MAX_ATTEMPTS,
+        help="Times --manifest tries an image before giving up on it, counting earlier runs")
+    argParser.add_argument("--watch", type=str, default=None, metavar="DIR",
+        help="Keep altering the pngs dropped into DIR with their corner sidecar files, moving each to "
+            "DIR/done or DIR/error when finished (see watchFolder.py)")
+    argParser.add_argument("--watch-output", type=str, default=None, metavar="DIR",
+        help="Directory for the images altered by --watch (default: out in the watched directory)")
+    argParser.add_argument("--workers", type=int, default=1,
+        help="Number of images --watch works on at once, each in its own process")
+    argParser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+        help="Megabytes of memory the images --watch works on at once may need between them, as estimated "
+            "from their headers; images too big for it alone are altered in strip mode (see memoryScheduler.py)")
 
     argParser.set_defaults(shouldInterpolate=True)
 
     args = argParser.parse_args()
-    print(args)
+    log(args)
 
     for color in args.backgroundRGB:
         if color < 0 or color > 255:
-            print("Invalid value for backgroundRGB.  Requires a 0-255 value for each RGB channel.")
+            log("Invalid value for backgroundRGB.  Requires a 0-255 value for each RGB channel.")
             exit()
 
+    if args.threads < 1:
+        argParser.error("--threads must be at least 1")
+    if args.scale < 1:
+        argParser.error("--scale must be at least 1")
+    if not jitKernels.backendAvailable(args.backend):
+        argParser.error("--backend %s needs Numba installed" % args.backend)
+    if args.threads > 1 and args.engine not in THREADED_ENGINES:
+        argParser.error("--threads needs one of these engines: %s" % ", ".join(sorted(THREADED_ENGINES)))
+    if args.manifest is not None:
+        if args.filenames:
+            argParser.error("images can't be given both as arguments and with --manifest")
+        if args.output is not None or args.pipeline or args.track:
+            argParser.error("--manifest can't be used with --output, --pipeline or --track")
+        if args.max_attempts < 1:
+            argParser.error("--max-attempts must be at least 1")
+    if args.watch is not None:
+        if args.filenames or args.manifest is not None:
+            argParser.error("--watch takes its images from the watched directory")
+        if (args.output is not None or args.pipeline or args.track or args.profile is not None or
+                args.scale != 1):
+            argParser.error("--watch can't be used with --output, --pipeline, --track, --profile or --scale")
+        if args.workers < 1:
+            argParser.error("--workers must be at least 1")
+    elif args.memory_budget is not None:
+        argParser.error("--memory-budget needs --watch")
+    elif args.manifest is None and not args.filenames:
+        argParser.error("give the images to alter, a --manifest listing them, or a directory to --watch")
+    if args.output is not None and len(args.filenames) != 1:
+        argParser.error("--output needs exactly one input image")
+    if STDIO_FILENAME in args.filenames:
+        if len(args.filenames) != 1:
+            argParser.error("stdin can't be mixed with other input images")
+        if args.corners is None:
+            argParser.error("corners must be given with --corners when reading from stdin")
+        if args.track:
+            argParser.error("--track needs image files to follow the corners through")
+    if args.pipeline:
+        if STDIO_FILENAME in args.filenames or args.output == STDIO_FILENAME:
+            argParser.error("--pipeline can't read from stdin or write to stdout")
+        if args.profile is not None:
+            argParser.error("--profile can't time the stages of --pipeline")
+
     return args
 
 
-def writeToFile(targetFilename, theWidth, theHeight, pixels):
-    """Expects pixels in boxed row flat pixel form"""
-    with open(targetFilename, 'wb') as f:
-        png.Writer(width=theWidth, height=theHeight).write(f, p) 
+def log(*args):
+    """Progress messages go to stderr, leaving stdout free for image data"""
+    print(*args, file=sys.stderr)
+
+
+class StageProfiler:
+    """
+    Records wall time, CPU time and peak traced memory for each named stage
+    of processing an image, and writes them out as JSON lines.
+
+    Stages are attributed to currentFile, which the caller sets before
+    working on each image.  A disabled profiler still works as a context
+    manager but measures nothing.  Tracing memory slows down allocation-heavy
+    stages considerably, so pass traceMemory=False when only the times matter.
+
+    progress, if given, is a callback for ProgressReporter's events, which
+    stages working through an image row by row send through rows and
+    advance whether or not the profiler is enabled.
+    """
+
+    def __init__(self, enabled=False, traceMemory=True, progress=None):
+        self.enabled = enabled
+        self.traceMemory = enabled and traceMemory
+        self.currentFile = None
+        self.records = []
+        self.progress = None if progress is None else ProgressReporter(progress)
+        if self.traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, stageName):
+        """Measure the body of the with block as stage stageName of currentFile"""
+        if not self.enabled:
+            yield
+            return
+
+        if self.traceMemory:
+            tracemalloc.reset_peak()
+            baseMemory = tracemalloc.get_traced_memory()[0]
+        startWall = time.perf_counter()
+        startCpu = time.process_time()
+        try:
+            yield
+        finally:
+            record = {"file": self.currentFile, "stage": stageName,
+                "wallSeconds": time.perf_counter() - startWall,
+                "cpuSeconds": time.process_time() - startCpu}
+            if self.traceMemory:
+                record["peakBytes"] = tracemalloc.get_traced_memory()[1] - baseMemory
+            self.records.append(record)
+
+    def totals(self, filename):
+        """Sum of wall and CPU time and max of peak memory over filename's stages"""
+        stages = [r for r in self.records if r["file"] == filename]
+        total = {"file": filename, "stage": "total",
+            "wallSeconds": sum(r["wallSeconds"] for r in stages),
+            "cpuSeconds": sum(r["cpuSeconds"] for r in stages)}
+        if self.traceMemory:
+            total["peakBytes"] = max((r["peakBytes"] for r in stages), default=0)
+        return total
+
+    def write(self, outputFilename):
+        """Append the stage records and per-file totals to outputFilename"""
+        filenames = []
+        for record in self.records:
+            if record["file"] not in filenames:
+                filenames.append(record["file"])
+
+        with open(outputFilename, 'a') as f:
+            for filename in filenames:
+                for record in self.records:
+                    if record["file"] == filename:
+                        f.write(json.dumps(record) + "\n")
+                f.write(json.dumps(self.totals(filename)) + "\n")
+        self.records = []
+
+    def rows(self, stageName, rows, total):
+        """
+        rows, an iterable of total rows, reporting progress through stage
+        stageName of currentFile as each one is taken
+        """
+        if self.progress is None:
+            return rows
+        return self.progress.countRows(self.currentFile, stageName, rows, total)
+
+    def advance(self, stageName, done, total):
+        """Report done of total rows of stage stageName of currentFile finished"""
+        if self.progress is not None:
+            self.progress.rowsDone(self.currentFile, stageName, done, total)
+
+    def files(self, items, total):
+        """ProgressReporter.files, or just items without a progress callback"""
+        if self.progress is None:
+            return items
+        return self.progress.files(items, total)
+
+# Shared do-nothing profiler for callers that don't want measurements
+NULL_PROFILER = StageProfiler()
+
+
+class ProgressReporter:
+    """
+    Turns counts of rows done in each stage of an image, and of files done
+    in a batch, into progress events for callback.  Each event is a dict
+    that can be serialized as JSON:
+
+        {"event": "rows", "file": ..., "stage": ..., "done": ..., "total": ...,
+            "elapsedSeconds": ..., "rowsPerSecond": ..., "etaSeconds": ...}
+        {"event": "files", "file": ..., "done": ..., "total": ...,
+            "elapsedSeconds": ..., "filesPerSecond": ..., "etaSeconds": ...}
+
+    The rate and ETA are None until something is done.  Rows events for a
+    stage come at most every interval seconds, besides its first and last;
+    files events come as each file is finished.  formatProgress renders an
+    event as a line of text.
+    """
+
+    def __init__(self, callback, interval=PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        # Start time and time of the last event for each stage or batch
+        # being counted
+        self.started = {}
+        self.lastEvent = {}
+
+    def rowsDone(self, filename, stageName, done, total):
+        self.report({"event": "rows", "file": filename, "stage": stageName}, "rowsPerSecond", done, total)
+
+    def countRows(self, filename, stageName, rows, total):
+        """Generator passing on rows, counting each row done as it's taken"""
+        self.rowsDone(filename, stageName, 0, total)
+        for (done, row) in enumerate(rows, 1):
+            self.rowsDone(filename, stageName, done, total)
+            yield row
+
+    def files(self, items, total):
+        """
+        Generator passing on items, one per file of a batch of total files,
+        each a tuple whose first element is the filename.  An item counts
+        as done when the next one is asked for, once the caller has finished
+        with it.
+        """
+        if total:
+            self.report({"event": "files", "file": None}, "filesPerSecond", 0, total)
+        for (done, item) in enumerate(items, 1):
+            yield item
+            self.report({"event": "files", "file": item[0]}, "filesPerSecond", done, total, throttle=False)
+
+    def report(self, event, rateName, done, total, throttle=True):
+        now = time.perf_counter()
+        key = (event["event"], event["file"], event["stage"]) if event["event"] == "rows" else ("files",)
+        if done == 0 or key not in self.started:
+            self.started[key] = now
+        elif throttle and done < total and now - self.lastEvent[key] < self.interval:
+            return
+        self.lastEvent[key] = now
+
+        elapsed = now - self.started[key]
+        rate = done / elapsed if done and elapsed > 0 else None
+        event.update({"done": done, "total": total, "elapsedSeconds": round(elapsed, 3),
+            rateName: None if rate is None else round(rate, 1),
+            "etaSeconds": None if rate is None else round((total - done) / rate, 1)})
+        if done >= total:
+            del self.started[key]
+            del self.lastEvent[key]
+        self.callback(event)
+
+def formatProgress(event):
+    """A progress event from ProgressReporter as a compact line of text"""
+    if event["event"] == "rows":
+        (what, unit) = ("%s %s" % (event["stage"], event["file"]), "rows")
+    else:
+        (what, unit) = ("batch", "files")
+    line = "%s: %d/%d %s" % (what, event["done"], event["total"], unit)
+
+    rate = event[unit + "PerSecond"]
+    if rate is not None:
+        line += ", %.1f %s/s" % (rate, unit)
+        if event["done"] < event["total"]:
+            line += ", ETA %.1fs" % event["etaSeconds"]
+        else:
+            line += ", took %.1fs" % event["elapsedSeconds"]
+    return line
+
+
+def writeToFile(targetFilename, theWidth, theHeight, pixels, outputFormat="png"):
+    """
+    Expects pixels in boxed row flat pixel form, and one of the formats in
+    OUTPUT_FORMAT_EXTENSIONS.  The image is written to a temporary file that
+    then replaces targetFilename, so targetFilename is never left
+    half-written, and a hard link there is replaced rather than written
+    through.
+    """
+    temporaryFilename = "%s.%d.tmp" % (targetFilename, os.getpid())
+    try:
+        with open(temporaryFilename, 'wb') as f:
+            writeToStream(f, theWidth, theHeight, pixels, outputFormat)
+        os.replace(temporaryFilename, targetFilename)
+    finally:
+        if os.path.exists(temporaryFilename):
+            os.remove(temporaryFilename)
+
+def writeToStream(stream, theWidth, theHeight, pixels, outputFormat="png"):
+    """
+    writeToFile for an open binary stream.  pixels may be any iterable of
+    rows, and each row is encoded and passed on as it arrives.
+    """
+    if outputFormat == "png":
+        png.Writer(width=theWidth, height=theHeight).write(stream, pixels)
+    else:
+        planes = 4 if outputFormat == "pam" else 3
+        png.write_pnm(stream, theWidth, theHeight, pnmRows(pixels, theWidth, planes),
+            {"bitdepth": 8, "planes": planes})
+
+def pnmRows(pixels, theWidth, planes):
+    """
+    Rows of RGB pixels in boxed row flat pixel form as expected by
+    png.write_pnm, with an opaque alpha channel added if planes == 4.
+    """
+    for row in pixels:
+        row = np.asarray(row, dtype=np.uint8)
+        if planes == 4:
+            rgba = np.full((theWidth, 4), 255, dtype=np.uint8)
+            rgba[:, :3] = row.reshape((theWidth, 3))
+            row = rgba
+        yield row.ravel().tolist()
 
 # We'll need to keep a reference to the image to prevent it from being
 # garbage collected during the event loop waiting for the clicks.
@@ -103,6 +472,9 @@ def getCornerCoordinates(theFilename):
     Prompt user for corners of a square on the image.
     Returned as a 4-tuple of 2-tuple image coordinate pairs.
     """
+    # Only imported here, as loading Tk is slow and headless runs never need it
+    import tkinter
+
     tkinterRoot = tkinter.Tk()
 
     # Keep a reference to image to prevent it from being garbage collected
@@ -120,19 +492,77 @@ def getCornerCoordinates(theFilename):
     
     def printCoords(event):
         nonlocal tkinterRoot, corners
-        print (event.x, event.y)
-        print("Clicked corner at (%d,%d)" % (event.x, event.y))
+        log(event.x, event.y)
+        log("Clicked corner at (%d,%d)" % (event.x, event.y))
         corners.append((event.x, event.y))
         if(len(corners) == 4):
             tkinterRoot.destroy()
 
     canvas.bind("<Button 1>", printCoords)
     
-    print("Click the corners of a rectangle in the image") 
+    log("Click the corners of a rectangle in the image") 
     tkinterRoot.mainloop()
 
     return (corner for corner in corners)
 
+def cornerSidecarFilename(theFilename):
+    return os.path.splitext(theFilename)[0] + CORNER_SIDECAR_SUFFIX
+
+def readCornerSidecar(sidecarFilename):
+    """Corners from a sidecar file, as a 4-tuple of 2-tuple image coordinate pairs"""
+    with open(sidecarFilename) as f:
+        corners = json.load(f)
+    if len(corners) != 4 or any(len(corner) != 2 for corner in corners):
+        raise ValueError("%s must hold a list of four [x, y] corners" % sidecarFilename)
+    return tuple((corner[0], corner[1]) for corner in corners)
+
+def cornersFromArgs(values):
+    """Corners from the 8 numbers given to --corners"""
+    return tuple(zip(values[0::2], values[1::2]))
+
+def knownCorners(theFilename, givenCorners=None):
+    """
+    Corners of the rectangle in theFilename that are known without looking
+    at it: givenCorners if not None, else from its sidecar file if there is
+    one, else None.
+    """
+    if givenCorners is not None:
+        return givenCorners
+    sidecarFilename = cornerSidecarFilename(theFilename)
+    if os.path.exists(sidecarFilename):
+        log("Reading corners from", sidecarFilename)
+        return readCornerSidecar(sidecarFilename)
+    return None
+
+def cornersFor(theFilename, givenCorners=None, autoDetect=False,
+        minConfidence=cornerDetector.DEFAULT_MIN_CONFIDENCE, pixelCache=None, keptPixels=None, askUser=True):
+    """
+    Corners of the rectangle in theFilename: knownCorners if there are any,
+    else if autoDetect those cornerDetector finds with at least
+    minConfidence, else from the user's clicks, or if not askUser a
+    ValueError.  pixelCache is passed on to loadPixels for detection, and
+    the pixels decoded for it are kept in keptPixels, a KeptPixels, if one
+    is given.
+    """
+    corners = knownCorners(theFilename, givenCorners)
+    if corners is not None:
+        return corners
+    if autoDetect:
+        if keptPixels is not None:
+            pixels = keptPixels.load(theFilename, pixelCache)
+        else:
+            pixels = loadPixels(theFilename, pixelCache)
+        (corners, confidence) = cornerDetector.detectCorners(pixels)
+        if corners is not None and confidence >= minConfidence:
+            log("Detected corners with confidence %.2f" % confidence)
+            return corners
+        if not askUser:
+            raise ValueError("corner detection confidence %.2f is below %.2f" % (confidence, minConfidence))
+        log("Corner detection confidence %.2f is too low, asking for clicks" % confidence)
+    if not askUser:
+        raise ValueError("no corners for %s" % theFilename)
+    return tuple(getCornerCoordinates(theFilename))
+
 def makeEquationsForPoints(imageX, imageY, w1, w2):
     """
     Input: An (imageX, imageY) point on the image, and a (w1, w2) coordinate pair s.t.
@@ -145,59 +575,255 @@ def makeEquationsForPoints(imageX, imageY, w1, w2):
     v = np.array([0,0,0,-imageX,-imageY,-1,w2*imageX,w2*imageY,w2])
     return [u,v]
 
-def fileToImage(theFilename):
+def decodePixels(theFilename, profiler=NULL_PROFILER, allocate=np.empty):
     """
-    Input: Name of png file
-    Output: A dict with these entries:
-    "width": The width of the image in pixels.
-    "height": The height of the image in pixels.
-    "points": A numpy array containing all pixels/points in the
-    image, in the form [x1, x2, ..., xn]
-                       [y1, y2, ..., yn]
-                       [1, 1, ...,   1]
-    where n == width * height.
-    "colors": A numpy array where each column give the color for the
-    corresponding point in the "points" array, of the form
-                      [r1, r2, ..., rn]
-                      [g1, g2, ..., gn]
-                      [b1, b2, ..., bn]
-    where n == width * height
+    Input: Name of a png file, or of a raw PGM, PPM or PAM file, or
+    STDIO_FILENAME to read either from stdin.
+    Output: A (height, width, channels) uint8 numpy array whose first three
+    channels are the image's R, G and B values, followed by Alpha if the
+    image has it.  Progress decoding a png is reported through profiler,
+    and a png is decoded into an array made by allocate(shape, dtype).
     """
-    
+    if theFilename == STDIO_FILENAME:
+        return decodePixelsFromBytes(sys.stdin.buffer.read(), profiler, allocate)
+
+    with open(theFilename, 'rb') as f:
+        magicNumber = f.read(2)
+    if magicNumber in PNM_MAGIC_NUMBERS:
+        return decodePnmPixels(theFilename)
+    return decodePngPixels(pngReader(filename = theFilename), profiler, allocate)
+
+def decodePixelsFromBytes(data, profiler=NULL_PROFILER, allocate=np.empty):
+    """decodePixels for the contents of an image file"""
+    if data[:2] not in PNM_MAGIC_NUMBERS:
+        return decodePngPixels(pngReader(bytes = data), profiler, allocate)
+
+    stream = io.BytesIO(data)
+    (pnmFormat, width, height, depth, maxval) = png.read_pnm_header(stream, ('P5', 'P6', 'P7'))
+    samples = np.frombuffer(data, dtype=pnmSampleType(maxval), count=height * width * depth,
+        offset=stream.tell())
+    return pnmSamplesToPixels(samples.reshape((height, width, depth)), maxval)
+
+def pngReader(**kwargs):
+    """png.Reader, or with the numba backend jitKernels.Reader"""
+    return (jitKernels.Reader if jitKernels.enabled() else png.Reader)(**kwargs)
+
+def decodePnmPixels(theFilename):
+    """
+    decodePixels for raw PGM (P5), PPM (P6) and PAM (P7) files.  The samples
+    are memory-mapped rather than read, so an 8-bit RGB or RGBA file costs
+    next to nothing to open.
+    """
+    with open(theFilename, 'rb') as f:
+        (pnmFormat, width, height, depth, maxval) = png.read_pnm_header(f, ('P5', 'P6', 'P7'))
+        offset = f.tell()
+
+    pixels = np.memmap(theFilename, dtype=pnmSampleType(maxval), mode='r', offset=offset,
+        shape=(height, width, depth))
+    return pnmSamplesToPixels(pixels, maxval)
+
+def pnmSampleType(maxval):
+    """Samples are big-endian 16-bit values when maxval needs more than a byte"""
+    return np.dtype(np.uint8) if maxval <= 255 else np.dtype('>u2')
+
+def pnmSamplesToPixels(pixels, maxval):
+    """
+    Input: A (height, width, depth) array of Netpbm samples.
+    Output: The samples in decodePixels' format.
+    """
+    depth = pixels.shape[2]
+    if depth > 4:
+        raise png.FormatError("image has %d channels; expected 1 to 4" % depth)
+
+    if maxval != 255:
+        pixels = np.round(pixels * (255.0 / maxval)).astype(np.uint8)
+
+    if depth <= 2:
+        # Greyscale, possibly with alpha
+        grey = pixels[:, :, 0]
+        pixels = np.dstack((grey, grey, grey) + tuple(pixels[:, :, 1:].transpose((2, 0, 1))))
+
+    return pixels
+
+def decodePngPixels(reader, profiler=NULL_PROFILER, allocate=np.empty):
+    """decodePixels for a png.Reader; png images always get an Alpha channel"""
     # We retrieve the alpha channel here even though we're not going to use it
     # because asRGB (which doesn't provide the alpha channel) will throw if
     # given an image with an alpha channel.
     # TODO Should we actually make use of the alpha channel as well?
-    (width, height, pixels, meta) = png.Reader(filename = theFilename).asRGBA() 
+    (width, height, rows, meta) = reader.asRGBA()
+    rows = iter(profiler.rows("decode", rows, height))
 
-    imgList = [[],[],[]]
-    colorList = [[],[],[]]
+    # Images with other bit depths are rescaled to 8 bits since that's what
+    # we write back out, rounding the same way png.Reader.asRGBA8 does.
+    factor = None
+    if meta['bitdepth'] != 8:
+        factor = 255.0 / (2**meta['bitdepth'] - 1)
 
+    pixels = allocate((height, width, 4), np.uint8)
     for y in range(height):
-        row = next(pixels)
+        row = next(rows)
 
         # Each pixel has R, G, B, and Alpha.
         assert len(row) / 4 == width
+        row = np.asarray(row).reshape((width, 4))
+        if factor is not None:
+            row = np.round(row * factor)
+        pixels[y] = row
+
+    return pixels
+
+def fileToImage(theFilename, pixelCache=None, profiler=NULL_PROFILER, allocate=np.empty):
+    """
+    Input: Name of png file, and optionally a pixelCache.PixelCache to reuse
+    an earlier decoding of it from, a StageProfiler to report decoding
+    progress to and the allocate function decodePixels makes its array
+    with.
+    Output: The image's pixels as a (height, width, channels) uint8 numpy
+    array, as returned by decodePixels.  The engines work out each pixel's
+    coordinates from its position in the array as they need them.
+    """
+    return loadPixels(theFilename, pixelCache, profiler, allocate)
+
+def loadPixels(theFilename, pixelCache=None, profiler=NULL_PROFILER, allocate=np.empty):
+    """
+    decodePixels, going through pixelCache, a pixelCache.PixelCache, if one
+    is given.
+    """
+    # stdin can only be read once, so there's no point caching it
+    if theFilename == STDIO_FILENAME:
+        pixelCache = None
+
+    pixels = None
+    if pixelCache is not None:
+        pixels = pixelCache.load(theFilename)
+    if pixels is None:
+        pixels = decodePixels(theFilename, profiler, allocate)
+        if pixelCache is not None:
+            pixelCache.store(theFilename, pixels)
+    return pixels
+
+class KeptPixels:
+    """
+    Decoded images held in memory from getting their corners, by detection
+    or tracking, until they're altered, so that each is only decoded once.
+    load decodes an image, or returns the one kept for it, and keeps it
+    while the kept images come to at most maxBytes; take hands a kept image
+    over, ending its keeping.
+    Images are altered in the order their corners were got in, so the first
+    ones to fit are kept rather than the most recent ones.
+    """
+
+    def __init__(self, maxBytes=KEPT_PIXELS_MAX_BYTES):
+        self.maxBytes = maxBytes
+        self.keptBytes = 0
+        self.pixels = {}
+
+    def load(self, theFilename, pixelCache=None):
+        """loadPixels, keeping the pixels for take if there's room for them"""
+        pixels = self.pixels.get(theFilename)
+        if pixels is None:
+            pixels = loadPixels(theFilename, pixelCache)
+            if self.keptBytes + pixels.nbytes <= self.maxBytes:
+                self.pixels[theFilename] = pixels
+                self.keptBytes += pixels.nbytes
+        return pixels
+
+    def take(self, theFilename):
+        """The pixels kept for theFilename, or None, no longer keeping them"""
+        pixels = self.pixels.pop(theFilename, None)
+        if pixels is not None:
+            self.keptBytes -= pixels.nbytes
+        return pixels
+
+def decimatePixels(pixels, factor, allocate=np.empty):
+    """
+    Input: A (height, width, channels) uint8 pixels array and a whole
+    number factor.
+    Output: pixels shrunk by factor in each direction with a box filter,
+    each pixel the rounded mean of a factor x factor block, in an array made
+    by allocate(shape, dtype).  Rows and columns past the last whole block
+    are dropped.  With a factor of 1, pixels itself.
+    """
+    if factor == 1:
+        return pixels
+    (height, width, channels) = pixels.shape
+    newHeight = height // factor
+    newWidth = width // factor
+    if newHeight < 1 or newWidth < 1:
+        raise ValueError("a %dx%d image is too small to scale down by %d" % (width, height, factor))
+
+    # Add up each block's rows, then its columns, as whole strided slices:
+    # factor array additions each way instead of a reduction over short axes
+    source = pixels[:newHeight * factor, :newWidth * factor]
+    rowSums = np.zeros((newHeight, newWidth * factor, channels), dtype=np.uint32)
+    for i in range(factor):
+        rowSums += source[i::factor]
+    sums = np.zeros((newHeight, newWidth, channels), dtype=np.uint32)
+    for i in range(factor):
+        sums += rowSums[:, i::factor]
+    area = factor * factor
+    sums += area // 2
+    decimated = allocate((newHeight, newWidth, channels), np.uint8)
+    np.floor_divide(sums, area, out=decimated, casting="unsafe")
+    return decimated
+
+def scaleCorners(corners, factor):
+    """
+    corners in an image, as they are in that image decimated by factor with
+    decimatePixels.  Pixel centers of the decimated image sit at
+    factor * (x + 0.5) - 0.5 in the original.
+    """
+    return tuple(((x + 0.5) / factor - 0.5, (y + 0.5) / factor - 0.5) for (x, y) in corners)
+
+def draftImage(image, corners, scale, profiler=NULL_PROFILER):
+    """
+    (image, corners) decimated by scale with decimatePixels and
+    scaleCorners, so that the perspective is removed at 1/scale of the
+    resolution.  Unchanged for a scale of 1.
+    """
+    if scale == 1:
+        return (image, corners)
+    with profiler.stage("decimate"):
+        return (decimatePixels(image, scale), scaleCorners(corners, scale))
+
+def pointGrid(width, y0, y1):
+    """
+    The homogeneous coordinates of the pixels in rows y0 to y1 (exclusive)
+    of an image width pixels wide, as a 3xN numpy array of the form
+                       [x1, x2, ..., xn]
+                       [y1, y2, ..., yn]
+                       [1, 1, ...,   1]
+    in row order, so x varies fastest.
+    """
+    (ys, xs) = np.indices((y1 - y0, width))
+    ys += y0
+    return np.vstack((xs.ravel(), ys.ravel(), np.ones((y1 - y0) * width, dtype=np.int64)))
 
-        for x in range(0, width):
-            pixelIndex = y*width + x
-            # Memory locality/cache performance is probably terrible
-            # for this, should reevalutate if this turns out to
-            # be a perf issue as there are definitely better ways
-            # to set up these matrices.
-            imgList[0].append(x)
-            imgList[1].append(y)
-            imgList[2].append(1)
-            
-            colorList[0].append(row[x*4])
-            colorList[1].append(row[x*4 + 1])
-            colorList[2].append(row[x*4 + 2])
-            # ...and we skip the alpha channel
-
-    assert len(imgList[0]) == (width * height)
-
-    return {"width":width, "height":height,
-        "points": np.array(imgList), "colors": np.array(colorList)}
+def transformRows(hVec, width, height):
+    """
+    Generator yielding (y0, y1, rotatedPoints) for successive chunks of
+    SOURCE_CHUNK_ROWS rows of an image of the given size, where
+    rotatedPoints is the 3xN product of hVec with the pointGrid of rows y0
+    to y1.  Only one chunk's coordinates exist at a time, and each column
+    comes out exactly as it would from one product over the whole image.
+    """
+    for y0 in range(0, height, SOURCE_CHUNK_ROWS):
+        y1 = min(y0 + SOURCE_CHUNK_ROWS, height)
+        yield (y0, y1, np.dot(hVec, pointGrid(width, y0, y1)))
+
+def imageColors(image):
+    """
+    The colors of image's pixels as a 3xN numpy array, each column giving
+    the R, G and B of the corresponding pixel in row order, of the form
+                      [r1, r2, ..., rn]
+                      [g1, g2, ..., gn]
+                      [b1, b2, ..., bn]
+    This is a view of image where possible.
+    """
+    (height, width) = image.shape[:2]
+    # ...and we skip the alpha channel
+    return image[:, :, :3].reshape((width * height, 3)).T
 
 def projectToImagePlane(points):
     """
@@ -218,7 +844,8 @@ def projectToImagePlane(points):
     return projectedPoints
 
 
-def pointsToImageBoxedRowFlatPixel(points, colors, width, height, shouldInterpolateMissingPixels, backgroundRGB):
+def pointsToImageBoxedRowFlatPixel(points, colors, width, height, shouldInterpolateMissingPixels, backgroundRGB,
+        profiler=NULL_PROFILER):
     """
     Input: Points and colors arrays, where points is a 3xN matrix whose 
     columns are each a point in the rotated coordinate space.
@@ -234,6 +861,8 @@ def pointsToImageBoxedRowFlatPixel(points, colors, width, height, shouldInterpol
     point matrix, where the columns again correspond to
     each point and the rows are the R,G,B values of each pixel.
 
+    profiler, if given, times the rasterize and fill stages separately.
+
     Output: Returns the resulting image in boxed row flat pixel format.
     (A list of the image rows, where each row is a list of the row's pixels,
     in column order, flattened out to 3 numbers for its RGB channels.
@@ -241,6 +870,24 @@ def pointsToImageBoxedRowFlatPixel(points, colors, width, height, shouldInterpol
     assert len(points[0]) > 0
     assert len(points[0]) == len(colors[0])
 
+    with profiler.stage("rasterize"):
+        (pixels, newWidth, newHeight) = rasterizePoints(points, colors, width, height,
+            shouldInterpolateMissingPixels, backgroundRGB)
+
+    if shouldInterpolateMissingPixels:
+        with profiler.stage("fill"):
+            pixels = interpolateMissingPixels(newWidth, newHeight, pixels, backgroundRGB, profiler)
+
+    return pixels
+
+
+def rasterizePoints(points, colors, width, height, leaveMissingPixelsEmpty, backgroundRGB):
+    """
+    Forward-splat step of pointsToImageBoxedRowFlatPixel.  Returns a tuple
+    (pixels, newWidth, newHeight) where pixels is the rotated image in boxed
+    row flat pixel format.  Pixels not covered by any point are None if
+    leaveMissingPixelsEmpty, else backgroundRGB.
+    """
     minX, maxX, minY, maxY = points[0][0], points[0][0], points[1][0], points[1][0]
     for i in range(len(points[0])):
         if points[0][i] < minX: minX = points[0][i]
@@ -252,7 +899,7 @@ def pointsToImageBoxedRowFlatPixel(points, colors, width, height, shouldInterpol
     # axis size and the magnitude of the range of points with respect to that axis
     # among the converted image points. 
     scalingFactor = ((width / (maxX - minX)) + (height / (maxY - minY))) / 2
-    print("Using scalingFactor", scalingFactor)
+    log("Using scalingFactor", scalingFactor)
 
     newWidth = int((maxX - minX) * scalingFactor) + 3
     newHeight = int((maxY - minY) * scalingFactor) + 2
@@ -261,16 +908,16 @@ def pointsToImageBoxedRowFlatPixel(points, colors, width, height, shouldInterpol
     newWidth = min(newWidth, MAX_IMAGE_SIZE)
     newHeight = min(newHeight, MAX_IMAGE_SIZE)
 
-    print("min, max X: %f, %f" % (minX, maxX))
-    print("min, max Y: %f, %f" % (minY, maxY))
-    print("newWidth, newHeight %f, %f" % (newWidth, newHeight))
+    log("min, max X: %f, %f" % (minX, maxX))
+    log("min, max Y: %f, %f" % (minY, maxY))
+    log("newWidth, newHeight %f, %f" % (newWidth, newHeight))
     
     # Set up the image background
     pixels = []
     for y in range(newHeight):
         pixels.append([])
         for x in range(newWidth):
-            if shouldInterpolateMissingPixels:
+            if leaveMissingPixelsEmpty:
                 # We'll fill these in later
                 pixels[-1].append(None)
                 pixels[-1].append(None)
@@ -285,8 +932,8 @@ def pointsToImageBoxedRowFlatPixel(points, colors, width, height, shouldInterpol
         y = (points[1][i] - minY) * scalingFactor
         x = (points[0][i] - minX) * scalingFactor
 
-        # Round to integers
-        y = int(y + 0.5)
+        # Round to integers, piling points past a capped edge onto it
+        y = min(int(y + 0.5), newHeight - 1)
         x = 3 * min(int(x + 0.5), newWidth - 1)
 
         assert x >= 0 and x < newWidth * 3 and y >= 0 and y < newHeight
@@ -294,13 +941,10 @@ def pointsToImageBoxedRowFlatPixel(points, colors, width, height, shouldInterpol
         pixels[y][x+1] = colors[1][i]
         pixels[y][x+2] = colors[2][i]
 
-    if shouldInterpolateMissingPixels:
-        pixels = interpolateMissingPixels(newWidth, newHeight, pixels, backgroundRGB)
+    return (pixels, newWidth, newHeight)
 
-    return pixels
- 
 
-def interpolateMissingPixels(width, height, image, backgroundRGB):
+def interpolateMissingPixels(width, height, image, backgroundRGB, profiler=NULL_PROFILER):
     """
     Input: Image of dimensions (width,height) in boxed row flat pixel format, potentially
     with some pixels with RGB values of (None, None, None).
@@ -308,7 +952,7 @@ def interpolateMissingPixels(width, height, image, backgroundRGB):
     Output: The same image with the missing pixels filled in from an average of the
     surrounding pixels
     """
-    for y in range(height):
+    for y in profiler.rows("fill", range(height), height):
         for x in range(width):
            if image[y][x*3] is None:
                 colorTotal = [0, 0, 0]
@@ -339,71 +983,958 @@ def interpolateMissingPixels(width, height, image, backgroundRGB):
     return image
 
 
-if __name__ == "__main__":
-
-    args = getArgs()
+def solveHomography(corners):
+    """
+    Input: The four (x, y) image coordinates of the corners of a rectangle,
+    in the order top-left, top-right, bottom-right, bottom-left.
 
-    print("Processing images:", args.filenames)
+    Output: The 3x3 matrix that transforms a homogeneous point in the original
+    image's coordinate system to the rotated coordinate system, in which the
+    rectangle's corners sit at (0,0), (1,0), (1,1) and (0,1).
+    """
+    # Create a list of equations linking the coordinate system of the original
+    # image to the rotated coordinate system that we will use to create
+    # the rotated image
+    (c0, c1, c2, c3) = corners
+    wVec = np.array([1,0,0,0,0,0,0,0,0])
+    equationsList = [
+        makeEquationsForPoints(c0[0], c0[1], 0, 0)[0],
+        makeEquationsForPoints(c0[0], c0[1], 0, 0)[1],
+        makeEquationsForPoints(c1[0], c1[1], 1, 0)[0],
+        makeEquationsForPoints(c1[0], c1[1], 1, 0)[1],
+        makeEquationsForPoints(c2[0], c2[1], 1, 1)[0],
+        makeEquationsForPoints(c2[0], c2[1], 1, 1)[1],
+        makeEquationsForPoints(c3[0], c3[1], 0, 1)[0],
+        makeEquationsForPoints(c3[0], c3[1], 0, 1)[1],
+        wVec
+    ] 
+
+    lMat = np.vstack(equationsList)
+    b = np.array([0,0,0,0,0,0,0,0,1])
+
+    # Solve the system of equations lMat * H = b to obtain a 3x3 matrix that we
+    # can use to transform each image point from the original coordinate system
+    # to the rotated coordinate system
+    hVec = np.linalg.lstsq(lMat, b, rcond=None)[0]
+    return hVec.reshape((3,3))
+
+def rectifyImage(image, corners, shouldInterpolate, backgroundRGB, profiler=NULL_PROFILER):
+    """
+    Input: An image as returned by fileToImage, and the corners of a rectangle
+    in it as accepted by solveHomography.
 
-    # Collect all corner clicks first so the user doesn't have to wait for us to
-    # fully process each image between the recording of each set of clicks.
-    images = []
-    for filename in args.filenames:
-        image = fileToImage(filename)
-
-        print("Getting corners for image", filename)
-        image["corners"] = getCornerCoordinates(filename)
-        print("Corners", image["corners"])
-        images.append(image)
-
-    # Now we'll actually do the alteration of each image in turn
-    for i in range(len(images)):
-        image = images[i]
-
-        # Create a list of equations linking the coordinate system of the original
-        # image to the rotated coordinate system that we will use to create
-        # the rotated image
-        (c0, c1, c2, c3) = image["corners"]
-        wVec = np.array([1,0,0,0,0,0,0,0,0])
-        equationsList = [
-            makeEquationsForPoints(c0[0], c0[1], 0, 0)[0],
-            makeEquationsForPoints(c0[0], c0[1], 0, 0)[1],
-            makeEquationsForPoints(c1[0], c1[1], 1, 0)[0],
-            makeEquationsForPoints(c1[0], c1[1], 1, 0)[1],
-            makeEquationsForPoints(c2[0], c2[1], 1, 1)[0],
-            makeEquationsForPoints(c2[0], c2[1], 1, 1)[1],
-            makeEquationsForPoints(c3[0], c3[1], 0, 1)[0],
-            makeEquationsForPoints(c3[0], c3[1], 0, 1)[1],
-            wVec
-        ] 
-
-        lMat = np.vstack(equationsList)
-        b = np.array([0,0,0,0,0,0,0,0,1])
-
-        # Solve the system of equations lMat * H = b to obtain a 3x3 matrix that we
-        # can use to transform each image point from the original coordinate system
-        # to the rotated coordinate system
-        hVec = np.linalg.lstsq(lMat, b)[0]
-        hVec = hVec.reshape((3,3))
-
-        # Transform each point to its corresponding location in the rotated coordinate
-        # system, and then flatten the points back to a 2-D plane.
-        rotatedPoints = np.dot(hVec, image["points"])
+    Output: The image with perspective removed, in boxed row flat pixel format.
+    """
+    (height, width) = image.shape[:2]
+    with profiler.stage("solve"):
+        hVec = solveHomography(corners)
+
+    # Transform each point to its corresponding location in the rotated coordinate
+    # system, and then flatten the points back to a 2-D plane.
+    with profiler.stage("transform"):
+        rotatedPoints = np.empty((3, width * height))
+        profiler.advance("transform", 0, height)
+        for (y0, y1, rotatedRows) in transformRows(hVec, width, height):
+            rotatedPoints[:, y0 * width:y1 * width] = rotatedRows
+            profiler.advance("transform", y1, height)
+    with profiler.stage("project"):
         rotatedAndProjectedPoints = projectToImagePlane(rotatedPoints)
 
-        print("rotatedPoints", rotatedPoints)
-        print("rotatedAndProjectedPoints", rotatedAndProjectedPoints)
+    # int64 rather than uint8, so that sums of colors don't overflow
+    colors = imageColors(image).astype(np.int64)
+    imageBoxedRowFlatPixel = pointsToImageBoxedRowFlatPixel(rotatedAndProjectedPoints,
+        colors, width, height, shouldInterpolate, backgroundRGB, profiler)
+    assert len(imageBoxedRowFlatPixel[0]) % 3 == 0
+    return imageBoxedRowFlatPixel
+
+def rectifyImageVectorized(image, corners, shouldInterpolate, backgroundRGB, profiler=NULL_PROFILER,
+        warp=None, fill=None, allocate=np.empty):
+    """
+    Produces the same image as rectifyImage, but with whole-array numpy
+    operations in place of the per-pixel loops.  warp, warpVectorized by
+    default, is the function that splats the points, and fill,
+    interpolateMissingPixelsVectorized by default, the one that fills in
+    missing pixels when shouldInterpolate.  allocate(shape, dtype) makes
+    the array the image is built in; see CANVAS_ENGINES.
+
+    Output: The image with perspective removed, as a (newHeight, newWidth * 3)
+    uint8 numpy array, which can be used anywhere boxed row flat pixel
+    format is expected.
+    """
+    (pixels, covered) = (warp or warpVectorized)(image, corners, backgroundRGB, profiler, allocate)
+
+    if shouldInterpolate:
+        with profiler.stage("fill"):
+            (fill or interpolateMissingPixelsVectorized)(pixels, covered, backgroundRGB)
+
+    (newHeight, newWidth) = covered.shape
+    return pixels.reshape((newHeight, newWidth * 3))
+
+def rectifyImageVectorizedRows(image, corners, shouldInterpolate, backgroundRGB, profiler=NULL_PROFILER,
+        warp=None, fill=None):
+    """
+    Streaming form of rectifyImageVectorized.  Returns (newWidth, newHeight,
+    rows), where rows is an iterator that fills in each row of the image and
+    yields it in boxed row flat pixel format as soon as it's final, so that
+    encoding can start before the whole image is done.  Time spent filling
+    is not profiled separately.  A fill other than the default one works on
+    the whole image, so it's done before the first row is yielded.
+    """
+    (pixels, covered) = (warp or warpVectorized)(image, corners, backgroundRGB, profiler)
+    (newHeight, newWidth) = covered.shape
+
+    if shouldInterpolate and fill is not None:
+        with profiler.stage("fill"):
+            fill(pixels, covered, backgroundRGB)
+        rows = iter(pixels)
+    elif shouldInterpolate:
+        rows = iterInterpolatedRows(pixels, covered, backgroundRGB)
+    else:
+        rows = iter(pixels)
+    return (newWidth, newHeight, (row.reshape(newWidth * 3) for row in rows))
+
+def warpVectorized(image, corners, backgroundRGB, profiler=NULL_PROFILER, allocate=np.empty):
+    """The steps of rectifyImageVectorized up to and including splatPoints"""
+    (height, width) = image.shape[:2]
+    with profiler.stage("solve"):
+        hVec = solveHomography(corners)
+
+    # Only the projected coordinates are kept for the whole image; the
+    # coordinates and rotated points exist a chunk of rows at a time.
+    with profiler.stage("transform"):
+        projectedX = np.empty(width * height)
+        projectedY = np.empty(width * height)
+        for (y0, y1, rotatedPoints) in transformRows(hVec, width, height):
+            chunk = slice(y0 * width, y1 * width)
+            np.divide(rotatedPoints[0], rotatedPoints[2], out=projectedX[chunk])
+            np.divide(rotatedPoints[1], rotatedPoints[2], out=projectedY[chunk])
+
+    with profiler.stage("rasterize"):
+        return splatPoints(projectedX, projectedY, imageColors(image), width, height, backgroundRGB, allocate)
+
+def splatPoints(projectedX, projectedY, colors, width, height, backgroundRGB, allocate=np.empty):
+    """
+    Vectorized rasterizePoints.  Input: The x and y coordinates of the
+    projected points, the 3xN colors array, the original image dimensions,
+    and the function making the pixels array as in rectifyImageVectorized.
+
+    Output: A tuple (pixels, covered) where pixels is a (newHeight, newWidth, 3)
+    uint8 array with uncovered pixels set to backgroundRGB, and covered is a
+    (newHeight, newWidth) bool array marking the pixels some point landed on.
+    Where several points land on the same pixel the last one wins, as in
+    rasterizePoints.
+    """
+    minX, maxX = projectedX.min(), projectedX.max()
+    minY, maxY = projectedY.min(), projectedY.max()
+
+    scalingFactor = ((width / (maxX - minX)) + (height / (maxY - minY))) / 2
+    newWidth = min(int((maxX - minX) * scalingFactor) + 3, MAX_IMAGE_SIZE)
+    newHeight = min(int((maxY - minY) * scalingFactor) + 2, MAX_IMAGE_SIZE)
+
+    # Coordinates are never negative here, so truncating after adding 0.5
+    # rounds the same way int(x + 0.5) does.
+    x = np.minimum(((projectedX - minX) * scalingFactor + 0.5).astype(np.int64), newWidth - 1)
+    y = np.minimum(((projectedY - minY) * scalingFactor + 0.5).astype(np.int64), newHeight - 1)
+
+    # numpy doesn't promise which of several writes to the same element wins,
+    # so keep only the last point landing on each pixel before scattering.
+    flatIndices = y * newWidth + x
+    (targets, reversedFirst) = np.unique(flatIndices[::-1], return_index=True)
+    sources = len(flatIndices) - 1 - reversedFirst
+
+    pixels = allocate((newHeight * newWidth, 3), np.uint8)
+    pixels[:] = backgroundRGB
+    pixels[targets] = colors[:, sources].T
+    covered = np.zeros(newHeight * newWidth, dtype=bool)
+    covered[targets] = True
+
+    return (pixels.reshape((newHeight, newWidth, 3)), covered.reshape((newHeight, newWidth)))
+
+def warpCompact(image, corners, backgroundRGB, profiler=NULL_PROFILER, allocate=np.empty):
+    """
+    A warp for rectifyImageVectorized that keeps memory down to a few bytes
+    per original pixel.  It works through the original image
+    SOURCE_CHUNK_ROWS rows at a time: it generates the chunk's coordinates on
+    the fly, transforms them in float32 and projects them in place, then
+    splats the chunk's uint8 colors straight from image.  Splatting the
+    chunks in order keeps the last point to land on each pixel winning.
+
+    float32 rounding can tip a point into the neighbouring pixel, so the
+    result differs from warpVectorized's in a small fraction of pixels.
+    """
+    with profiler.stage("solve"):
+        hVec = solveHomography(corners)
+        (sourceToOutput, newWidth, newHeight) = sourceFrame(hVec, image.shape[1], image.shape[0])
+        ((m00, m01, m02), (m10, m11, m12), (m20, m21, m22)) = sourceToOutput.astype(np.float32)
+
+    with profiler.stage("rasterize"):
+        (height, width) = image.shape[:2]
+        pixels = allocate((newHeight * newWidth, 3), np.uint8)
+        pixels[:] = backgroundRGB
+        covered = np.zeros(newHeight * newWidth, dtype=bool)
+
+        xs = np.arange(width, dtype=np.float32)[np.newaxis, :]
+        for y0 in range(0, height, SOURCE_CHUNK_ROWS):
+            y1 = min(y0 + SOURCE_CHUNK_ROWS, height)
+            ys = np.arange(y0, y1, dtype=np.float32)[:, np.newaxis]
+
+            w = m20 * xs + m21 * ys + m22
+            projectedX = m00 * xs + m01 * ys + m02
+            projectedX /= w
+            projectedX += 0.5
+            projectedY = m10 * xs + m11 * ys + m12
+            projectedY /= w
+            projectedY += 0.5
+            del w
+
+            x = projectedX.astype(np.int32).ravel()
+            del projectedX
+            y = projectedY.astype(np.int32).ravel()
+            del projectedY
+            np.clip(x, 0, newWidth - 1, out=x)
+            np.clip(y, 0, newHeight - 1, out=y)
+
+            # As in splatPoints, keep the last point landing on each pixel
+            y *= newWidth
+            y += x
+            (targets, reversedFirst) = np.unique(y[::-1], return_index=True)
+            sources = len(y) - 1 - reversedFirst
+
+            pixels[targets] = image[y0:y1, :, :3].reshape((-1, 3))[sources]
+            covered[targets] = True
+
+    return (pixels.reshape((newHeight, newWidth, 3)), covered.reshape((newHeight, newWidth)))
+
+def interpolateMissingPixelsVectorized(pixels, covered, backgroundRGB):
+    """
+    Vectorized interpolateMissingPixels.  Input: A (height, width, 3) pixels
+    array and the (height, width) covered mask from splatPoints.  Both are
+    updated in place.
+    """
+    for row in iterInterpolatedRows(pixels, covered, backgroundRGB):
+        pass
+
+def iterInterpolatedRows(pixels, covered, backgroundRGB):
+    """
+    Generator doing the work of interpolateMissingPixelsVectorized, yielding
+    each row of pixels once it has been filled in.
 
-        splitFilename = args.filenames[i].split('.')
-        newFilename= ".".join(splitFilename[:-1]) + "." + args.suffix + \
-            "." + splitFilename[-1]
+    interpolateMissingPixels fills in raster order, so a filled pixel counts
+    as a neighbour for the row below it.  Each row only looks at its diagonal
+    neighbours in the rows above and below, though, so one row at a time can
+    be filled at once and the result matches exactly.
 
-        print("Saving new image as", newFilename)
+    With the numba backend the whole image is filled by
+    jitKernels.fillMissingPixels before the first row is yielded.
+    """
+    if jitKernels.enabled():
+        jitKernels.fillMissingPixels(pixels, covered, *backgroundRGB)
+        yield from pixels
+        return
 
-        imageBoxedRowFlatPixel = pointsToImageBoxedRowFlatPixel(rotatedAndProjectedPoints,
-            image["colors"], image["width"], image["height"], args.shouldInterpolate, args.backgroundRGB)
-        assert len(imageBoxedRowFlatPixel[0]) % 3 == 0
+    (height, width) = covered.shape
+    for y in range(height):
+        missing = ~covered[y]
+        if not missing.any():
+            yield pixels[y]
+            continue
+
+        colorTotal = np.zeros((width, 3), dtype=np.int64)
+        numAdjacentPixels = np.zeros(width, dtype=np.int64)
+        for adjacentY in (y - 1, y + 1):
+            if adjacentY < 0 or adjacentY >= height:
+                continue
+            adjacentCovered = covered[adjacentY]
+            adjacentColors = pixels[adjacentY] * adjacentCovered[:, np.newaxis]
+            # Up/down and to the left...
+            colorTotal[1:] += adjacentColors[:-1]
+            numAdjacentPixels[1:] += adjacentCovered[:-1]
+            # ...and up/down and to the right
+            colorTotal[:-1] += adjacentColors[1:]
+            numAdjacentPixels[:-1] += adjacentCovered[1:]
+
+        colorAverage = colorTotal // np.maximum(numAdjacentPixels, 1)[:, np.newaxis]
+        colorAverage[numAdjacentPixels == 0] = backgroundRGB
+
+        pixels[y][missing] = colorAverage[missing]
+        covered[y] = True
+        yield pixels[y]
+
+def imageOutline(corners, width, height):
+    """
+    Input: The corners of a rectangle as accepted by solveHomography, and
+    the original image's size.
+
+    Output: A (4, 2) array of where the corner pixels of the original image
+    land in the altered image, going round its edge.  The forward-splatting
+    engines splat every original pixel inside this quadrilateral.
+    """
+    (sourceToOutput, newWidth, newHeight) = sourceFrame(solveHomography(corners), width, height)
+    imageCorners = np.array([[0, width - 1, width - 1, 0], [0, 0, height - 1, height - 1], [1, 1, 1, 1]])
+    projected = np.dot(sourceToOutput, imageCorners)
+    return (projected[:2] / projected[2]).T
 
-        with open(newFilename, 'wb') as f:
-            png.Writer(width=int(len(imageBoxedRowFlatPixel[0]) / 3), height=len(imageBoxedRowFlatPixel)).write(f, imageBoxedRowFlatPixel) 
-   
+def outlineMask(outline, width, height):
+    """
+    (height, width) bool array of the pixels of an image width x height
+    whose centers lie inside the convex quadrilateral outline, a (4, 2)
+    array of its corners in order going either way round.
+    """
+    xs = np.arange(width, dtype=np.float64)[np.newaxis, :]
+    ys = np.arange(height, dtype=np.float64)[:, np.newaxis]
+    (x, y) = outline.T
+    # The sign of the signed area, to turn the distances from the edges the
+    # same way whichever way round the corners go
+    orientation = np.sign(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) or 1
+    inside = np.ones((height, width), dtype=bool)
+    for ((x0, y0), (x1, y1)) in zip(outline, np.roll(outline, -1, axis=0)):
+        # Centers on an edge count as inside, give or take rounding
+        distance = ((x1 - x0) * (ys - y0) - (y1 - y0) * (xs - x0)) / max(np.hypot(x1 - x0, y1 - y0), 1e-12)
+        inside &= orientation * distance >= -1e-6
+    return inside
+
+def pushPullFill(pixels, covered, backgroundRGB, outline):
+    """
+    A fill for rectifyImageVectorized that closes holes of any size, where
+    interpolateMissingPixelsVectorized only closes those one pixel wide.
+    Input and output are as for interpolateMissingPixelsVectorized, plus
+    the outline of the original image from imageOutline; see
+    rectifyImagePushPull.
+
+    Push-pull: the covered pixels are averaged down a pyramid of 2x2
+    blocks, each level keeping a coverage weight of at most 1, until a
+    single pixel is left.  Going back up, each level's colors are blended
+    with its parent's by weight, so every hole is filled from the nearest
+    level at which its surroundings have some coverage.  Only holes inside
+    outline are filled, however large, down to whole rows that no original
+    pixel landed in where the original is magnified; the background around
+    the rectangle is left alone.
+    """
+    (height, width) = covered.shape
+    holes = outlineMask(outline, width, height) & ~covered
+    if not holes.any():
+        return
+
+    # Pull: average the covered colors down the pyramid
+    colors = pixels.astype(np.float32)
+    weights = covered.astype(np.float32)
+    levels = [(colors, weights)]
+    while max(weights.shape) > 1:
+        evenShape = (weights.shape[0] + weights.shape[0] % 2, weights.shape[1] + weights.shape[1] % 2)
+        premultiplied = np.zeros(evenShape + (3,), dtype=np.float32)
+        premultiplied[:colors.shape[0], :colors.shape[1]] = colors * weights[:, :, np.newaxis]
+        evenWeights = np.zeros(evenShape, dtype=np.float32)
+        evenWeights[:weights.shape[0], :weights.shape[1]] = weights
+
+        premultiplied = (premultiplied[0::2, 0::2] + premultiplied[1::2, 0::2] +
+            premultiplied[0::2, 1::2] + premultiplied[1::2, 1::2])
+        weightTotals = (evenWeights[0::2, 0::2] + evenWeights[1::2, 0::2] +
+            evenWeights[0::2, 1::2] + evenWeights[1::2, 1::2])
+        colors = premultiplied / np.maximum(weightTotals, 1e-12)[:, :, np.newaxis]
+        weights = np.minimum(weightTotals, 1)
+        levels.append((colors, weights))
+
+    # Push: blend each level with its parent, from the top down
+    (parentColors, parentWeights) = levels.pop()
+    while levels:
+        (colors, weights) = levels.pop()
+        upsampled = parentColors.repeat(2, axis=0).repeat(2, axis=1)[:colors.shape[0], :colors.shape[1]]
+        weights = weights[:, :, np.newaxis]
+        parentColors = colors * weights + upsampled * (1 - weights)
+
+    pixels[holes] = np.clip(np.round(parentColors[holes]), 0, 255)
+    covered[holes] = True
+
+def rectifyImagePushPull(image, corners, shouldInterpolate, backgroundRGB, profiler=NULL_PROFILER,
+        allocate=np.empty):
+    """rectifyImageVectorized with pushPullFill filling the holes inside the original image's outline"""
+    fill = functools.partial(pushPullFill, outline=imageOutline(corners, image.shape[1], image.shape[0]))
+    return rectifyImageVectorized(image, corners, shouldInterpolate, backgroundRGB, profiler, fill=fill,
+        allocate=allocate)
+
+def rectifyImagePushPullRows(image, corners, shouldInterpolate, backgroundRGB, profiler=NULL_PROFILER):
+    """Streaming form of rectifyImagePushPull; see rectifyImageVectorizedRows"""
+    fill = functools.partial(pushPullFill, outline=imageOutline(corners, image.shape[1], image.shape[0]))
+    return rectifyImageVectorizedRows(image, corners, shouldInterpolate, backgroundRGB, profiler, fill=fill)
+
+
+def rectifyImageTiled(image, corners, shouldInterpolate, backgroundRGB, profiler=NULL_PROFILER, threads=1,
+        sampling="nearest", allocate=np.empty):
+    """
+    Removes perspective by mapping each pixel of the altered image back into
+    the original image and sampling the original there, rather than by
+    splatting the original pixels forward.  Every altered pixel inside the
+    rectangle gets a color this way, so there are no missing pixels and
+    shouldInterpolate has no effect.
+
+    sampling is "nearest" to take the nearest original pixel, "bilinear"
+    to blend the four nearest, or "trilinear" to sample a prefiltered
+    pyramid of the original (see buildPyramid and warpTileTrilinear), which
+    keeps detail from aliasing where the far end of the surface is squeezed
+    together.
+
+    The altered image is split into bands of TILE_ROWS rows which are warped
+    on a pool of threads; the numpy operations doing the work release the
+    GIL, so a single image can use up to threads cores.
+
+    Output: The image with perspective removed, as a (newHeight, newWidth * 3)
+    uint8 numpy array made by allocate, as in rectifyImageVectorized.
+    """
+    (newWidth, newHeight, rows) = warpTiledRows(image, corners, backgroundRGB, profiler, threads, sampling)
+    pixels = allocate((newHeight, newWidth * 3), np.uint8)
+    with profiler.stage("warp"):
+        for (y, row) in enumerate(profiler.rows("warp", rows, newHeight)):
+            pixels[y] = row
+    return pixels
+
+def rectifyImageTiledRows(image, corners, shouldInterpolate, backgroundRGB, profiler=NULL_PROFILER, threads=1,
+        sampling="nearest"):
+    """
+    Streaming form of rectifyImageTiled, returning (newWidth, newHeight,
+    rows) as rectifyImageVectorizedRows does.  Bands are handed out to the
+    threads up front and their rows yielded in order as each band finishes.
+    When profiler is enabled every band is warped in its warp stage before
+    the first row is yielded, so that warping isn't timed as part of
+    encoding.
+    """
+    (newWidth, newHeight, rows) = warpTiledRows(image, corners, backgroundRGB, profiler, threads, sampling)
+    if profiler.enabled:
+        with profiler.stage("warp"):
+            rows = list(profiler.rows("warp", rows, newHeight))
+        rows = iter(rows)
+    return (newWidth, newHeight, rows)
+
+def warpTiledRows(image, corners, backgroundRGB, profiler=NULL_PROFILER, threads=1, sampling="nearest"):
+    """
+    The work of rectifyImageTiledRows.  With one thread each band is only
+    warped as its rows are asked for; with more the pool works ahead.
+    """
+    with profiler.stage("solve"):
+        hVec = solveHomography(corners)
+        (outputToSource, newWidth, newHeight) = outputFrame(hVec, image.shape[1], image.shape[0])
+
+    if sampling in ("trilinear", "bilinear"):
+        if sampling == "trilinear":
+            with profiler.stage("pyramid"):
+                pyramid = buildPyramid(image)
+        else:
+            # A pyramid of just the original always samples it bilinearly
+            pyramid = [image[:, :, :3]]
+
+        def warpBand(y0):
+            y1 = min(y0 + TILE_ROWS, newHeight)
+            # Square tiles, so each can choose its own pyramid level
+            return np.hstack([warpTileTrilinear(pyramid, outputToSource, x0, y0, min(x0 + TILE_ROWS, newWidth),
+                y1, backgroundRGB) for x0 in range(0, newWidth, TILE_ROWS)])
+    else:
+        def warpBand(y0):
+            return warpTile(image, outputToSource, 0, y0, newWidth, min(y0 + TILE_ROWS, newHeight),
+                backgroundRGB)
+
+    def iterRows():
+        if threads == 1:
+            # Without a pool to run ahead, only the band being read is held
+            yield from bandRows(map(warpBand, range(0, newHeight, TILE_ROWS)))
+            return
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            yield from bandRows(pool.map(warpBand, range(0, newHeight, TILE_ROWS)))
+
+    def bandRows(bands):
+        for band in bands:
+            for row in band:
+                yield row.reshape(newWidth * 3)
+
+    return (newWidth, newHeight, iterRows())
+
+def outputFrame(hVec, width, height):
+    """
+    Input: The homography from solveHomography and the original image's size.
+
+    Output: A tuple (outputToSource, newWidth, newHeight) where newWidth and
+    newHeight are the size of the altered image as splatPoints would choose
+    it, and outputToSource is the 3x3 matrix taking a homogeneous altered
+    image pixel (x, y, 1) to the homogeneous original image point it shows.
+    """
+    (sourceToOutput, newWidth, newHeight) = sourceFrame(hVec, width, height)
+    return (np.linalg.inv(sourceToOutput), newWidth, newHeight)
+
+def sourceFrame(hVec, width, height):
+    """
+    The inverse of outputFrame: returns (sourceToOutput, newWidth, newHeight)
+    where sourceToOutput is the 3x3 matrix taking a homogeneous original
+    image pixel to the homogeneous altered image point it lands on.
+    """
+    # A homography maps the image rectangle to a convex quadrilateral, so the
+    # extremes of the projected points are at the projected image corners.
+    imageCorners = np.array([[0, width - 1, width - 1, 0], [0, 0, height - 1, height - 1], [1, 1, 1, 1]])
+    rotatedCorners = np.dot(hVec, imageCorners)
+    projectedX = rotatedCorners[0] / rotatedCorners[2]
+    projectedY = rotatedCorners[1] / rotatedCorners[2]
+    minX, maxX = projectedX.min(), projectedX.max()
+    minY, maxY = projectedY.min(), projectedY.max()
+
+    scalingFactor = ((width / (maxX - minX)) + (height / (maxY - minY))) / 2
+    newWidth = min(int((maxX - minX) * scalingFactor) + 3, MAX_IMAGE_SIZE)
+    newHeight = min(int((maxY - minY) * scalingFactor) + 2, MAX_IMAGE_SIZE)
+
+    rotatedToOutput = np.array([[scalingFactor, 0, -minX * scalingFactor],
+        [0, scalingFactor, -minY * scalingFactor], [0, 0, 1]])
+    return (np.dot(rotatedToOutput, hVec), newWidth, newHeight)
+
+def mapTile(outputToSource, x0, y0, x1, y1, step=1):
+    """
+    The original image coordinates (sourceX, sourceY), as (y1 - y0, x1 - x0)
+    float64 arrays, that the pixels of the altered image tile spanning
+    columns x0 to x1 and rows y0 to y1 (exclusive) map to.  With a step,
+    only every step'th column from x0 is mapped.
+    """
+    xs = np.arange(x0, x1, step, dtype=np.float64)[np.newaxis, :]
+    ys = np.arange(y0, y1, dtype=np.float64)[:, np.newaxis]
+
+    ((m00, m01, m02), (m10, m11, m12), (m20, m21, m22)) = outputToSource
+    w = m20 * xs + m21 * ys + m22
+    return ((m00 * xs + m01 * ys + m02) / w, (m10 * xs + m11 * ys + m12) / w)
+
+def warpTile(pixels, outputToSource, x0, y0, x1, y1, backgroundRGB):
+    """
+    Input: The original image's (height, width, channels) pixels array, the
+    outputToSource matrix from outputFrame, and the altered image tile
+    spanning columns x0 to x1 and rows y0 to y1 (exclusive).
+
+    Output: The tile as a (y1 - y0, x1 - x0, 3) uint8 array, each pixel the
+    original pixel nearest to where it maps, or backgroundRGB where it maps
+    outside the original image.  With the numba backend the work is done by
+    jitKernels.warpTileNearest.
+    """
+    if jitKernels.enabled():
+        tile = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        tile[:] = backgroundRGB
+        jitKernels.warpTileNearest(pixels, outputToSource, x0, y0, x1, y1, tile)
+        return tile
+
+    (height, width) = pixels.shape[:2]
+    (sourceX, sourceY) = mapTile(outputToSource, x0, y0, x1, y1)
+    sourceX = np.floor(sourceX + 0.5).astype(np.intp)
+    sourceY = np.floor(sourceY + 0.5).astype(np.intp)
+    inside = (sourceX >= 0) & (sourceX < width) & (sourceY >= 0) & (sourceY < height)
+
+    tile = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+    tile[:] = backgroundRGB
+    tile[inside] = pixels[sourceY[inside], sourceX[inside], :3]
+    return tile
+
+def buildPyramid(pixels):
+    """
+    Input: The original image's (height, width, channels) pixels array.
+
+    Output: A list of progressively halved copies of its RGB channels,
+    starting with the original itself (a uint8 view) and continuing with
+    float32 arrays, each the 2x2 box average of the one before, down to a
+    single row or column.  An odd last row or column is dropped when
+    halving.  The levels after the original have a third as many pixels as
+    it between them, but at four bytes a channel they take 4/3 as much
+    memory as its RGB channels, on top of the original itself.  Building
+    them also takes a float32 copy of the original, four times the size of
+    its RGB channels, until the first level is made.
+    """
+    pyramid = [pixels[:, :, :3]]
+    level = pixels[:, :, :3].astype(np.float32)
+    while min(level.shape[:2]) > 1:
+        (height, width) = (level.shape[0] // 2 * 2, level.shape[1] // 2 * 2)
+        even = level[:height, :width]
+        level = even[0::2, 0::2] + even[1::2, 0::2]
+        level += even[0::2, 1::2]
+        level += even[1::2, 1::2]
+        level *= 0.25
+        pyramid.append(level)
+    return pyramid
+
+def pyramidLevel(outputToSource, x, y):
+    """
+    The fractional pyramid level to sample at around altered image pixel
+    (x, y): log2 of the number of original pixels one altered pixel step
+    spans there, according to the Jacobian of outputToSource, or 0 where
+    the original is magnified.
+    """
+    ((m00, m01, m02), (m10, m11, m12), (m20, m21, m22)) = outputToSource
+    w = m20 * x + m21 * y + m22
+    u = (m00 * x + m01 * y + m02) / w
+    v = (m10 * x + m11 * y + m12) / w
+    # Partial derivatives of the projected point u, v
+    dudx = (m00 - u * m20) / w
+    dudy = (m01 - u * m21) / w
+    dvdx = (m10 - v * m20) / w
+    dvdy = (m11 - v * m21) / w
+    footprint = max(np.hypot(dudx, dvdx), np.hypot(dudy, dvdy))
+    return max(float(np.log2(footprint)), 0.0)
+
+def sampleBilinear(level, sourceX, sourceY):
+    """
+    Bilinearly interpolated colors of the (height, width, 3) array level at
+    the fractional pixel coordinates sourceX, sourceY, as a float32 array
+    of shape sourceX.shape + (3,).  Coordinates past the edges are clamped.
+    """
+    (height, width) = level.shape[:2]
+    x0 = np.floor(sourceX)
+    y0 = np.floor(sourceY)
+    fx = (sourceX - x0).astype(np.float32)[..., np.newaxis]
+    fy = (sourceY - y0).astype(np.float32)[..., np.newaxis]
+    x0 = x0.astype(np.intp)
+    y0 = y0.astype(np.intp)
+    x1 = np.clip(x0 + 1, 0, width - 1)
+    y1 = np.clip(y0 + 1, 0, height - 1)
+    np.clip(x0, 0, width - 1, out=x0)
+    np.clip(y0, 0, height - 1, out=y0)
+
+    top = level[y0, x0] * (1 - fx) + level[y0, x1] * fx
+    bottom = level[y1, x0] * (1 - fx) + level[y1, x1] * fx
+    return top * (1 - fy) + bottom * fy
+
+def warpTileTrilinear(pyramid, outputToSource, x0, y0, x1, y1, backgroundRGB):
+    """
+    warpTile with trilinear sampling: the tile picks a fractional pyramid
+    level from the Jacobian at its center, samples the levels either side
+    of it bilinearly and blends the two.  Pixels that map outside the
+    original image are backgroundRGB, as in warpTile.
+    """
+    (height, width) = pyramid[0].shape[:2]
+    (sourceX, sourceY) = mapTile(outputToSource, x0, y0, x1, y1)
+    inside = ((sourceX >= -0.5) & (sourceX < width - 0.5) & (sourceY >= -0.5) & (sourceY < height - 0.5))
+
+    level = min(pyramidLevel(outputToSource, (x0 + x1 - 1) / 2, (y0 + y1 - 1) / 2), len(pyramid) - 1)
+    lower = int(level)
+    blend = level - lower
+
+    def sampleLevel(index):
+        # Pixel centers of level index sit at 2**index * (x + 0.5) - 0.5 in the original
+        scale = 0.5 ** index
+        return sampleBilinear(pyramid[index], (sourceX + 0.5) * scale - 0.5, (sourceY + 0.5) * scale - 0.5)
+
+    colors = sampleLevel(lower)
+    if blend > 0:
+        colors *= 1 - blend
+        colors += sampleLevel(lower + 1) * blend
+
+    tile = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+    tile[:] = backgroundRGB
+    tile[inside] = np.clip(np.round(colors[inside]), 0, 255)
+    return tile
+
+# Interchangeable implementations of rectifyImage, by name
+ENGINES = {
+    "reference": rectifyImage,
+    "vectorized": rectifyImageVectorized,
+    "tiled": rectifyImageTiled,
+    "compact": functools.partial(rectifyImageVectorized, warp=warpCompact),
+    "mipmap": functools.partial(rectifyImageTiled, sampling="trilinear"),
+    "pushpull": rectifyImagePushPull,
+    "bilinear": functools.partial(rectifyImageTiled, sampling="bilinear"),
+}
+DEFAULT_ENGINE = "reference"
+
+# Streaming forms of those engines that have one; see rectifyImageRows
+ROW_ENGINES = {
+    "vectorized": rectifyImageVectorizedRows,
+    "tiled": rectifyImageTiledRows,
+    "compact": functools.partial(rectifyImageVectorizedRows, warp=warpCompact),
+    "mipmap": functools.partial(rectifyImageTiledRows, sampling="trilinear"),
+    "pushpull": rectifyImagePushPullRows,
+    "bilinear": functools.partial(rectifyImageTiledRows, sampling="bilinear"),
+}
+
+# Engines that take a threads argument; see engineFor
+THREADED_ENGINES = {"tiled", "mipmap", "bilinear"}
+
+# Engines that take an allocate(shape, dtype) argument making the uint8
+# array they build the altered image in, such as one in shared memory.  The
+# image they return is a view of that array.
+CANVAS_ENGINES = THREADED_ENGINES | {"vectorized", "compact", "pushpull"}
+
+# Bump an engine's version whenever a change alters its output, so that
+# cached results from the old version aren't reused.
+ENGINE_VERSIONS = {
+    "reference": 1,
+    "vectorized": 1,
+    "tiled": 1,
+    "compact": 1,
+    "mipmap": 1,
+    "pushpull": 2,
+    "bilinear": 1,
+}
+
+def engineFor(engineName, threads=1, rowEngine=False):
+    """
+    The function in ENGINES, or in ROW_ENGINES if rowEngine, for engineName,
+    with the number of threads bound if it's a threaded engine.
+    """
+    engine = (ROW_ENGINES if rowEngine else ENGINES)[engineName]
+    if engineName in THREADED_ENGINES:
+        engine = functools.partial(engine, threads=threads)
+    return engine
+
+def rectifyFile(filename, newFilename, corners, engineName=DEFAULT_ENGINE, shouldInterpolate=True,
+        backgroundRGB=DEFAULT_IMAGE_BACKGROUND_RGB, outputFormat="png", profiler=NULL_PROFILER,
+        decodedCache=None, threads=1, scale=1, allocate=np.empty, pixels=None):
+    """
+    Reads filename, removes its perspective given the corners of a rectangle
+    in it, and writes the result to newFilename.  pixels, if given, are
+    filename's already decoded pixels, used instead of reading it again.
+    decodedCache is passed on to fileToImage, and threads to engineFor.
+    allocate(shape, dtype) makes the decoded image's array and, for
+    CANVAS_ENGINES, the altered image's, so a caller can reuse its own
+    buffers.  With a scale above 1 the
+    image is decimated by that factor before the perspective is removed,
+    for a draft at a fraction of the cost; see draftImage.  The rows done
+    in each stage go to profiler's progress callback, if it has one; see
+    StageProfiler.
+    """
+    image = pixels
+    if image is None:
+        with profiler.stage("decode"):
+            image = fileToImage(filename, decodedCache, profiler, allocate)
+    (image, corners) = draftImage(image, corners, scale, profiler)
+
+    engine = engineFor(engineName, threads)
+    if engineName in CANVAS_ENGINES:
+        engine = functools.partial(engine, allocate=allocate)
+    imageBoxedRowFlatPixel = engine(image, corners, shouldInterpolate, backgroundRGB, profiler)
+
+    with profiler.stage("encode"):
+        newHeight = len(imageBoxedRowFlatPixel)
+        writeToFile(newFilename, int(len(imageBoxedRowFlatPixel[0]) / 3), newHeight,
+            profiler.rows("encode", imageBoxedRowFlatPixel, newHeight), outputFormat)
+
+def rectifyBytes(data, corners, engineName=DEFAULT_ENGINE, shouldInterpolate=True,
+        backgroundRGB=DEFAULT_IMAGE_BACKGROUND_RGB, outputFormat="png", profiler=NULL_PROFILER, threads=1,
+        scale=1):
+    """
+    rectifyFile for an image held in memory: takes the contents of a png or
+    raw Netpbm file and returns the contents of the altered image's file.
+    """
+    with profiler.stage("decode"):
+        image = decodePixelsFromBytes(data, profiler)
+    (image, corners) = draftImage(image, corners, scale, profiler)
+
+    (newWidth, newHeight, rows) = rectifyImageRows(engineName, image, corners, shouldInterpolate,
+        backgroundRGB, profiler, threads)
+
+    with profiler.stage("encode"):
+        output = io.BytesIO()
+        writeToStream(output, newWidth, newHeight, profiler.rows("encode", rows, newHeight), outputFormat)
+    return output.getvalue()
+
+def rectifyImageRows(engineName, image, corners, shouldInterpolate, backgroundRGB, profiler=NULL_PROFILER,
+        threads=1):
+    """
+    Runs the named engine, returning (newWidth, newHeight, rows) where rows
+    iterates over the altered image's rows in boxed row flat pixel format.
+    Engines in ROW_ENGINES produce rows as they're finished; others produce
+    the whole image before returning.
+    """
+    if engineName in ROW_ENGINES:
+        return engineFor(engineName, threads, rowEngine=True)(image, corners, shouldInterpolate,
+            backgroundRGB, profiler)
+
+    pixels = engineFor(engineName, threads)(image, corners, shouldInterpolate, backgroundRGB, profiler)
+    return (len(pixels[0]) // 3, len(pixels), iter(pixels))
+
+def outputOptions(args):
+    """
+    The options in args that affect the contents of the altered image, in a
+    form that can be serialized for use in a cache key.
+    """
+    options = {"engine": args.engine, "engineVersion": ENGINE_VERSIONS[args.engine],
+        "interpolate": args.shouldInterpolate, "backgroundRGB": list(args.backgroundRGB),
+        "maxImageSize": MAX_IMAGE_SIZE, "outputFormat": args.output_format}
+    # Left out at full scale so that results cached before --scale still match
+    if args.scale != 1:
+        options["scale"] = args.scale
+    return options
+
+def newFilenameFor(filename, suffix, extension=None):
+    """
+    Name of the altered image for filename, e.g. birds.png -> birds.FIXED.png.
+    The original extension is kept unless another one is given.
+    """
+    splitFilename = filename.split('.')
+    if extension is None:
+        extension = splitFilename[-1]
+    return ".".join(splitFilename[:-1]) + "." + suffix + "." + extension
+
+
+if __name__ == "__main__":
+
+    args = getArgs()
+    jitKernels.useBackend(args.backend)
+    progressCallback = None
+    if args.progress == "line":
+        progressCallback = lambda event: log(formatProgress(event))
+    elif args.progress == "json":
+        progressCallback = lambda event: log(json.dumps(event))
+    profiler = StageProfiler(enabled=args.profile is not None, progress=progressCallback)
+    cache = None
+    if args.cache_dir is not None:
+        cache = resultCache.ResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    decodedCache = None
+    if args.pixel_cache_dir is not None:
+        decodedCache = pixelCache.PixelCache(args.pixel_cache_dir, args.pixel_cache_size * 1024 * 1024)
+
+    log("Processing images:", args.filenames)
+
+    givenCorners = None
+    if args.corners is not None:
+        givenCorners = cornersFromArgs(args.corners)
+
+    # Collect all corner clicks first so the user doesn't have to wait for us to
+    # fully process each image between the recording of each set of clicks.
+    # With --track only the first frame's corners come from there, and the
+    # rest are followed from frame to frame
+    allCorners = []
+    tracker = None
+    keptPixels = KeptPixels()
+    for filename in args.filenames:
+        profiler.currentFile = filename
+        log("Getting corners for image", filename)
+        with profiler.stage("corner input"):
+            if tracker is not None:
+                corners = tracker.track(keptPixels.load(filename, decodedCache))
+                if tracker.resolved:
+                    log("Corners moved, solving again")
+            else:
+                corners = cornersFor(filename, givenCorners, args.auto_corners, args.min_confidence, decodedCache,
+                    keptPixels)
+                if args.track:
+                    tracker = cornerTracker.CornerTracker(keptPixels.load(filename, decodedCache), corners,
+                        args.move_threshold)
+        log("Corners", corners)
+        allCorners.append(corners)
+
+    # Now we'll actually do the alteration of each image in turn, or with
+    # --pipeline queue them up to go through sharedPipeline together
+    # (With --pipeline, files are done as they come out of the pipeline)
+    pipelineJobs = []
+    pipelineKeys = {}
+    batch = list(zip(args.filenames, allCorners))
+    if not args.pipeline:
+        batch = profiler.files(batch, len(batch))
+    for (filename, corners) in batch:
+        profiler.currentFile = filename
+        pixels = keptPixels.take(filename)
+        if args.output is not None:
+            newFilename = args.output
+        elif filename == STDIO_FILENAME:
+            newFilename = STDIO_FILENAME
+        else:
+            newFilename = newFilenameFor(filename, args.suffix, OUTPUT_FORMAT_EXTENSIONS[args.output_format])
+
+        useCache = cache is not None and STDIO_FILENAME not in (filename, newFilename)
+        if useCache:
+            key = resultCache.cacheKey(filename, corners, outputOptions(args))
+            if cache.fetch(key, newFilename):
+                log("Reused cached result as", newFilename)
+                continue
+
+        if newFilename == STDIO_FILENAME:
+            image = pixels
+            if image is None:
+                with profiler.stage("decode"):
+                    image = fileToImage(filename, decodedCache, profiler)
+            (image, corners) = draftImage(image, corners, args.scale, profiler)
+
+            # Stream rows out as the engine finishes them
+            log("Writing new image to stdout")
+            (newWidth, newHeight, rows) = rectifyImageRows(args.engine, image, corners,
+                args.shouldInterpolate, args.backgroundRGB, profiler, args.threads)
+            with profiler.stage("encode"):
+                writeToStream(sys.stdout.buffer, newWidth, newHeight, profiler.rows("encode", rows, newHeight),
+                    args.output_format)
+                sys.stdout.buffer.flush()
+            continue
+
+        log("Saving new image as", newFilename)
+        if args.pipeline:
+            pipelineJobs.append((filename, corners, newFilename))
+            if useCache:
+                pipelineKeys[newFilename] = key
+            continue
+
+        rectifyFile(filename, newFilename, corners, args.engine, args.shouldInterpolate, args.backgroundRGB,
+            args.output_format, profiler, decodedCache, threads=args.threads, scale=args.scale, pixels=pixels)
+
+        if useCache:
+            cache.store(key, newFilename)
+
+    if pipelineJobs:
+        import sharedPipeline
+        for (filename, newFilename) in profiler.files(sharedPipeline.rectifyFiles(pipelineJobs, args.engine,
+                args.shouldInterpolate, args.backgroundRGB, args.output_format, decodedCache, args.threads,
+                args.scale),
+                len(pipelineJobs)):
+            log("Saved", newFilename)
+            if newFilename in pipelineKeys:
+                cache.store(pipelineKeys[newFilename], newFilename)
+
+    # With --manifest the images come from there instead, and with each one
+    # written out the journal notes that it's done
+    failedJobs = 0
+    if args.manifest is not None:
+        def rectifyJob(job):
+            (filename, corners, newFilename) = job
+            profiler.currentFile = filename
+            if corners is None:
+                # Nobody may be there to click, so an image without corners
+                # fails like any other bad job
+                corners = cornersFor(filename, givenCorners, args.auto_corners, args.min_confidence,
+                    decodedCache, keptPixels, askUser=False)
+            pixels = keptPixels.take(filename)
+            if cache is not None:
+                key = resultCache.cacheKey(filename, corners, outputOptions(args))
+                if cache.fetch(key, newFilename):
+                    return corners
+            rectifyFile(filename, newFilename, corners, args.engine, args.shouldInterpolate, args.backgroundRGB,
+                args.output_format, profiler, decodedCache, threads=args.threads, scale=args.scale, pixels=pixels)
+            if cache is not None:
+                cache.store(key, newFilename)
+            return corners
+
+        def manifestCorners(filename, corners):
+            """
+            The job's own corners, else those from --corners or its sidecar,
+            so that changing either makes the journal see a new job.  A
+            sidecar that can't be read is left for the job to fail on.
+            """
+            if corners is None:
+                try:
+                    corners = knownCorners(filename, givenCorners)
+                except (OSError, ValueError):
+                    pass
+            return corners
+
+        jobs = [(filename, manifestCorners(filename, corners), newFilename or newFilenameFor(filename,
+            args.suffix, OUTPUT_FORMAT_EXTENSIONS[args.output_format]))
+            for (filename, corners, newFilename) in batchManifest.readManifest(args.manifest)]
+        journal = batchManifest.Journal(args.journal or args.manifest + batchManifest.JOURNAL_SUFFIX,
+            outputOptions(args))
+        (pending, skipped) = batchManifest.pendingJobs(jobs, journal, args.max_attempts)
+        log("%d of %d images already done, %d given up on after %d attempts" % (len(jobs) - len(pending) -
+            len(skipped), len(jobs), len(skipped), args.max_attempts))
+        for (filename, newFilename, error) in profiler.files(batchManifest.runJobs(pending, journal, rectifyJob,
+                args.max_attempts), len(pending)):
+            if error is None:
+                log("Saved", newFilename)
+            else:
+                log("Gave up on", filename, "after", error)
+                failedJobs += 1
+        failedJobs += len(skipped)
+
+    if args.watch is not None:
+        import watchFolder
+        watchFolder.watch(args.watch, args.watch_output or os.path.join(args.watch, watchFolder.OUTPUT_DIRECTORY),
+            args.workers, givenCorners, args.auto_corners, args.min_confidence, args.engine,
+            args.shouldInterpolate, args.backgroundRGB, args.output_format, args.threads, args.suffix,
+            None if args.memory_budget is None else args.memory_budget * 1024 * 1024)
+
+    if args.profile is not None:
+        profiler.write(args.profile)
+    if failedJobs:
+        sys.exit(1)
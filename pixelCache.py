@@ -0,0 +1,117 @@
+#
+# pixelCache.py
+#
+# On-disk cache of decoded source images.
+#
+
+"""
+Keeps the decoded pixels of each source image as a .npy file so that a
+later run on the same source, for example to re-pick its corners, can
+memory-map the pixels with np.load(mmap_mode='r') instead of running the
+pure-Python PNG decoder again.
+
+Each entry is validated against the source's size, modification time and
+SHA-256 hash before use, and entries are evicted least recently used first
+once the cache grows past its size limit.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from resultCache import fileDigest
+
+
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+
+
+class PixelCache:
+    """
+    Directory of decoded images, each stored as <key>.npy with the source's
+    size, mtime and hash alongside in <key>.json.  Keys are derived from the
+    source's absolute path.
+    """
+
+    def __init__(self, directory, maxBytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok=True)
+
+    def pathsFor(self, sourceFilename):
+        """(pixelsPath, metadataPath) for sourceFilename's entry"""
+        key = hashlib.sha256(os.path.abspath(sourceFilename).encode()).hexdigest()
+        base = os.path.join(self.directory, key)
+        return (base + ".npy", base + ".json")
+
+    def load(self, sourceFilename):
+        """
+        The cached pixels of sourceFilename as a read-only memory-mapped
+        array, or None if there's no valid entry for it.
+        """
+        (pixelsPath, metadataPath) = self.pathsFor(sourceFilename)
+        try:
+            with open(metadataPath) as f:
+                metadata = json.load(f)
+            stat = os.stat(sourceFilename)
+            # Size and mtime catch most changes cheaply; the hash catches
+            # the rest before we trust the entry.
+            if (metadata["size"] != stat.st_size or metadata["mtime"] != stat.st_mtime_ns or
+                    metadata["sha256"] != fileDigest(sourceFilename).hexdigest()):
+                return None
+            pixels = np.load(pixelsPath, mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # Mark as recently used, unless it's been evicted since; the mapping
+        # stays valid either way
+        try:
+            os.utime(pixelsPath)
+        except FileNotFoundError:
+            pass
+        return pixels
+
+    def store(self, sourceFilename, pixels):
+        """Cache pixels as the decoding of sourceFilename, then evict as needed"""
+        (pixelsPath, metadataPath) = self.pathsFor(sourceFilename)
+        stat = os.stat(sourceFilename)
+        metadata = {"source": os.path.abspath(sourceFilename), "size": stat.st_size,
+            "mtime": stat.st_mtime_ns, "sha256": fileDigest(sourceFilename).hexdigest()}
+
+        # Write both files under temporary names and rename them into place,
+        # pixels first, so a reader never validates a partial entry.
+        suffix = ".%d.tmp" % os.getpid()
+        with open(pixelsPath + suffix, 'wb') as f:
+            np.save(f, pixels)
+        with open(metadataPath + suffix, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(pixelsPath + suffix, pixelsPath)
+        os.replace(metadataPath + suffix, metadataPath)
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in maxBytes"""
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".npy"):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        totalBytes = sum(size for (lastUsed, size, path) in entries)
+        for (lastUsed, size, path) in entries:
+            if totalBytes <= self.maxBytes:
+                break
+            for entryPath in (path, path[:-len(".npy")] + ".json"):
+                try:
+                    os.remove(entryPath)
+                except FileNotFoundError:
+                    pass
+            totalBytes -= size
@@ -0,0 +1,290 @@
+#!/usr/bin/python3
+#
+# rectifyDaemon.py
+#
+# Long-running perspectiveRemover worker daemon and its client.
+#
+
+"""
+Runs perspective removal jobs in a long-lived daemon so that each job skips
+Python startup and the numpy, png.py and perspectiveRemover imports.
+
+    python rectifyDaemon.py serve --workers 4
+    python rectifyDaemon.py submit -c 48 8 178 4 170 292 50 268 book.png
+
+The daemon listens on a Unix domain socket and hands jobs to a pool of
+worker processes that import everything once, at startup.  Each worker also
+keeps the arrays its last jobs decoded into and warped into, and reuses
+them for later jobs of the same size instead of allocating new ones.
+
+The client only imports the standard library.  It sends one job per
+connection as a line of JSON, and returns once the daemon replies that the
+output has been written (exit status 0) or that the job failed (exit status
+1, with the error on stderr).  Corners not given with --corners are read from
+the input's corner sidecar file; the daemon never asks for clicks.
+"""
+
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "perspectiveRemover.sock")
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Number of array shapes each worker keeps scratch buffers for
+SCRATCH_SHAPES = 4
+
+
+def getArgs():
+    argParser = argparse.ArgumentParser(description="Perspective removal daemon and client.")
+    argParser.add_argument("--socket", type=str, default=DEFAULT_SOCKET,
+        help="Unix domain socket the daemon listens on")
+    commands = argParser.add_subparsers(dest="command", required=True)
+
+    serveParser = commands.add_parser("serve", help="Run the daemon")
+    serveParser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+        help="Number of worker processes")
+    serveParser.add_argument("--backend", type=str, default=None,
+        help="jitKernels backend for the workers: auto (default), numpy or numba")
+    serveParser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+        help="Megabytes of memory the jobs running at once may need between them, as estimated from their "
+            "inputs' headers; others wait, and jobs too big for it alone run in strip mode")
+
+    submitParser = commands.add_parser("submit", help="Send a job to the daemon and wait for it")
+    submitParser.add_argument("filename", type=str, help="Image to alter")
+    submitParser.add_argument("-o", "--output", type=str, default=None,
+        help="Filename for the altered image; defaults to the usual suffixed name")
+    submitParser.add_argument("-s", "--suffix", type=str, default="FIXED",
+        help="Suffix for the altered image when --output isn't given")
+    submitParser.add_argument("-c", "--corners", type=float, nargs=8, default=None,
+        metavar=("X0", "Y0", "X1", "Y1", "X2", "Y2", "X3", "Y3"),
+        help="Corners of the rectangle; defaults to the input's corner sidecar file")
+    submitParser.add_argument("-b", "--backgroundRGB", type=int, nargs=3, default=(0, 0, 0),
+        help="0-255 R,G,B channel values for altered image background")
+    submitParser.add_argument("-n", "--no-interpolate", dest='shouldInterpolate', action='store_false',
+        help="Use background RGB for all missing pixels in altered image")
+    submitParser.add_argument("--engine", type=str, default=None,
+        help="perspectiveRemover engine to use; defaults to the daemon's default")
+    submitParser.add_argument("--output-format", type=str, default="png",
+        help="png, ppm or pam")
+    submitParser.set_defaults(shouldInterpolate=True)
+
+    return argParser.parse_args()
+
+
+# === Worker side ===
+
+class ScratchBuffers:
+    """
+    Arrays a worker process keeps from job to job.  allocate, with the
+    signature of numpy.empty, hands out a kept array of the shape and dtype
+    asked for if there is one free, and a new one otherwise.  release, once
+    a job's output is written, frees every array handed out for it.  Arrays
+    of the maxShapes shapes asked for most recently are kept.
+    """
+
+    def __init__(self, maxShapes=SCRATCH_SHAPES):
+        self.maxShapes = maxShapes
+        # (shape, dtype) -> arrays free for the next job, most recently used last
+        self.free = OrderedDict()
+        self.handedOut = []
+
+    def allocate(self, shape, dtype):
+        import numpy as np
+        key = (tuple(shape), np.dtype(dtype).str)
+        arrays = self.free.setdefault(key, [])
+        self.free.move_to_end(key)
+        array = arrays.pop() if arrays else np.empty(shape, dtype)
+        self.handedOut.append((key, array))
+        return array
+
+    def release(self):
+        for (key, array) in self.handedOut:
+            self.free.setdefault(key, []).append(array)
+            self.free.move_to_end(key)
+        self.handedOut = []
+        while len(self.free) > self.maxShapes:
+            self.free.popitem(last=False)
+
+# Buffers kept by this worker process
+scratch = ScratchBuffers()
+
+def warmWorker(backendName):
+    """
+    Process pool initializer: do the expensive imports before any job
+    arrives, and switch to the jitKernels backend backendName
+    """
+    # Let the daemon's main process handle Ctrl-C and shut the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import jitKernels
+    import perspectiveRemover
+    jitKernels.useBackend(backendName)
+
+def runJob(job):
+    """
+    Carry out one job, a dict as sent by submitJob.  Returns the name of the
+    altered image.  Runs in a worker process.
+    """
+    import perspectiveRemover
+
+    filename = job["input"]
+    if job.get("corners") is not None:
+        corners = tuple(tuple(corner) for corner in job["corners"])
+    else:
+        sidecarFilename = perspectiveRemover.cornerSidecarFilename(filename)
+        if not os.path.exists(sidecarFilename):
+            raise ValueError("no corners given and no corner sidecar file %s" % sidecarFilename)
+        corners = perspectiveRemover.readCornerSidecar(sidecarFilename)
+
+    outputFormat = job.get("outputFormat", "png")
+    if outputFormat not in perspectiveRemover.OUTPUT_FORMAT_EXTENSIONS:
+        raise ValueError("unknown output format %s" % outputFormat)
+    engineName = job.get("engine") or perspectiveRemover.DEFAULT_ENGINE
+    if engineName not in perspectiveRemover.ENGINES:
+        raise ValueError("unknown engine %s" % engineName)
+
+    newFilename = job.get("output")
+    if newFilename is None:
+        newFilename = perspectiveRemover.newFilenameFor(filename, job.get("suffix", "FIXED"),
+            perspectiveRemover.OUTPUT_FORMAT_EXTENSIONS[outputFormat])
+
+    if job.get("strip"):
+        import memoryScheduler
+        memoryScheduler.rectifyFileInStrips(filename, newFilename, corners, job.get("interpolate", True),
+            tuple(job.get("backgroundRGB", (0, 0, 0))), outputFormat, engineName)
+    else:
+        try:
+            perspectiveRemover.rectifyFile(filename, newFilename, corners, engineName,
+                job.get("interpolate", True), tuple(job.get("backgroundRGB", (0, 0, 0))),
+                outputFormat, allocate=scratch.allocate)
+        finally:
+            scratch.release()
+    return newFilename
+
+
+# === Daemon side ===
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """
+    Reads one job from the connection, runs it on the pool, once the
+    server's scheduler admits it if it has one, and replies
+    """
+
+    def handle(self):
+        start = time.perf_counter()
+        try:
+            job = json.loads(self.rfile.readline())
+            scheduler = self.server.scheduler
+            if scheduler is None:
+                newFilename = self.server.pool.submit(runJob, job).result()
+            else:
+                (peakBytes, job["strip"]) = scheduler.plan(job["input"], job.get("corners"), job.get("engine"))
+                # Keyed by the connection, as the same input may be sent twice at once
+                with scheduler.admitted(self, peakBytes):
+                    newFilename = self.server.pool.submit(runJob, job).result()
+            reply = {"status": "ok", "output": newFilename}
+        except Exception as e:
+            reply = {"status": "error", "message": "%s: %s" % (type(e).__name__, e)}
+        reply["seconds"] = time.perf_counter() - start
+
+        try:
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+        except OSError:
+            # The client gave up waiting
+            pass
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socketPath, pool, scheduler=None):
+        self.pool = pool
+        self.scheduler = scheduler
+        super().__init__(socketPath, JobHandler)
+
+def serve(socketPath, workers, memoryBudget=None, backendName=None):
+    import jitKernels
+    if backendName is None:
+        backendName = jitKernels.DEFAULT_BACKEND
+    if backendName not in jitKernels.BACKENDS:
+        sys.exit("Unknown backend %s, expected one of %s" % (backendName, ", ".join(jitKernels.BACKENDS)))
+    if not jitKernels.backendAvailable(backendName):
+        sys.exit("The %s backend needs Numba installed" % backendName)
+
+    if os.path.exists(socketPath):
+        # Refuse to steal the socket from a daemon that's still running
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socketPath)
+            probe.close()
+            sys.exit("A daemon is already listening on %s" % socketPath)
+        except OSError:
+            os.remove(socketPath)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=warmWorker, initargs=(backendName,)) as pool:
+        # Start the workers now rather than on the first job
+        for future in [pool.submit(os.getpid) for i in range(workers)]:
+            future.result()
+
+        scheduler = None
+        if memoryBudget is not None:
+            import memoryScheduler
+            scheduler = memoryScheduler.AdmissionScheduler(memoryBudget)
+        server = DaemonServer(socketPath, pool, scheduler)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print("Listening on %s with %d workers on the %s backend" % (socketPath, workers, backendName),
+            file=sys.stderr)
+        try:
+            server.serve_forever()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            server.server_close()
+            os.remove(socketPath)
+
+
+# === Client side ===
+
+def submitJob(socketPath, job):
+    """Send job to the daemon at socketPath and return its reply dict"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socketPath)
+        connection.sendall((json.dumps(job) + "\n").encode())
+        with connection.makefile('rb') as replies:
+            return json.loads(replies.readline())
+
+def jobFromArgs(args):
+    """The job dict for the submit command's arguments"""
+    corners = None
+    if args.corners is not None:
+        corners = [list(corner) for corner in zip(args.corners[0::2], args.corners[1::2])]
+    output = None
+    if args.output is not None:
+        output = os.path.abspath(args.output)
+    # The daemon has its own working directory
+    return {"input": os.path.abspath(args.filename), "output": output, "suffix": args.suffix,
+        "corners": corners, "backgroundRGB": list(args.backgroundRGB),
+        "interpolate": args.shouldInterpolate, "engine": args.engine,
+        "outputFormat": args.output_format}
+
+
+if __name__ == "__main__":
+
+    args = getArgs()
+
+    if args.command == "serve":
+        serve(args.socket, args.workers,
+            None if args.memory_budget is None else args.memory_budget * 1024 * 1024, args.backend)
+    else:
+        reply = submitJob(args.socket, jobFromArgs(args))
+        if reply["status"] != "ok":
+            sys.exit(reply["message"])
+        print(reply["output"])
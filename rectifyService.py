@@ -0,0 +1,328 @@
+#!/usr/bin/python3
+#
+# rectifyService.py
+#
+# Local HTTP service for perspectiveRemover.
+#
+
+"""
+Serves perspective removal over HTTP on asyncio, with a bounded job queue.
+
+    python rectifyService.py --port 8350 --concurrency 4 --queue 16
+
+POST /rectify with the image (png or raw Netpbm) as the request body and the
+options as query parameters:
+
+    corners     x0,y0,x1,y1,x2,y2,x3,y3 (required)
+    engine      perspectiveRemover engine name
+    interpolate 1 (default) or 0
+    background  r,g,b
+    format      png (default), ppm or pam
+
+The response body is the altered image.  At most --concurrency jobs run at
+once, on a pool of worker processes, and at most --queue more wait for a
+turn.  Beyond that the service answers 503 with a Retry-After estimate
+instead of queueing without limit.
+
+GET /stats returns JSON with the queue depth, jobs running, counts of
+completed, rejected and failed jobs, and latency percentiles over recent
+jobs.  GET /health answers 200 once the service is accepting jobs.
+"""
+
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import http
+import json
+import math
+import os
+import signal
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import jitKernels
+import perspectiveRemover
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8350
+DEFAULT_CONCURRENCY = os.cpu_count() or 1
+DEFAULT_QUEUE_LENGTH = 16
+DEFAULT_MAX_BODY_BYTES = 256 * 1024 * 1024
+
+# A body left unread, as when a job is turned away, is read and thrown away
+# in chunks of this many bytes for at most this long before the connection
+# closes, so that the client gets to read the response
+DISCARD_CHUNK_BYTES = 64 * 1024
+DISCARD_SECONDS = 1.0
+
+# Latency percentiles are computed over this many of the most recent jobs
+LATENCY_WINDOW = 1000
+LATENCY_PERCENTILES = (50, 90, 99)
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "ppm": "image/x-portable-pixmap",
+    "pam": "image/x-portable-arbitrarymap",
+}
+
+
+def getArgs():
+    argParser = argparse.ArgumentParser(description="HTTP service for removing perspective from images.")
+    argParser.add_argument("--host", type=str, default=DEFAULT_HOST, help="Address to listen on")
+    argParser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    argParser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+        help="Number of jobs to run at once")
+    argParser.add_argument("--queue", type=int, default=DEFAULT_QUEUE_LENGTH,
+        help="Number of jobs that may wait for a turn before new ones are turned away")
+    argParser.add_argument("--max-body", type=int, default=DEFAULT_MAX_BODY_BYTES,
+        help="Largest accepted request body in bytes")
+    argParser.add_argument("--backend", type=str, choices=jitKernels.BACKENDS, default=jitKernels.DEFAULT_BACKEND,
+        help="jitKernels backend for the worker processes")
+    args = argParser.parse_args()
+    if not jitKernels.backendAvailable(args.backend):
+        argParser.error("--backend %s needs Numba installed" % args.backend)
+    return args
+
+
+class BadRequest(Exception):
+    pass
+
+
+def jobFromQuery(query):
+    """
+    Arguments for perspectiveRemover.rectifyBytes, other than the image data,
+    from the query string of a /rectify request.
+    """
+    parameters = {name: values[-1] for (name, values) in parse_qs(query).items()}
+    try:
+        if "corners" not in parameters:
+            raise BadRequest("corners parameter is required")
+        values = [float(value) for value in parameters["corners"].split(",")]
+        if len(values) != 8:
+            raise BadRequest("corners needs 8 numbers")
+        corners = perspectiveRemover.cornersFromArgs(values)
+
+        engineName = parameters.get("engine", perspectiveRemover.DEFAULT_ENGINE)
+        if engineName not in perspectiveRemover.ENGINES:
+            raise BadRequest("unknown engine " + engineName)
+
+        shouldInterpolate = parameters.get("interpolate", "1") != "0"
+
+        backgroundRGB = perspectiveRemover.DEFAULT_IMAGE_BACKGROUND_RGB
+        if "background" in parameters:
+            backgroundRGB = tuple(int(value) for value in parameters["background"].split(","))
+            if len(backgroundRGB) != 3 or any(c < 0 or c > 255 for c in backgroundRGB):
+                raise BadRequest("background needs 3 values from 0 to 255")
+
+        outputFormat = parameters.get("format", "png")
+        if outputFormat not in CONTENT_TYPES:
+            raise BadRequest("unknown format " + outputFormat)
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+    return (corners, engineName, shouldInterpolate, backgroundRGB, outputFormat)
+
+
+class RectifyService:
+    """
+    Admits /rectify jobs to the executor, keeping at most concurrency of
+    them running and at most queueLength waiting, and keeps the statistics
+    reported by /stats.
+    """
+
+    def __init__(self, executor, concurrency, queueLength, maxBodyBytes):
+        self.executor = executor
+        self.concurrency = concurrency
+        self.queueLength = queueLength
+        self.maxBodyBytes = maxBodyBytes
+        self.slots = asyncio.Semaphore(concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def latencyPercentiles(self):
+        latencies = sorted(self.latencies)
+        percentiles = {}
+        for percentile in LATENCY_PERCENTILES:
+            if latencies:
+                index = min(len(latencies) - 1, int(math.ceil(percentile / 100 * len(latencies))) - 1)
+                percentiles["p%d" % percentile] = latencies[max(index, 0)]
+            else:
+                percentiles["p%d" % percentile] = None
+        return percentiles
+
+    def stats(self):
+        return {"queueDepth": self.waiting, "running": self.running,
+            "queueLength": self.queueLength, "concurrency": self.concurrency,
+            "completed": self.completed, "rejected": self.rejected, "failed": self.failed,
+            "latencySeconds": self.latencyPercentiles()}
+
+    def retryAfterSeconds(self):
+        """Rough wait until a queue slot frees up, from the median latency"""
+        median = self.latencyPercentiles()["p50"] or 1
+        return max(1, int(math.ceil(median * (self.waiting + 1) / self.concurrency)))
+
+    async def rectify(self, query, readBody):
+        """
+        Returns (status, headers, body) for a /rectify request.  The image
+        is only read, by awaiting readBody(), once the job is admitted, so
+        turning jobs away costs no memory for their images.  Jobs whose
+        images are still arriving count as waiting, so slow or stalled
+        uploads can't take more than the queue's places between them.
+        """
+        if self.waiting + self.running >= self.queueLength + self.concurrency:
+            self.rejected += 1
+            return (http.HTTPStatus.SERVICE_UNAVAILABLE,
+                {"Retry-After": str(self.retryAfterSeconds())}, b"queue full\n")
+
+        try:
+            job = jobFromQuery(query)
+        except BadRequest as e:
+            return (http.HTTPStatus.BAD_REQUEST, {}, (str(e) + "\n").encode())
+
+        # Count the job as waiting while its image arrives too, so that
+        # uploads in progress take up queue places
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            body = await readBody()
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            output = await loop.run_in_executor(self.executor, perspectiveRemover.rectifyBytes, body, *job)
+        except Exception as e:
+            self.failed += 1
+            return (http.HTTPStatus.UNPROCESSABLE_ENTITY, {}, ("%s: %s\n" % (type(e).__name__, e)).encode())
+        finally:
+            self.running -= 1
+            self.slots.release()
+
+        self.completed += 1
+        self.latencies.append(time.perf_counter() - start)
+        outputFormat = job[-1]
+        return (http.HTTPStatus.OK, {"Content-Type": CONTENT_TYPES[outputFormat]}, output)
+
+    async def respond(self, method, path, query, readBody):
+        """
+        Returns (status, headers, body) for any request, awaiting readBody()
+        for the request body only if it's needed
+        """
+        if path == "/rectify":
+            if method != "POST":
+                return (http.HTTPStatus.METHOD_NOT_ALLOWED, {"Allow": "POST"}, b"")
+            return await self.rectify(query, readBody)
+        if path == "/stats" and method == "GET":
+            return (http.HTTPStatus.OK, {"Content-Type": "application/json"},
+                (json.dumps(self.stats()) + "\n").encode())
+        if path == "/health" and method == "GET":
+            return (http.HTTPStatus.OK, {"Content-Type": "text/plain"}, b"ok\n")
+        return (http.HTTPStatus.NOT_FOUND, {}, b"not found\n")
+
+    async def handleConnection(self, reader, writer):
+        """Serve one HTTP/1.1 request on the connection, then close it"""
+        unread = 0
+        try:
+            requestLine = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1")
+                if line in ("\r\n", "\n", ""):
+                    break
+                (name, separator, value) = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if len(requestLine) != 3:
+                response = (http.HTTPStatus.BAD_REQUEST, {}, b"bad request line\n")
+            else:
+                (method, target, version) = requestLine
+                contentLength = int(headers.get("content-length", 0))
+                if contentLength > self.maxBodyBytes:
+                    response = (http.HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {}, b"body too large\n")
+                else:
+                    # A client expecting 100 Continue holds the body back
+                    # until told to send it, so there's nothing to discard
+                    expectsContinue = headers.get("expect", "").lower() == "100-continue"
+
+                    async def readBody():
+                        nonlocal unread
+                        if expectsContinue:
+                            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                            await writer.drain()
+                        unread = 0
+                        return await reader.readexactly(contentLength)
+
+                    unread = 0 if expectsContinue else contentLength
+                    url = urlsplit(target)
+                    response = await self.respond(method, url.path, url.query, readBody)
+
+            (status, responseHeaders, responseBody) = response
+            head = ["HTTP/1.1 %d %s" % (status, status.phrase),
+                "Content-Length: %d" % len(responseBody), "Connection: close"]
+            head += ["%s: %s" % header for header in responseHeaders.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + responseBody)
+            await writer.drain()
+            if unread:
+                await discardBody(reader, unread)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # Client went away or sent garbage; nothing useful to reply
+            pass
+        finally:
+            writer.close()
+
+
+async def discardBody(reader, length):
+    """
+    Read and throw away up to length bytes of a request body that wasn't
+    needed, giving up after DISCARD_SECONDS.  Closing the connection with
+    data still unread could reset it before the client reads the response.
+    """
+    async def discard(length):
+        while length > 0:
+            chunk = await reader.read(min(length, DISCARD_CHUNK_BYTES))
+            if not chunk:
+                break
+            length -= len(chunk)
+
+    try:
+        await asyncio.wait_for(discard(length), DISCARD_SECONDS)
+    except asyncio.TimeoutError:
+        pass
+
+
+def initWorker(backendName):
+    """Process pool initializer: switch to the jitKernels backend backendName"""
+    jitKernels.useBackend(backendName)
+
+async def serve(host, port, concurrency, queueLength, maxBodyBytes, backendName=jitKernels.DEFAULT_BACKEND):
+    with ProcessPoolExecutor(max_workers=concurrency, initializer=initWorker,
+            initargs=(backendName,)) as executor:
+        service = RectifyService(executor, concurrency, queueLength, maxBodyBytes)
+        server = await asyncio.start_server(service.handleConnection, host, port)
+
+        loop = asyncio.get_running_loop()
+        stopping = loop.create_future()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.cancel)
+
+        print("Listening on http://%s:%d/" % (host, port), file=sys.stderr)
+        async with server:
+            try:
+                await stopping
+            except asyncio.CancelledError:
+                pass
+
+
+if __name__ == "__main__":
+
+    args = getArgs()
+    asyncio.run(serve(args.host, args.port, args.concurrency, args.queue, args.max_body, args.backend))
@@ -0,0 +1,137 @@
+#
+# resultCache.py
+#
+# Content-addressed on-disk cache of perspectiveRemover outputs.
+#
+
+"""
+Keeps a copy of each altered image under a key derived from everything that
+determines its contents: the bytes of the input image, the corners, the
+options that affect the output (but not, for example, the output suffix)
+and the version of the engine that produced it.  A later run with the same
+key can then hard-link or copy the earlier output into place instead of
+decoding and warping the image again.
+
+Entries are evicted least recently used first once the cache grows past
+its size limit.  An entry's modification time records when it was last
+stored or used, since access times are often not maintained.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def fileDigest(filename):
+    """SHA-256 hash object fed with the contents of filename"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest
+
+def cacheKey(inputFilename, corners, options):
+    """
+    Input: The name of the input image, its corners, and a dict of the
+    options that affect the output image, including the engine version.
+
+    Output: A hex digest identifying the output image.
+    """
+    digest = fileDigest(inputFilename)
+
+    # Round-trip through lists so that tuples and lists of corners hash alike
+    parameters = {"corners": [list(corner) for corner in corners], "options": options}
+    digest.update(json.dumps(parameters, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Directory of cached outputs, laid out as <directory>/<key[:2]>/<key>.
+    """
+
+    def __init__(self, directory, maxBytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok=True)
+
+    def pathFor(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def fetch(self, key, targetFilename):
+        """
+        If key is cached, put its output at targetFilename and return True,
+        else return False.  The output is hard-linked when possible.
+        """
+        path = self.pathFor(key)
+
+        # Rather than checking for the entry first, which another process
+        # could evict in between, link or copy it under a temporary name,
+        # then rename that into place so targetFilename is never partial.
+        temporaryFilename = "%s.%d.tmp" % (targetFilename, os.getpid())
+        try:
+            os.link(path, temporaryFilename)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            try:
+                shutil.copyfile(path, temporaryFilename)
+            except FileNotFoundError:
+                return False
+        os.replace(temporaryFilename, targetFilename)
+
+        # Mark as recently used, unless it's been evicted since
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def store(self, key, sourceFilename):
+        """Cache a copy of sourceFilename as the output for key, then evict as needed"""
+        path = self.pathFor(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Copy rather than link, so nothing that later rewrites the output
+        # in place can change the cached entry, and rename into place so a
+        # reader never sees a partial entry.
+        temporaryPath = "%s.%d.tmp" % (path, os.getpid())
+        shutil.copyfile(sourceFilename, temporaryPath)
+        os.replace(temporaryPath, path)
+
+        self.evict()
+
+    def entries(self):
+        """List of (lastUsedTime, size, path) for every cached output"""
+        entries = []
+        for (dirpath, dirnames, filenames) in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Evicted by another process while we were looking
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Remove least recently used outputs until the cache fits in maxBytes"""
+        entries = sorted(self.entries())
+        totalBytes = sum(size for (lastUsed, size, path) in entries)
+        for (lastUsed, size, path) in entries:
+            if totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            totalBytes -= size
@@ -0,0 +1,275 @@
+#
+# sharedPipeline.py
+#
+# Decode, warp and encode stages of perspectiveRemover in separate processes.
+#
+
+"""
+Runs perspectiveRemover over a batch of images as a three-stage pipeline,
+with decoding, warping and encoding each in its own worker process, so that
+while one image is warped the next is decoded and the previous one encoded.
+
+Pixels never travel between the processes.  Each stage leaves its result
+in a multiprocessing.shared_memory segment and passes on only a descriptor
+of it, (name, shape, dtype), from which the next stage maps the same
+memory.  The parent process owns every segment once its descriptor arrives
+and unlinks it as soon as the next stage is done with it, when a job fails,
+and on the way out when the batch is interrupted.  A stage that fails after
+creating a segment unlinks it before reporting the failure.
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import resource_tracker, shared_memory
+import signal
+
+import numpy as np
+
+import jitKernels
+import perspectiveRemover
+
+
+# Number of images that may be decoded or warping at once, and so the number
+# of decoded sources held in shared memory at once
+PIPELINE_DEPTH = 2
+
+
+class SharedArray:
+    """
+    A numpy array in a shared memory segment, as array.  Use create or
+    copyOf to make a new segment and attach to map one described by
+    another process.
+    """
+
+    def __init__(self, segment, shape, dtype):
+        self.segment = segment
+        self.array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+    @classmethod
+    def create(cls, shape, dtype):
+        dtype = np.dtype(dtype)
+        # Segments can't be empty
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        return cls(shared_memory.SharedMemory(create=True, size=size), shape, dtype)
+
+    @classmethod
+    def copyOf(cls, array):
+        shared = cls.create(array.shape, array.dtype)
+        try:
+            shared.array[...] = array
+        except:
+            shared.destroy()
+            raise
+        return shared
+
+    @classmethod
+    def attach(cls, descriptor):
+        (name, shape, dtype) = descriptor
+        return cls(shared_memory.SharedMemory(name=name), tuple(shape), dtype)
+
+    def descriptor(self):
+        return (self.segment.name, self.array.shape, self.array.dtype.str)
+
+    def close(self):
+        """Unmap the segment from this process, leaving it for the others"""
+        self.array = None
+        try:
+            self.segment.close()
+        except BufferError:
+            # Something, such as the traceback of a failed stage, still holds
+            # a view of the memory.  The mapping goes when the process does.
+            pass
+
+    def destroy(self):
+        """Unmap the segment and remove it, freeing its memory once every process has unmapped it"""
+        self.close()
+        self.segment.unlink()
+
+def unlinkSegment(name):
+    segment = shared_memory.SharedMemory(name=name)
+    segment.close()
+    segment.unlink()
+
+
+# === Stages, each run in its own worker process ===
+
+def initWorker(backendName):
+    """
+    Process pool initializer: let the parent handle Ctrl-C and clean up, and
+    use the parent's jitKernels backend
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    jitKernels.useBackend(backendName)
+
+def decodeStage(filename, pixelCache, scale=1):
+    """
+    Decode filename, decimated by scale, into a new segment and return its
+    descriptor.  A png is decoded, or the decimated image built, in the
+    segment itself; pixels memory-mapped from a Netpbm file or pixelCache
+    are read into it.
+    """
+    source = None
+
+    def allocate(shape, dtype):
+        nonlocal source
+        source = SharedArray.create(shape, dtype)
+        return source.array
+
+    try:
+        if scale == 1:
+            pixels = perspectiveRemover.loadPixels(filename, pixelCache, allocate=allocate)
+        else:
+            pixels = perspectiveRemover.decimatePixels(perspectiveRemover.loadPixels(filename, pixelCache), scale,
+                allocate)
+        if source is None:
+            source = SharedArray.copyOf(pixels)
+        del pixels
+    except:
+        if source is not None:
+            source.destroy()
+        raise
+
+    descriptor = source.descriptor()
+    source.close()
+    return descriptor
+
+def warpStage(sourceDescriptor, corners, engineName, shouldInterpolate, backgroundRGB, threads):
+    """
+    Remove the perspective from the decoded image in the source segment,
+    leaving the altered image in a new segment as a (newHeight, newWidth * 3)
+    uint8 array.  Returns the new segment's descriptor.  Engines in
+    perspectiveRemover.CANVAS_ENGINES build the image in the new segment
+    itself; the others' rows are written into it one at a time.
+    """
+    source = SharedArray.attach(sourceDescriptor)
+    output = None
+
+    def allocate(shape, dtype):
+        nonlocal output
+        output = SharedArray.create(shape, dtype)
+        return output.array
+
+    try:
+        if engineName in perspectiveRemover.CANVAS_ENGINES:
+            pixels = perspectiveRemover.engineFor(engineName, threads)(source.array, corners, shouldInterpolate,
+                backgroundRGB, allocate=allocate)
+            # The engine's image is a view of the segment, maybe in another shape
+            descriptor = (output.segment.name, pixels.shape, pixels.dtype.str)
+            del pixels
+        else:
+            (newWidth, newHeight, rows) = perspectiveRemover.rectifyImageRows(engineName, source.array, corners,
+                shouldInterpolate, backgroundRGB, threads=threads)
+            output = SharedArray.create((newHeight, newWidth * 3), np.uint8)
+            for (y, row) in enumerate(rows):
+                output.array[y] = row
+            descriptor = output.descriptor()
+    except:
+        if output is not None:
+            output.destroy()
+        raise
+    finally:
+        source.close()
+
+    output.close()
+    return descriptor
+
+def encodeStage(outputDescriptor, newFilename, outputFormat):
+    """Write the altered image in the output segment to newFilename"""
+    output = SharedArray.attach(outputDescriptor)
+    try:
+        (newHeight, rowLength) = output.array.shape
+        perspectiveRemover.writeToFile(newFilename, rowLength // 3, newHeight, output.array, outputFormat)
+    finally:
+        output.close()
+
+
+# === Parent side ===
+
+def rectifyFiles(jobs, engineName=perspectiveRemover.DEFAULT_ENGINE, shouldInterpolate=True,
+        backgroundRGB=perspectiveRemover.DEFAULT_IMAGE_BACKGROUND_RGB, outputFormat="png",
+        pixelCache=None, threads=1, scale=1, depth=PIPELINE_DEPTH):
+    """
+    Input: jobs, a list of (filename, corners, newFilename), and the options
+    for perspectiveRemover.rectifyFile.
+
+    Generator that pushes the jobs through the pipeline, yielding each job's
+    (filename, newFilename) in order once its altered image is written.  A
+    failed job stops the batch: the pipeline is drained, every segment is
+    unlinked and the job's exception is raised.
+    """
+    # Share one tracker with the workers, so that a segment created in one
+    # process and unlinked in another is forgotten, and any segments still
+    # around if this process dies are removed when the tracker notices.
+    resource_tracker.ensure_running()
+
+    pools = [ProcessPoolExecutor(max_workers=1, initializer=initWorker, initargs=(jitKernels.activeBackend,))
+        for stage in range(3)]
+    (decoder, warper, encoder) = pools
+
+    pending = deque(jobs)
+    # (job, future) for decoding, (job, sourceName, future) for warping and
+    # (job, outputName, future) for encoding
+    decoding = deque()
+    warping = deque()
+    encoding = deque()
+    # Segments this process is responsible for unlinking
+    owned = set()
+
+    def adopt(future):
+        """The descriptor future resolved to, now owned by this process"""
+        descriptor = future.result()
+        owned.add(descriptor[0])
+        return descriptor
+
+    def release(name):
+        owned.discard(name)
+        unlinkSegment(name)
+
+    try:
+        while pending or decoding or warping or encoding:
+            while pending and len(decoding) + len(warping) < depth:
+                job = pending.popleft()
+                decoding.append((job, decoder.submit(decodeStage, job[0], pixelCache, scale)))
+
+            heads = [queue[0][-1] for queue in (decoding, warping, encoding) if queue]
+            wait(heads, return_when=FIRST_COMPLETED)
+
+            if encoding and encoding[0][-1].done():
+                (job, outputName, future) = encoding.popleft()
+                try:
+                    future.result()
+                finally:
+                    release(outputName)
+                (filename, corners, newFilename) = job
+                yield (filename, newFilename)
+
+            if warping and warping[0][-1].done():
+                (job, sourceName, future) = warping.popleft()
+                try:
+                    outputDescriptor = adopt(future)
+                finally:
+                    release(sourceName)
+                encoding.append((job, outputDescriptor[0],
+                    encoder.submit(encodeStage, outputDescriptor, job[2], outputFormat)))
+
+            if decoding and decoding[0][-1].done():
+                (job, future) = decoding.popleft()
+                sourceDescriptor = adopt(future)
+                warping.append((job, sourceDescriptor[0], warper.submit(warpStage, sourceDescriptor,
+                    perspectiveRemover.scaleCorners(job[1], scale), engineName, shouldInterpolate,
+                    backgroundRGB, threads)))
+    finally:
+        for pool in pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        # Stages still running when we stopped may have left segments that
+        # never reached us
+        unclaimed = [entry[-1] for queue in (decoding, warping) for entry in queue]
+        for future in unclaimed:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                owned.add(future.result()[0])
+        for name in list(owned):
+            try:
+                release(name)
+            except FileNotFoundError:
+                owned.discard(name)
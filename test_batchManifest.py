@@ -0,0 +1,122 @@
+#
+# test_batchManifest.py
+#
+# Manifests, journals and resuming batches.
+#
+
+import json
+import os
+import tempfile
+import unittest
+
+import batchManifest
+
+
+OPTIONS = {"engine": "tiled", "interpolate": True}
+CORNERS = ((1, 2), (30, 2), (30, 20), (1, 20))
+
+
+class BatchManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journalFilename = self.path("batch.txt" + batchManifest.JOURNAL_SUFFIX)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, filename):
+        return os.path.join(self.directory.name, filename)
+
+    def job(self, name, corners=None):
+        return (self.path(name + ".png"), corners, self.path(name + ".FIXED.png"))
+
+    def writeOutput(self, job):
+        with open(job[2], "w") as f:
+            f.write("altered")
+        return job[1] or CORNERS
+
+    def journalRecords(self):
+        with open(self.journalFilename) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def testReadManifest(self):
+        with open(self.path("batch.txt"), "w") as f:
+            f.write("# pages\n\na.png\n")
+            f.write(json.dumps({"input": "b.png", "output": "out/b.png", "corners": [list(c) for c in CORNERS]}))
+            f.write("\n")
+        self.assertEqual(batchManifest.readManifest(self.path("batch.txt")), [
+            (self.path("a.png"), None, None),
+            (self.path("b.png"), CORNERS, self.path(os.path.join("out", "b.png")))])
+
+    def testDoneJobsSkipped(self):
+        jobs = [self.job("a", CORNERS), self.job("b")]
+        journal = batchManifest.Journal(self.journalFilename, OPTIONS)
+        results = list(batchManifest.runJobs(jobs, journal, self.writeOutput))
+        self.assertEqual([error for (filename, newFilename, error) in results], [None, None])
+
+        journal = batchManifest.Journal(self.journalFilename, OPTIONS)
+        self.assertEqual(batchManifest.pendingJobs(jobs, journal), ([], []))
+        # Other corners, other options or a missing output make it a new job
+        moved = self.job("a", ((0, 0), (30, 2), (30, 20), (1, 20)))
+        self.assertEqual(batchManifest.pendingJobs([moved], journal), ([moved], []))
+        otherOptions = batchManifest.Journal(self.journalFilename, dict(OPTIONS, engine="bilinear"))
+        self.assertEqual(batchManifest.pendingJobs(jobs, otherOptions), (jobs, []))
+        os.remove(jobs[1][2])
+        self.assertEqual(batchManifest.pendingJobs(jobs, journal), ([jobs[1]], []))
+
+    def testResolvedCornersRecorded(self):
+        jobs = [self.job("a", CORNERS), self.job("b")]
+        journal = batchManifest.Journal(self.journalFilename, OPTIONS)
+        list(batchManifest.runJobs(jobs, journal, self.writeOutput))
+        (given, resolved) = self.journalRecords()
+        self.assertNotIn("resolvedCorners", given)
+        self.assertIsNone(resolved["corners"])
+        self.assertEqual(resolved["resolvedCorners"], [list(corner) for corner in CORNERS])
+
+    def testFailuresRetriedThenSkipped(self):
+        job = self.job("a", CORNERS)
+        attempts = []
+        def fail(job):
+            attempts.append(job)
+            raise ValueError("no corners")
+
+        journal = batchManifest.Journal(self.journalFilename, OPTIONS)
+        results = list(batchManifest.runJobs([job], journal, fail, maxAttempts=2))
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(results, [(job[0], job[2], "ValueError: no corners")])
+
+        journal = batchManifest.Journal(self.journalFilename, OPTIONS)
+        self.assertEqual(batchManifest.pendingJobs([job], journal, maxAttempts=2), ([], [job]))
+        self.assertEqual(batchManifest.pendingJobs([job], journal, maxAttempts=3), ([job], []))
+
+    def testTornLastLine(self):
+        (first, second) = (self.job("a", CORNERS), self.job("b", CORNERS))
+        journal = batchManifest.Journal(self.journalFilename, OPTIONS)
+        list(batchManifest.runJobs([first], journal, self.writeOutput))
+        # A writer killed part way through its record
+        with open(self.journalFilename, "a") as f:
+            f.write('{"input": "%s", "outp' % second[0])
+
+        journal = batchManifest.Journal(self.journalFilename, OPTIONS)
+        list(batchManifest.runJobs([second], journal, self.writeOutput))
+
+        journal = batchManifest.Journal(self.journalFilename, OPTIONS)
+        self.assertTrue(journal.isDone(first))
+        self.assertTrue(journal.isDone(second))
+        with open(self.journalFilename) as f:
+            lines = f.read().split("\n")
+        self.assertEqual(json.loads(lines[2])["status"], "done")
+
+    def testStaleTemporariesRemoved(self):
+        job = self.job("a", CORNERS)
+        stale = job[2] + ".1234.tmp"
+        with open(stale, "w") as f:
+            f.write("partial")
+        journal = batchManifest.Journal(self.journalFilename, OPTIONS)
+        list(batchManifest.runJobs([job], journal, self.writeOutput))
+        self.assertFalse(os.path.exists(stale))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#
+# test_cornerDetector.py
+#
+# Corner detection on synthetic images of a bright quadrilateral.
+#
+
+import itertools
+import unittest
+
+import numpy as np
+
+import cornerDetector
+
+
+# Top-left, top-right, bottom-right, bottom-left, for an 800 x 600 image
+QUAD = ((120.3, 90.7), (650.5, 60.2), (700.8, 520.4), (90.1, 480.9))
+
+def quadPixels(corners, width, height, samples=4):
+    """
+    (height, width, 3) uint8 image of a light quadrilateral with the given
+    clockwise corners on a dark background, each pixel's brightness set by
+    how much of it the quadrilateral covers, measured at samples x samples
+    points.  Pixel (x, y) is centered on (x, y).
+    """
+    (ys, xs) = np.indices((height * samples, width * samples))
+    (xs, ys) = ((xs + 0.5) / samples - 0.5, (ys + 0.5) / samples - 0.5)
+    inside = np.ones(xs.shape, dtype=bool)
+    for ((x0, y0), (x1, y1)) in zip(corners, corners[1:] + corners[:1]):
+        inside &= (x1 - x0) * (ys - y0) - (y1 - y0) * (xs - x0) >= 0
+    coverage = inside.reshape((height, samples, width, samples)).mean(axis=(1, 3))
+    gray = np.round(40 + 180 * coverage).astype(np.uint8)
+    return np.repeat(gray[:, :, np.newaxis], 3, axis=2)
+
+
+class DetectCornersTest(unittest.TestCase):
+
+    def assertCornersNear(self, found, expected, distance):
+        self.assertIsNotNone(found)
+        for (corner, expectedCorner) in zip(found, expected):
+            self.assertLessEqual(np.hypot(*np.subtract(corner, expectedCorner)), distance,
+                "%s found for %s" % (corner, expectedCorner))
+
+    def testQuad(self):
+        (corners, confidence) = cornerDetector.detectCorners(quadPixels(QUAD, 800, 600))
+        self.assertCornersNear(corners, QUAD, 1.0)
+        self.assertGreaterEqual(confidence, cornerDetector.DEFAULT_MIN_CONFIDENCE)
+
+    def testQuadShrunkForDetection(self):
+        # Twice DETECTION_SIZE and more, so edges are found at a quarter of
+        # the size and the corners refined in the original
+        quad = tuple((4 * x, 4 * y) for (x, y) in QUAD)
+        (corners, confidence) = cornerDetector.detectCorners(quadPixels(quad, 3200, 2400, samples=1))
+        self.assertCornersNear(corners, quad, 1.0)
+
+    def testBlankImage(self):
+        pixels = np.full((300, 400, 3), 128, dtype=np.uint8)
+        (corners, confidence) = cornerDetector.detectCorners(pixels)
+        self.assertLess(confidence, cornerDetector.DEFAULT_MIN_CONFIDENCE)
+
+    def testTinyImage(self):
+        self.assertEqual(cornerDetector.detectCorners(np.zeros((5, 5, 3), dtype=np.uint8)), (None, 0.0))
+
+
+class OrderCornersTest(unittest.TestCase):
+
+    def testAnyOrder(self):
+        for points in itertools.permutations(QUAD):
+            np.testing.assert_array_equal(cornerDetector.orderCorners(points), QUAD)
+
+    def testRotated(self):
+        # Turned by 30 degrees clockwise, the top-left corner is still the
+        # one nearest the origin
+        angle = np.radians(30)
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        quad = np.array([(0, 0), (200, 0), (200, 100), (0, 100)]) @ rotation.T + (300, 100)
+        np.testing.assert_allclose(cornerDetector.orderCorners(quad[::-1]), quad)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#
+# test_cornerTracker.py
+#
+# Following the corners of a synthetic quadrilateral through moved frames.
+#
+
+import unittest
+
+import numpy as np
+
+import cornerTracker
+from test_cornerDetector import QUAD, quadPixels
+
+
+WIDTH = 800
+HEIGHT = 600
+
+def shifted(corners, dx, dy):
+    return tuple((x + dx, y + dy) for (x, y) in corners)
+
+
+class CornerTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = cornerTracker.CornerTracker(quadPixels(QUAD, WIDTH, HEIGHT), QUAD)
+
+    def testShift(self):
+        moved = shifted(QUAD, 4.3, -2.6)
+        corners = self.tracker.track(quadPixels(moved, WIDTH, HEIGHT))
+        self.assertTrue(self.tracker.resolved)
+        np.testing.assert_allclose(corners, moved, atol=0.3)
+
+        # The moved frame is the key frame now, so staying put changes nothing
+        self.assertEqual(self.tracker.track(quadPixels(moved, WIDTH, HEIGHT)), corners)
+        self.assertFalse(self.tracker.resolved)
+
+    def testJitterBelowThreshold(self):
+        for (dx, dy) in ((0.6, -0.4), (-0.5, 0.7), (0.2, 0.3)):
+            corners = self.tracker.track(quadPixels(shifted(QUAD, dx, dy), WIDTH, HEIGHT))
+            self.assertFalse(self.tracker.resolved)
+            self.assertEqual(corners, self.tracker.corners)
+            np.testing.assert_array_equal(corners, QUAD)
+
+    def testLostCorner(self):
+        moved = shifted(QUAD, 3, 3)
+        pixels = quadPixels(moved, WIDTH, HEIGHT)
+        # Cover the top-left corner with a flat patch, which matches nothing
+        (x, y) = (int(moved[0][0]), int(moved[0][1]))
+        reach = cornerTracker.PATCH_RADIUS + cornerTracker.SEARCH_RADIUS + 2
+        pixels[y - reach:y + reach, x - reach:x + reach] = 128
+
+        corners = self.tracker.track(pixels)
+        self.assertTrue(self.tracker.resolved)
+        self.assertLess(self.tracker.correlations[0], cornerTracker.MIN_CORRELATION)
+        np.testing.assert_allclose(corners[0], QUAD[0], atol=0.01)
+        np.testing.assert_allclose(corners[1:], moved[1:], atol=0.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+#
+# test_memoryScheduler.py
+#
+# Memory estimates and admission of jobs under a budget.
+#
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import memoryScheduler
+import perspectiveRemover
+
+
+MB = 1024 * 1024
+
+
+class AdmissionSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(memoryScheduler.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = memoryScheduler.AdmissionScheduler(100 * MB, starvationSeconds=30)
+
+    def testFit(self):
+        self.assertTrue(self.scheduler.tryAdmit("a", 60 * MB))
+        self.assertTrue(self.scheduler.tryAdmit("b", 40 * MB))
+        self.assertEqual(self.scheduler.usedBytes(), 100 * MB)
+        self.assertFalse(self.scheduler.tryAdmit("c", 1 * MB))
+        self.scheduler.release("a")
+        self.assertTrue(self.scheduler.tryAdmit("c", 1 * MB))
+        self.assertEqual(self.scheduler.running, {"b": 40 * MB, "c": 1 * MB})
+        self.assertEqual(self.scheduler.waiting, {})
+
+    def testBackfill(self):
+        self.assertTrue(self.scheduler.tryAdmit("a", 60 * MB))
+        # Too big while a runs, but a smaller job behind it fits alongside
+        self.assertFalse(self.scheduler.tryAdmit("big", 50 * MB))
+        self.now += 10
+        self.assertTrue(self.scheduler.tryAdmit("small", 30 * MB))
+        self.assertEqual(list(self.scheduler.waiting), ["big"])
+
+    def testStarvation(self):
+        self.assertTrue(self.scheduler.tryAdmit("a", 60 * MB))
+        self.assertFalse(self.scheduler.tryAdmit("big", 50 * MB))
+        self.now += 31
+        # big has waited too long, so nothing else goes ahead of it
+        self.assertFalse(self.scheduler.tryAdmit("small", 10 * MB))
+        self.scheduler.release("a")
+        self.assertTrue(self.scheduler.tryAdmit("big", 50 * MB))
+        self.assertTrue(self.scheduler.tryAdmit("small", 10 * MB))
+
+    def testWithdrawnJobDoesNotStarveOthers(self):
+        self.assertTrue(self.scheduler.tryAdmit("a", 60 * MB))
+        self.assertFalse(self.scheduler.tryAdmit("big", 50 * MB))
+        self.now += 31
+        self.scheduler.withdraw("big")
+        self.assertTrue(self.scheduler.tryAdmit("small", 10 * MB))
+
+    def testOversizedAdmittedAlone(self):
+        self.assertTrue(self.scheduler.tryAdmit("a", 10 * MB))
+        self.assertFalse(self.scheduler.tryAdmit("huge", 500 * MB))
+        self.scheduler.release("a")
+        self.assertTrue(self.scheduler.tryAdmit("huge", 500 * MB))
+        self.assertFalse(self.scheduler.tryAdmit("b", 1 * MB))
+
+    def testAdmitWaitsForRelease(self):
+        self.scheduler.admit("a", 80 * MB)
+        admitted = threading.Event()
+        def second():
+            with self.scheduler.admitted("b", 80 * MB):
+                admitted.set()
+        thread = threading.Thread(target=second)
+        thread.start()
+        self.assertFalse(admitted.wait(0.1))
+        self.scheduler.release("a")
+        self.assertTrue(admitted.wait(5))
+        thread.join(5)
+        self.assertEqual(self.scheduler.running, {})
+
+
+class PlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "page.png")
+        (width, height) = (300, 200)
+        with open(self.filename, "wb") as output:
+            perspectiveRemover.writeToStream(output, width, height, np.zeros((height, width * 3), dtype=np.uint8),
+                "png")
+        self.corners = ((10, 10), (290, 5), (295, 190), (5, 195))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testImageSize(self):
+        self.assertEqual(memoryScheduler.imageSize(self.filename), (300, 200))
+        ppmFilename = os.path.join(self.directory.name, "page.ppm")
+        with open(ppmFilename, "wb") as output:
+            perspectiveRemover.writeToStream(output, 30, 20, np.zeros((20, 90), dtype=np.uint8), "ppm")
+        self.assertEqual(memoryScheduler.imageSize(ppmFilename), (30, 20))
+
+    def testPlan(self):
+        scheduler = memoryScheduler.AdmissionScheduler(1024 * MB)
+        (peakBytes, strip) = scheduler.plan(self.filename, self.corners, "tiled")
+        self.assertFalse(strip)
+        self.assertEqual(peakBytes, memoryScheduler.estimatePeakBytes(300, 200, self.corners, "tiled"))
+        # The forward-splatting engines need far more for the same image
+        self.assertGreater(scheduler.plan(self.filename, self.corners, "reference")[0], peakBytes)
+
+    def testPlanStripWhenOverBudget(self):
+        scheduler = memoryScheduler.AdmissionScheduler(memoryScheduler.BASE_BYTES)
+        (peakBytes, strip) = scheduler.plan(self.filename, self.corners, "reference")
+        self.assertTrue(strip)
+        self.assertEqual(peakBytes, memoryScheduler.estimatePeakBytes(300, 200, self.corners, "reference",
+            strip=True))
+
+    def testStripAdmittedWhereFullJobIsNot(self):
+        fullBytes = memoryScheduler.estimatePeakBytes(300, 200, self.corners, "mipmap")
+        stripBytes = memoryScheduler.estimatePeakBytes(300, 200, self.corners, "mipmap", strip=True)
+        self.assertLess(stripBytes, fullBytes)
+        # Room for the strip-mode job alongside a small one, but not for the
+        # same job with its own engine even alone
+        budgetBytes = (stripBytes + fullBytes) // 2
+        scheduler = memoryScheduler.AdmissionScheduler(budgetBytes)
+        self.assertTrue(scheduler.tryAdmit("other", budgetBytes - stripBytes))
+        self.assertFalse(scheduler.tryAdmit("full", fullBytes))
+        scheduler.withdraw("full")
+
+        (peakBytes, strip) = scheduler.plan(self.filename, self.corners, "mipmap")
+        self.assertEqual((peakBytes, strip), (stripBytes, True))
+        self.assertTrue(scheduler.tryAdmit("strip", peakBytes))
+
+    def testStripModeStreams(self):
+        newFilename = os.path.join(self.directory.name, "page.FIXED.png")
+        with mock.patch.object(perspectiveRemover, "log") as log, mock.patch.object(perspectiveRemover,
+                "rectifyImageRows", wraps=perspectiveRemover.rectifyImageRows) as rectifyImageRows:
+            memoryScheduler.rectifyFileInStrips(self.filename, newFilename, self.corners, engineName="mipmap")
+        self.assertIn("instead of mipmap", " ".join(str(arg) for arg in log.call_args[0]))
+        # The png was decoded into a memory-mapped file...
+        self.assertIsInstance(rectifyImageRows.call_args[0][1], np.memmap)
+        with open(newFilename, "rb") as f:
+            stripped = f.read()
+
+        # ...but the image comes out the same
+        perspectiveRemover.rectifyFile(self.filename, newFilename, self.corners, memoryScheduler.STRIP_ENGINE)
+        with open(newFilename, "rb") as f:
+            self.assertEqual(stripped, f.read())
+
+    def testPlanUnknownEngine(self):
+        with self.assertRaises(ValueError):
+            memoryScheduler.AdmissionScheduler(MB).plan(self.filename, self.corners, "nonesuch")
+
+
+if __name__ == "__main__":
+    unittest.main()
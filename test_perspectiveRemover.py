@@ -0,0 +1,384 @@
+#
+# test_perspectiveRemover.py
+#
+# Tests of perspectiveRemover's helpers for reading and preparing images.
+#
+
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import perspectiveRemover
+from test_cornerDetector import QUAD, quadPixels
+
+
+def writePng(filename, pixels):
+    (height, width) = pixels.shape[:2]
+    with open(filename, "wb") as output:
+        perspectiveRemover.writeToStream(output, width, height, pixels.reshape((height, -1)), "png")
+
+
+class KeptPixelsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "quad.png")
+        writePng(self.filename, quadPixels(QUAD, 800, 600))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testDetectedImageDecodedOnce(self):
+        keptPixels = perspectiveRemover.KeptPixels()
+        newFilename = os.path.join(self.directory.name, "quad.FIXED.png")
+        with mock.patch.object(perspectiveRemover, "decodePixels", wraps=perspectiveRemover.decodePixels) as decode:
+            corners = perspectiveRemover.cornersFor(self.filename, autoDetect=True, keptPixels=keptPixels)
+            perspectiveRemover.rectifyFile(self.filename, newFilename, corners, "tiled",
+                pixels=keptPixels.take(self.filename))
+        self.assertEqual(decode.call_count, 1)
+        self.assertTrue(os.path.exists(newFilename))
+        self.assertIsNone(keptPixels.take(self.filename))
+        self.assertEqual(keptPixels.keptBytes, 0)
+
+    def testOverBudgetNotKept(self):
+        keptPixels = perspectiveRemover.KeptPixels(maxBytes=800 * 600 - 1)
+        self.assertEqual(keptPixels.load(self.filename).shape[:2], (600, 800))
+        self.assertIsNone(keptPixels.take(self.filename))
+
+
+class CornersForTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "blank.png")
+        writePng(self.filename, np.full((60, 80, 3), 128, dtype=np.uint8))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testWithoutAsking(self):
+        with self.assertRaisesRegex(ValueError, "no corners"):
+            perspectiveRemover.cornersFor(self.filename, askUser=False)
+        with self.assertRaisesRegex(ValueError, "confidence"):
+            perspectiveRemover.cornersFor(self.filename, autoDetect=True, askUser=False)
+
+    def testSidecar(self):
+        corners = ((1, 2), (70, 3), (75, 50), (2, 55))
+        with open(perspectiveRemover.cornerSidecarFilename(self.filename), "w") as f:
+            json.dump(corners, f)
+        self.assertEqual(perspectiveRemover.knownCorners(self.filename), corners)
+        self.assertEqual(perspectiveRemover.knownCorners(self.filename, QUAD), QUAD)
+        self.assertEqual(perspectiveRemover.cornersFor(self.filename, askUser=False), corners)
+
+
+class DecimatePixelsTest(unittest.TestCase):
+
+    def testBlockMeanRounding(self):
+        # 2x2 blocks of channel values with means 0.25, 0.5 and 0.75, and a
+        # block of 255s, which must not overflow
+        pixels = np.array([
+            [[0], [0], [0], [1], [0], [1], [255], [255]],
+            [[0], [1], [0], [1], [1], [1], [255], [255]],
+        ], dtype=np.uint8)
+        np.testing.assert_array_equal(perspectiveRemover.decimatePixels(pixels, 2)[:, :, 0], [[0, 1, 1, 255]])
+
+    def testMatchesReference(self):
+        pixels = np.random.default_rng(7).integers(0, 256, (12, 18, 4), dtype=np.uint8)
+        for factor in (2, 3, 6):
+            blocks = pixels.reshape((12 // factor, factor, 18 // factor, factor, 4)).astype(np.float64)
+            expected = np.floor(blocks.mean(axis=(1, 3)) + 0.5).astype(np.uint8)
+            np.testing.assert_array_equal(perspectiveRemover.decimatePixels(pixels, factor), expected)
+
+    def testDropsPartialBlocks(self):
+        pixels = np.full((7, 9, 3), 10, dtype=np.uint8)
+        pixels[6, :] = 250
+        pixels[:, 8] = 250
+        decimated = perspectiveRemover.decimatePixels(pixels, 2)
+        self.assertEqual(decimated.shape, (3, 4, 3))
+        self.assertTrue((decimated == 10).all())
+
+    def testIntoAllocatedArray(self):
+        pixels = np.random.default_rng(9).integers(0, 256, (8, 6, 4), dtype=np.uint8)
+        canvas = np.empty((4, 3, 4), dtype=np.uint8)
+        decimated = perspectiveRemover.decimatePixels(pixels, 2, lambda shape, dtype: canvas)
+        self.assertIs(decimated, canvas)
+        np.testing.assert_array_equal(decimated, perspectiveRemover.decimatePixels(pixels, 2))
+
+    def testFactorOneAndTooSmall(self):
+        pixels = np.zeros((4, 5, 3), dtype=np.uint8)
+        self.assertIs(perspectiveRemover.decimatePixels(pixels, 1), pixels)
+        with self.assertRaises(ValueError):
+            perspectiveRemover.decimatePixels(pixels, 5)
+
+
+class ScaleCornersTest(unittest.TestCase):
+
+    def testSamePointsOfTheRectangle(self):
+        # A pixel of the original and the decimated pixel it's centered in
+        # map to the same point of the rectangle
+        points = np.random.default_rng(3).uniform((100, 80), (700, 520), (50, 2))
+        full = perspectiveRemover.solveHomography(QUAD)
+        for factor in (2, 3, 4):
+            draft = perspectiveRemover.solveHomography(perspectiveRemover.scaleCorners(QUAD, factor))
+            np.testing.assert_allclose(rectanglePoints(draft, (points + 0.5) / factor - 0.5),
+                rectanglePoints(full, points), atol=1e-9)
+
+    def testDraftMatchesFullSizeWarp(self):
+        # On a gradient decimating loses nothing but rounding, so a draft
+        # has the colors of the full size warp at the same points of the
+        # rectangle, give or take the gradient over a pixel
+        (ys, xs) = np.indices((600, 800))
+        pixels = np.round(np.stack([xs * 0.3, ys * 0.4, (xs + ys) * 0.15], axis=-1)).astype(np.uint8)
+        (u, v) = np.meshgrid(np.linspace(0.05, 0.95, 40), np.linspace(0.05, 0.95, 40))
+        rectangle = np.stack([u.ravel(), v.ravel()], axis=1)
+        full = warpedColors(pixels, QUAD, rectangle)
+        for factor in (2, 4):
+            (image, corners) = perspectiveRemover.draftImage(pixels, QUAD, factor)
+            difference = np.abs(warpedColors(image, corners, rectangle) - full)
+            self.assertLessEqual(difference.max(), 2)
+            self.assertLess(difference.mean(), 0.5)
+
+
+class ProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "quad.png")
+        writePng(self.filename, quadPixels(QUAD, 160, 120))
+        self.corners = tuple((x / 5, y / 5) for (x, y) in QUAD)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def stages(self, profiler):
+        return [record["stage"] for record in profiler.records]
+
+    def testTiledWarpProfiled(self):
+        for engineName in sorted(perspectiveRemover.THREADED_ENGINES):
+            profiler = perspectiveRemover.StageProfiler(enabled=True, traceMemory=False)
+            profiler.currentFile = self.filename
+            perspectiveRemover.rectifyFile(self.filename, os.path.join(self.directory.name, "quad.FIXED.png"),
+                self.corners, engineName, profiler=profiler)
+            self.assertIn("warp", self.stages(profiler), engineName)
+            self.assertEqual(self.stages(profiler)[-1], "encode")
+
+    def testStreamedWarpProfiled(self):
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        profiler = perspectiveRemover.StageProfiler(enabled=True, traceMemory=False)
+        streamed = perspectiveRemover.rectifyBytes(data, self.corners, "tiled", profiler=profiler)
+        self.assertEqual(self.stages(profiler), ["decode", "solve", "warp", "encode"])
+        self.assertEqual(streamed, perspectiveRemover.rectifyBytes(data, self.corners, "tiled"))
+
+
+class PnmInputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.pixels = quadPixels(QUAD, 160, 120)[:, :, :3]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def writePnm(self, filename, header, samples):
+        filename = os.path.join(self.directory.name, filename)
+        with open(filename, "wb") as f:
+            f.write(header)
+            f.write(samples.tobytes())
+        return filename
+
+    def testMemoryMapped(self):
+        filename = self.writePnm("quad.ppm", b"P6\n160 120\n255\n", self.pixels)
+        pixels = perspectiveRemover.decodePixels(filename)
+        self.assertIsInstance(pixels, np.memmap)
+        np.testing.assert_array_equal(pixels, self.pixels)
+
+        # Altered the same as the png of the same pixels
+        pngFilename = os.path.join(self.directory.name, "quad.png")
+        writePng(pngFilename, self.pixels)
+        corners = tuple((x / 5, y / 5) for (x, y) in QUAD)
+        for (inputFilename, outputFilename) in ((filename, "fromPpm.png"), (pngFilename, "fromPng.png")):
+            perspectiveRemover.rectifyFile(inputFilename, os.path.join(self.directory.name, outputFilename),
+                corners, "tiled")
+        with open(os.path.join(self.directory.name, "fromPpm.png"), "rb") as fromPpm, \
+                open(os.path.join(self.directory.name, "fromPng.png"), "rb") as fromPng:
+            self.assertEqual(fromPpm.read(), fromPng.read())
+
+    def testSixteenBitGrey(self):
+        grey = np.arange(0, 65536, 257, dtype=">u2").reshape((16, 16))
+        filename = self.writePnm("grey.pgm", b"P5\n16 16\n65535\n", grey)
+        pixels = perspectiveRemover.decodePixels(filename)
+        self.assertEqual(pixels.shape, (16, 16, 3))
+        np.testing.assert_array_equal(pixels[:, :, 1], np.arange(256).reshape((16, 16)))
+
+
+class CommandLineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "quad.png")
+        writePng(self.filename, quadPixels(QUAD, 160, 120))
+        self.corners = tuple((x / 5, y / 5) for (x, y) in QUAD)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def runPerspectiveRemover(self, *args, stdin=b""):
+        cornerArgs = [str(value) for corner in self.corners for value in corner]
+        return subprocess.run([sys.executable, perspectiveRemover.__file__, "--engine", "tiled", "--corners"] +
+            cornerArgs + list(args), input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+    def testStreaming(self):
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        for outputFormat in sorted(perspectiveRemover.OUTPUT_FORMAT_EXTENSIONS):
+            streamed = self.runPerspectiveRemover("--output-format", outputFormat, "-", stdin=data).stdout
+            self.assertEqual(streamed, perspectiveRemover.rectifyBytes(data, self.corners, "tiled",
+                outputFormat=outputFormat))
+        self.assertEqual(os.listdir(self.directory.name), ["quad.png"])
+
+        # A Netpbm image on stdin, with -o - for stdout
+        ppm = io.BytesIO()
+        perspectiveRemover.writeToStream(ppm, 160, 120, quadPixels(QUAD, 160, 120)[:, :, :3].reshape((120, -1)),
+            "ppm")
+        streamed = self.runPerspectiveRemover("-o", "-", "-", stdin=ppm.getvalue()).stdout
+        self.assertEqual(streamed, perspectiveRemover.rectifyBytes(data, self.corners, "tiled"))
+
+    def testOutputFormatExtension(self):
+        self.runPerspectiveRemover("--output-format", "ppm", self.filename)
+        with open(os.path.join(self.directory.name, "quad.FIXED.ppm"), "rb") as f:
+            self.assertEqual(f.read(2), b"P6")
+
+        # png output is named .png whatever the input was
+        self.runPerspectiveRemover("-s", "AGAIN", os.path.join(self.directory.name, "quad.FIXED.ppm"))
+        with open(os.path.join(self.directory.name, "quad.FIXED.AGAIN.png"), "rb") as f:
+            self.assertEqual(f.read(8), b"\x89PNG\r\n\x1a\n")
+
+    def testNewFilenameFor(self):
+        self.assertEqual(perspectiveRemover.newFilenameFor("a/birds.png", "FIXED"), "a/birds.FIXED.png")
+        self.assertEqual(perspectiveRemover.newFilenameFor("a/birds.png", "FIXED", "pam"), "a/birds.FIXED.pam")
+
+
+class ProgressReporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch.object(perspectiveRemover.time, "perf_counter", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.events = []
+        self.reporter = perspectiveRemover.ProgressReporter(self.events.append, interval=1.0)
+
+    def testRowsThrottledWithEta(self):
+        # Each row is taken half a second after the one before
+        for row in self.reporter.countRows("a.png", "warp", iter(range(10)), 10):
+            self.now += 0.5
+        self.assertEqual([event["done"] for event in self.events], [0, 3, 5, 7, 9, 10])
+        self.assertEqual(self.events[0]["etaSeconds"], None)
+        # Five rows in 2s: 2.5 rows a second, with five rows to go
+        self.assertEqual((self.events[2]["rowsPerSecond"], self.events[2]["etaSeconds"]), (2.5, 2.0))
+        self.assertEqual(self.events[-1]["etaSeconds"], 0.0)
+        self.assertEqual(perspectiveRemover.formatProgress(self.events[2]),
+            "warp a.png: 5/10 rows, 2.5 rows/s, ETA 2.0s")
+        self.assertEqual(perspectiveRemover.formatProgress(self.events[-1]),
+            "warp a.png: 10/10 rows, 2.2 rows/s, took 4.5s")
+        self.assertEqual(self.reporter.started, {})
+
+    def testFiles(self):
+        for (filename, corners) in self.reporter.files([("a.png", None), ("b.png", None)], 2):
+            self.now += 2
+        self.assertEqual([(event["file"], event["done"], event["etaSeconds"]) for event in self.events],
+            [(None, 0, None), ("a.png", 1, 2.0), ("b.png", 2, 0.0)])
+        self.assertEqual(perspectiveRemover.formatProgress(self.events[1]), "batch: 1/2 files, 0.5 files/s, ETA 2.0s")
+
+    def testProfilerReportsRows(self):
+        profiler = perspectiveRemover.StageProfiler(progress=self.events.append)
+        profiler.currentFile = "a.png"
+        self.assertEqual(list(profiler.rows("encode", range(3), 3)), [0, 1, 2])
+        self.assertEqual([(event["stage"], event["done"]) for event in self.events], [("encode", 0), ("encode", 3)])
+
+
+class CompactTest(unittest.TestCase):
+
+    def testMatchesVectorizedInLessMemory(self):
+        pixels = quadPixels(QUAD, 800, 600)
+        peaks = {}
+        outputs = {}
+        wasTracing = tracemalloc.is_tracing()
+        tracemalloc.start()
+        try:
+            for engineName in ("vectorized", "compact"):
+                tracemalloc.reset_peak()
+                baseBytes = tracemalloc.get_traced_memory()[0]
+                outputs[engineName] = perspectiveRemover.engineFor(engineName)(pixels, QUAD, True, (0, 0, 0))
+                peaks[engineName] = tracemalloc.get_traced_memory()[1] - baseBytes
+        finally:
+            if not wasTracing:
+                tracemalloc.stop()
+        np.testing.assert_array_equal(outputs["compact"], outputs["vectorized"])
+        # A few bytes per source pixel instead of several float64 coordinates
+        self.assertLess(peaks["compact"], 16 * 800 * 600)
+        self.assertLess(peaks["compact"] * 4, peaks["vectorized"])
+
+
+class PushPullTest(unittest.TestCase):
+
+    def testMagnifiedHolesFilled(self):
+        # The rectangle's top edge is a quarter as long as its bottom edge,
+        # so the top of the altered image is magnified and splatting leaves
+        # whole rows there without a single original pixel
+        (ys, xs) = np.indices((600, 800))
+        pixels = np.stack([50 + xs // 5, 50 + ys // 4, 60 + (xs + ys) // 10], axis=-1).astype(np.uint8)
+        corners = ((300, 0), (500, 0), (799, 599), (0, 599))
+        background = (255, 0, 255)
+
+        # The altered pixels whose centers map back inside the original
+        (sourceToOutput, newWidth, newHeight) = perspectiveRemover.sourceFrame(
+            perspectiveRemover.solveHomography(corners), 800, 600)
+        (outputYs, outputXs) = np.indices((newHeight, newWidth))
+        centers = np.column_stack([outputXs.ravel(), outputYs.ravel()]).astype(np.float64)
+        (x, y) = rectanglePoints(np.linalg.inv(sourceToOutput), centers).T
+        inside = ((x > -1e-6) & (x < 799 + 1e-6) & (y > -1e-6) & (y < 599 + 1e-6)).reshape((newHeight, newWidth))
+
+        splatted = perspectiveRemover.engineFor("vectorized")(pixels, corners, False, background)
+        splatted = splatted.reshape((newHeight, newWidth, 3))
+        emptyRows = ((splatted == background).all(axis=2) | ~inside).all(axis=1) & inside.any(axis=1)
+        self.assertGreater(emptyRows.sum(), 10)
+
+        altered = perspectiveRemover.engineFor("pushpull")(pixels, corners, True, background)
+        altered = altered.reshape((newHeight, newWidth, 3))
+        self.assertFalse((altered[inside] == background).all(axis=1).any())
+        # ...and the background around the original is left alone
+        np.testing.assert_array_equal(altered[~inside & (splatted == background).all(axis=2)][:, 0], 255)
+
+
+def rectanglePoints(homography, points):
+    """Where homography from solveHomography takes the (n, 2) image points"""
+    projected = np.column_stack([points, np.ones(len(points))]) @ homography.T
+    return projected[:, :2] / projected[:, 2:]
+
+def warpedColors(pixels, corners, rectangle):
+    """
+    Colors, as int arrays, of the altered image of pixels at the (n, 2)
+    points of the unit rectangle, nearest pixel
+    """
+    altered = np.asarray(perspectiveRemover.engineFor("tiled")(pixels, corners, True, (0, 0, 0)), dtype=np.uint8)
+    altered = altered.reshape((altered.shape[0], -1, 3))
+    homography = perspectiveRemover.solveHomography(corners)
+    (sourceToOutput, newWidth, newHeight) = perspectiveRemover.sourceFrame(homography, pixels.shape[1],
+        pixels.shape[0])
+    outputPoints = rectanglePoints(sourceToOutput @ np.linalg.inv(homography), rectangle)
+    (x, y) = np.round(outputPoints).astype(int).T
+    return altered[y, x].astype(int)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#
+# test_pixelCache.py
+#
+# Hits, misses, invalidation and eviction of cached decoded images.
+#
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import pixelCache
+
+
+class PixelCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = pixelCache.PixelCache(os.path.join(self.directory.name, "cache"))
+        self.filename = os.path.join(self.directory.name, "page.png")
+        self.writeSource(b"original")
+        self.pixels = np.random.default_rng(5).integers(0, 256, (6, 8, 4), dtype=np.uint8)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def writeSource(self, data):
+        with open(self.filename, "wb") as f:
+            f.write(data)
+
+    def testHitAndMiss(self):
+        self.assertIsNone(self.cache.load(self.filename))
+        self.cache.store(self.filename, self.pixels)
+        cached = self.cache.load(self.filename)
+        self.assertIsInstance(cached, np.memmap)
+        self.assertFalse(cached.flags.writeable)
+        np.testing.assert_array_equal(cached, self.pixels)
+        self.assertEqual([name for name in os.listdir(self.cache.directory) if name.endswith(".tmp")], [])
+
+    def testChangedSourceIsAMiss(self):
+        self.cache.store(self.filename, self.pixels)
+        stat = os.stat(self.filename)
+        # Same size and modification time, so only the hash tells
+        self.writeSource(b"modified")
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertIsNone(self.cache.load(self.filename))
+
+        self.writeSource(b"modified, and longer")
+        self.assertIsNone(self.cache.load(self.filename))
+
+    def testEvictedEntryIsAMiss(self):
+        self.cache.store(self.filename, self.pixels)
+        os.remove(self.cache.pathsFor(self.filename)[0])
+        self.assertIsNone(self.cache.load(self.filename))
+
+    def testLeastRecentlyUsedEvicted(self):
+        filenames = [os.path.join(self.directory.name, "page%d.png" % n) for n in range(3)]
+        for filename in filenames:
+            with open(filename, "wb") as f:
+                f.write(filename.encode())
+        self.cache.store(filenames[0], self.pixels)
+        entryBytes = os.path.getsize(self.cache.pathsFor(filenames[0])[0])
+        self.cache.maxBytes = 2 * entryBytes
+
+        self.cache.store(filenames[1], self.pixels)
+        for (age, filename) in enumerate(filenames[:2]):
+            os.utime(self.cache.pathsFor(filename)[0], (1000 + age, 1000 + age))
+        # Using the older entry makes the other the one to go
+        self.assertIsNotNone(self.cache.load(filenames[0]))
+        self.cache.store(filenames[2], self.pixels)
+        self.assertEqual([self.cache.load(filename) is not None for filename in filenames], [True, False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
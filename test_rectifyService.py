@@ -0,0 +1,117 @@
+#
+# test_rectifyService.py
+#
+# Round trips through rectifyService on localhost.
+#
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import unittest
+
+import numpy as np
+
+import perspectiveRemover
+import rectifyService
+
+
+CORNERS = "4,3,35,5,37,26,2,24"
+
+def pngBytes(width=40, height=30):
+    """A small RGB png with a gradient in it"""
+    (ys, xs) = np.indices((height, width))
+    pixels = np.stack([xs * 6, ys * 8, (xs + ys) * 3], axis=-1).astype(np.uint8)
+    output = io.BytesIO()
+    perspectiveRemover.writeToStream(output, width, height, pixels.reshape((height, width * 3)), "png")
+    return output.getvalue()
+
+async def request(port, method, target, body=b"", contentLength=None, sendBody=True):
+    """(status, headers, body) of one HTTP request to the service"""
+    (reader, writer) = await asyncio.open_connection("127.0.0.1", port)
+    head = "%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n" % (method, target,
+        len(body) if contentLength is None else contentLength)
+    writer.write(head.encode("latin-1") + (body if sendBody else b""))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    (responseHead, separator, responseBody) = response.partition(b"\r\n\r\n")
+    lines = responseHead.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:])
+    return (int(lines[0].split()[1]), headers, responseBody)
+
+
+class RectifyServiceTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.service = rectifyService.RectifyService(self.executor, 1, 0, 1024 * 1024)
+        self.server = await asyncio.start_server(self.service.handleConnection, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.executor.shutdown()
+
+    async def testRectify(self):
+        data = pngBytes()
+        (status, headers, body) = await request(self.port, "POST",
+            "/rectify?corners=%s&engine=tiled&format=ppm" % CORNERS, data)
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Type"], "image/x-portable-pixmap")
+        expected = perspectiveRemover.rectifyBytes(data, perspectiveRemover.cornersFromArgs(
+            [float(value) for value in CORNERS.split(",")]), "tiled", outputFormat="ppm")
+        self.assertEqual(body, expected)
+
+        (status, headers, body) = await request(self.port, "GET", "/stats")
+        stats = json.loads(body)
+        self.assertEqual((stats["completed"], stats["rejected"], stats["failed"]), (1, 0, 0))
+        self.assertIsNotNone(stats["latencySeconds"]["p50"])
+
+    async def testBadRequest(self):
+        (status, headers, body) = await request(self.port, "POST", "/rectify?corners=1,2,3", pngBytes())
+        self.assertEqual(status, 400)
+        (status, headers, body) = await request(self.port, "GET", "/rectify")
+        self.assertEqual(status, 405)
+
+    async def testQueueFullRejectsBeforeReadingBody(self):
+        # Every slot busy and no queue places: the 503 must come back
+        # without waiting for a body that is never sent
+        self.service.running = self.service.concurrency
+        (status, headers, body) = await asyncio.wait_for(request(self.port, "POST",
+            "/rectify?corners=%s" % CORNERS, contentLength=512 * 1024, sendBody=False), 5)
+        self.assertEqual(status, 503)
+        self.assertIn("Retry-After", headers)
+        self.assertEqual(self.service.rejected, 1)
+
+    async def testStalledUploadsTurnedAway(self):
+        # An upload that never finishes takes the only place there is, one
+        # slot and no queue, so the jobs after it are turned away too
+        (reader, writer) = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(("POST /rectify?corners=%s HTTP/1.1\r\nHost: localhost\r\nContent-Length: 1024\r\n\r\n"
+            % CORNERS).encode("latin-1"))
+        await writer.drain()
+        async def stalled():
+            while self.service.waiting < 1:
+                await asyncio.sleep(0.01)
+        await asyncio.wait_for(stalled(), 5)
+
+        for attempt in range(2):
+            (status, headers, body) = await asyncio.wait_for(request(self.port, "POST",
+                "/rectify?corners=%s" % CORNERS, contentLength=1024, sendBody=False), 5)
+            self.assertEqual(status, 503)
+            self.assertIn("Retry-After", headers)
+        self.assertEqual((self.service.waiting, self.service.running, self.service.rejected), (1, 0, 2))
+        writer.close()
+        await writer.wait_closed()
+
+    async def testBodyTooLarge(self):
+        (status, headers, body) = await request(self.port, "POST", "/rectify?corners=%s" % CORNERS,
+            contentLength=2 * 1024 * 1024, sendBody=False)
+        self.assertEqual(status, 413)
+
+
+if __name__ == "__main__":
+    unittest.main()
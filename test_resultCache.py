@@ -0,0 +1,84 @@
+#
+# test_resultCache.py
+#
+# Cache keys, hits, misses and eviction of cached outputs.
+#
+
+import os
+import tempfile
+import unittest
+
+import resultCache
+
+
+CORNERS = ((1, 2), (30, 2), (30, 20), (1, 20))
+OPTIONS = {"engine": "tiled", "engineVersion": 1, "interpolate": True}
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = resultCache.ResultCache(self.path("cache"))
+        self.inputFilename = self.write("page.png", b"original")
+        self.outputFilename = self.write("page.FIXED.png", b"altered")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, filename):
+        return os.path.join(self.directory.name, filename)
+
+    def write(self, filename, data):
+        with open(self.path(filename), "wb") as f:
+            f.write(data)
+        return self.path(filename)
+
+    def read(self, filename):
+        with open(filename, "rb") as f:
+            return f.read()
+
+    def testKeyInvalidation(self):
+        key = resultCache.cacheKey(self.inputFilename, CORNERS, OPTIONS)
+        self.assertEqual(resultCache.cacheKey(self.inputFilename, [list(c) for c in CORNERS], dict(OPTIONS)), key)
+        self.assertNotEqual(resultCache.cacheKey(self.inputFilename, CORNERS[1:] + CORNERS[:1], OPTIONS), key)
+        self.assertNotEqual(resultCache.cacheKey(self.inputFilename, CORNERS, dict(OPTIONS, engineVersion=2)), key)
+        self.write("page.png", b"retouched")
+        self.assertNotEqual(resultCache.cacheKey(self.inputFilename, CORNERS, OPTIONS), key)
+
+    def testHitAndMiss(self):
+        key = resultCache.cacheKey(self.inputFilename, CORNERS, OPTIONS)
+        target = self.path("again.png")
+        self.assertFalse(self.cache.fetch(key, target))
+        self.assertFalse(os.path.exists(target))
+
+        self.cache.store(key, self.outputFilename)
+        # Rewriting the output in place mustn't change the cached entry
+        self.write("page.FIXED.png", b"rewritten")
+        self.write("again.png", b"stale")
+        self.assertTrue(self.cache.fetch(key, target))
+        self.assertEqual(self.read(target), b"altered")
+        self.assertEqual([name for name in os.listdir(self.directory.name) if name.endswith(".tmp")], [])
+
+    def testEvictedEntryIsAMiss(self):
+        key = resultCache.cacheKey(self.inputFilename, CORNERS, OPTIONS)
+        self.cache.store(key, self.outputFilename)
+        os.remove(self.cache.pathFor(key))
+        target = self.write("again.png", b"previous")
+        self.assertFalse(self.cache.fetch(key, target))
+        self.assertEqual(self.read(target), b"previous")
+
+    def testLeastRecentlyUsedEvicted(self):
+        self.cache.maxBytes = 2 * len(b"altered")
+        keys = ["%064x" % n for n in range(3)]
+        for (age, key) in enumerate(keys[:2]):
+            self.cache.store(key, self.outputFilename)
+            os.utime(self.cache.pathFor(key), (1000 + age, 1000 + age))
+        # Using the older entry makes the other the one to go
+        self.assertTrue(self.cache.fetch(keys[0], self.path("again.png")))
+        self.cache.store(keys[2], self.outputFilename)
+        self.assertEqual([os.path.exists(self.cache.pathFor(key)) for key in keys], [True, False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,291 @@
+#
+# watchFolder.py
+#
+# Long-running ingestion of images dropped into a spool directory.
+#
+
+"""
+Watches a spool directory that scanners drop pngs into, each with its
+corners in a sidecar file (see perspectiveRemover.CORNER_SIDECAR_SUFFIX),
+and removes the perspective from each one as it arrives.
+
+The directory is polled every POLL_SECONDS.  A png is taken once its size
+and modification time, and its sidecar's if it has one, have not changed
+for SETTLE_SECONDS, so that files still being written are left alone;
+names starting with a dot are ignored, as scanners often write under such
+a name and rename when done.  Images are worked on in a pool of worker
+processes, with no more queued at a time than there are workers, so
+anything still in the spool directory is free to be picked up in the
+order it arrived.
+
+Altered images are written to the output directory.  The input and its
+sidecar then move to DONE_DIRECTORY in the spool directory, or to
+ERROR_DIRECTORY with the error written alongside as <name>.error.txt if
+anything went wrong.  A worker process that dies, such as one killed for
+running out of memory, takes the pool down with it: the images in progress
+are errors, and a new pool takes the next ones.  There's no one to click
+corners here: an image with no sidecar waits for one unless corners are
+given or detected, and an image whose corners can't be detected
+confidently is an error.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import os
+import signal
+import time
+import traceback
+
+import cornerDetector
+import jitKernels
+import memoryScheduler
+import perspectiveRemover
+import sharedPipeline
+
+
+POLL_SECONDS = 0.5
+SETTLE_SECONDS = 1.0
+
+# Subdirectories of the spool directory for finished inputs, and for the
+# altered images unless told otherwise
+DONE_DIRECTORY = "done"
+ERROR_DIRECTORY = "error"
+OUTPUT_DIRECTORY = "out"
+
+ERROR_SUFFIX = ".error.txt"
+
+# Error written for the images in progress when a worker process died
+BROKEN_POOL_ERROR = ("BrokenProcessPool: a worker process died while this image was in progress, "
+    "perhaps killed for running out of memory\n")
+
+
+def isSpooledImage(name):
+    return not name.startswith(".") and name.lower().endswith(".png")
+
+def moveTo(directory, filenames):
+    """Move those of filenames that exist into directory, replacing any files of the same name there"""
+    os.makedirs(directory, exist_ok=True)
+    for filename in filenames:
+        if os.path.exists(filename):
+            os.replace(filename, os.path.join(directory, os.path.basename(filename)))
+
+
+# === Run in the worker processes ===
+
+def initWorker(backendName):
+    """
+    sharedPipeline.initWorker, also leaving SIGTERM to the parent, which
+    waits for the images in progress before stopping
+    """
+    sharedPipeline.initWorker(backendName)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+def rectifySpooled(filename, newFilename, corners, autoDetect, minConfidence, engineName, shouldInterpolate,
+        backgroundRGB, outputFormat, threads, strip=False):
+    """
+    perspectiveRemover.rectifyFile for a spooled image, or with strip
+    memoryScheduler.rectifyFileInStrips.  Its corners are corners if not
+    None, else from its sidecar, else if autoDetect detected with at least
+    minConfidence.
+    """
+    if corners is None:
+        sidecarFilename = perspectiveRemover.cornerSidecarFilename(filename)
+        if os.path.exists(sidecarFilename):
+            corners = perspectiveRemover.readCornerSidecar(sidecarFilename)
+        elif autoDetect:
+            (corners, confidence) = cornerDetector.detectCorners(perspectiveRemover.loadPixels(filename))
+            if corners is None or confidence < minConfidence:
+                raise ValueError("corner detection confidence %.2f is below %.2f" % (confidence, minConfidence))
+        else:
+            raise ValueError("no corners for %s" % filename)
+
+    if strip:
+        memoryScheduler.rectifyFileInStrips(filename, newFilename, corners, shouldInterpolate, backgroundRGB,
+            outputFormat, engineName)
+    else:
+        perspectiveRemover.rectifyFile(filename, newFilename, corners, engineName, shouldInterpolate,
+            backgroundRGB, outputFormat, threads=threads)
+
+
+# === Parent side ===
+
+def stopWatching(signalNumber, frame):
+    """SIGTERM handler, so that a service manager stops watch as Ctrl-C does"""
+    raise KeyboardInterrupt
+
+class Spool:
+    """
+    The spool directory, keeping track of how long each image in it has
+    been unchanged.  needSidecars says whether an image has to wait for its
+    sidecar before it's ready.
+    """
+
+    def __init__(self, directory, needSidecars, settleSeconds=SETTLE_SECONDS):
+        self.directory = directory
+        self.needSidecars = needSidecars
+        self.settleSeconds = settleSeconds
+        # Image filename -> (state of the image and its sidecar, when that
+        # state was first seen)
+        self.seen = {}
+        self.warnedMissingSidecar = set()
+
+    def state(self, filename):
+        """(size, mtime) of filename and of its sidecar, which is None if missing"""
+        stat = os.stat(filename)
+        try:
+            sidecarStat = os.stat(perspectiveRemover.cornerSidecarFilename(filename))
+            sidecarState = (sidecarStat.st_size, sidecarStat.st_mtime_ns)
+        except FileNotFoundError:
+            sidecarState = None
+        return ((stat.st_size, stat.st_mtime_ns), sidecarState)
+
+    def readyFiles(self, exclude=()):
+        """
+        Images other than those in exclude that have settled, oldest first
+        """
+        now = time.monotonic()
+        ready = []
+        present = set()
+        for name in os.listdir(self.directory):
+            filename = os.path.join(self.directory, name)
+            if not isSpooledImage(name) or filename in exclude or not os.path.isfile(filename):
+                continue
+            present.add(filename)
+            try:
+                state = self.state(filename)
+            except FileNotFoundError:
+                # Taken away between listing and looking
+                continue
+
+            if filename not in self.seen or self.seen[filename][0] != state:
+                self.seen[filename] = (state, now)
+                continue
+            if now - self.seen[filename][1] < self.settleSeconds:
+                continue
+            if self.needSidecars and state[1] is None:
+                if filename not in self.warnedMissingSidecar:
+                    perspectiveRemover.log("Waiting for the corner sidecar of", filename)
+                    self.warnedMissingSidecar.add(filename)
+                continue
+            ready.append((state[0][1], filename))
+
+        # Forget images that have gone
+        for filename in set(self.seen) - present:
+            del self.seen[filename]
+        self.warnedMissingSidecar &= present
+        return [filename for (mtime, filename) in sorted(ready)]
+
+    def finish(self, filename, error=None):
+        """Move filename and its sidecar to the done directory, or with error to the error directory"""
+        filenames = [filename, perspectiveRemover.cornerSidecarFilename(filename)]
+        if error is None:
+            moveTo(os.path.join(self.directory, DONE_DIRECTORY), filenames)
+        else:
+            errorDirectory = os.path.join(self.directory, ERROR_DIRECTORY)
+            moveTo(errorDirectory, filenames)
+            errorFilename = os.path.join(errorDirectory, os.path.splitext(os.path.basename(filename))[0])
+            with open(errorFilename + ERROR_SUFFIX, 'w') as f:
+                f.write(error)
+        self.seen.pop(filename, None)
+
+def watch(spoolDirectory, outputDirectory, workers=1, corners=None, autoDetect=False,
+        minConfidence=cornerDetector.DEFAULT_MIN_CONFIDENCE,
+        engineName=perspectiveRemover.DEFAULT_ENGINE, shouldInterpolate=True,
+        backgroundRGB=perspectiveRemover.DEFAULT_IMAGE_BACKGROUND_RGB, outputFormat="png", threads=1,
+        suffix=perspectiveRemover.DEFAULT_NEW_FILE_SUFFIX, memoryBudget=None, pollSeconds=POLL_SECONDS,
+        settleSeconds=SETTLE_SECONDS):
+    """
+    Process images arriving in spoolDirectory on workers worker processes
+    until interrupted or terminated, writing the altered images to
+    outputDirectory, and finish the images in progress before returning.
+    With a memoryBudget in bytes, images also wait for a
+    memoryScheduler.AdmissionScheduler to admit them.  The other options
+    are those of perspectiveRemover.rectifyFile and rectifySpooled.
+    """
+    os.makedirs(outputDirectory, exist_ok=True)
+    spool = Spool(spoolDirectory, corners is None and not autoDetect, settleSeconds)
+    extension = perspectiveRemover.OUTPUT_FORMAT_EXTENSIONS[outputFormat]
+    perspectiveRemover.log("Watching", spoolDirectory, "for images")
+    signal.signal(signal.SIGTERM, stopWatching)
+
+    scheduler = None
+    if memoryBudget is not None:
+        scheduler = memoryScheduler.AdmissionScheduler(memoryBudget)
+
+    # future -> (filename, newFilename, when it was handed out)
+    running = {}
+    pool = newPool(workers)
+    try:
+        try:
+            while True:
+                ready = spool.readyFiles(exclude={job[0] for job in running.values()})
+                for filename in ready:
+                    if len(running) >= workers:
+                        break
+                    strip = False
+                    if scheduler is not None:
+                        try:
+                            (peakBytes, strip) = scheduler.plan(filename, corners, engineName)
+                        except Exception as e:
+                            perspectiveRemover.log("Failed on", filename, "-", e)
+                            spool.finish(filename, "%s: %s\n" % (type(e).__name__, e))
+                            continue
+                        if not scheduler.tryAdmit(filename, peakBytes):
+                            # Leave it for a later poll, when there may be room
+                            continue
+
+                    newFilename = perspectiveRemover.newFilenameFor(
+                        os.path.join(outputDirectory, os.path.basename(filename)), suffix, extension)
+                    job = (rectifySpooled, filename, newFilename, corners, autoDetect, minConfidence, engineName,
+                        shouldInterpolate, backgroundRGB, outputFormat, threads, strip)
+                    try:
+                        future = pool.submit(*job)
+                    except BrokenProcessPool:
+                        # The images that were in progress fail as their
+                        # futures are finished; this one gets a new pool
+                        perspectiveRemover.log("A worker process died, starting new ones")
+                        pool.shutdown()
+                        pool = newPool(workers)
+                        future = pool.submit(*job)
+                    running[future] = (filename, newFilename, time.monotonic())
+                if scheduler is not None:
+                    # Images that have gone, or are running, aren't waiting any more
+                    for filename in set(scheduler.waiting) - set(ready):
+                        scheduler.withdraw(filename)
+
+                if not running:
+                    time.sleep(pollSeconds)
+                    continue
+                (finished, unfinished) = wait(running, timeout=pollSeconds, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finishJob(spool, scheduler, running.pop(future), future)
+        except KeyboardInterrupt:
+            perspectiveRemover.log("Stopping once the images in progress are done")
+            for future in list(running):
+                wait([future])
+                finishJob(spool, scheduler, running.pop(future), future)
+    finally:
+        pool.shutdown()
+
+def newPool(workers):
+    return ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(jitKernels.activeBackend,))
+
+def finishJob(spool, scheduler, job, future):
+    """
+    Log how the finished future for job, (filename, newFilename, started),
+    went and clear it from spool and scheduler, if there is one
+    """
+    (filename, newFilename, started) = job
+    if scheduler is not None:
+        scheduler.release(filename)
+    try:
+        future.result()
+    except BrokenProcessPool:
+        perspectiveRemover.log("Failed on", filename, "- a worker process died")
+        spool.finish(filename, BROKEN_POOL_ERROR)
+    except Exception as e:
+        perspectiveRemover.log("Failed on", filename, "-", e)
+        spool.finish(filename, "".join(traceback.format_exception(type(e), e, e.__traceback__)))
+    else:
+        perspectiveRemover.log("Saved %s in %.1fs" % (newFilename, time.monotonic() - started))
+        spool.finish(filename)